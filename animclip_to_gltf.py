@@ -5,6 +5,8 @@
 
 import dat1lib
 import dat1lib.types.model
+import dat1lib.types.sections.animclip.autogen
+import dat1lib.types.sections.animset.common
 import dat1lib.types.sections.model.geo
 import dat1lib.types.sections.model.look
 import dat1lib.types.sections.model.meshes
@@ -13,8 +15,8 @@ import dat1lib.types.sections.model.unknowns
 import struct
 
 import base64
-import io
 import math
+import numpy as np
 import pygltflib
 
 SECTION_INDEXES     = dat1lib.types.sections.model.geo.IndexesSection.TAG
@@ -30,33 +32,24 @@ SECTION_MATERIALS   = dat1lib.types.sections.model.unknowns.ModelMaterialSection
 
 SECTION_TRANSFORMS   = dat1lib.types.sections.animclip.autogen.x2BB5BC8F_Section.TAG
 SECTION_BONE_HASHES  = dat1lib.types.sections.animclip.autogen.xA3B26640_Section.TAG
+SECTION_TRACKS       = dat1lib.types.sections.animclip.autogen.x14014CB6_Section.TAG
+SECTION_CLIP_BUILT   = dat1lib.types.sections.animclip.autogen.AnimClipBuiltSection.TAG
+SECTION_CLIPS        = dat1lib.types.sections.animset.common.x212BD372_Section.TAG
+
+GLB_ALIGNMENT = 4
 
 ###
 
-def minmax_positions(positions):
-	min_x, min_y, min_z = None, None, None
-	max_x, max_y, max_z = None, None, None
-	for p in positions:
-		x, y, z = p[0], p[1], p[2]
-		if min_x is None or min_x > x:
-			min_x = x
-		if min_y is None or min_y > y:
-			min_y = y
-		if min_z is None or min_z > z:
-			min_z = z
-		if max_x is None or max_x < x:
-			max_x = x
-		if max_y is None or max_y < y:
-			max_y = y
-		if max_z is None or max_z < z:
-			max_z = z
-
-	return ([min_x, min_y, min_z], [max_x, max_y, max_z])
+def minmax_positions(positions): # (N, K) array => ([min per component], [max per component])
+	if len(positions) == 0:
+		return ([None] * positions.shape[1], [None] * positions.shape[1])
+	return (positions.min(axis=0).tolist(), positions.max(axis=0).tolist())
 
 ###
 
 class GltfWriter(object):
-	def __init__(self):
+	def __init__(self, glb=False):
+		self.glb = glb # all buffers go into single BIN chunk instead of base64 uris
 		self.init(None)
 
 	def init(self, model):
@@ -69,7 +62,7 @@ class GltfWriter(object):
 		self.current_buffer_view_index = 0
 		self.current_buffer_index = 0
 		self.current_accessor_index = 0
-		self.binary_blob = b""
+		self.binary_blob = bytearray()
 
 		#
 
@@ -80,10 +73,10 @@ class GltfWriter(object):
 		if not isinstance(self.model, dat1lib.types.model.ModelRcra):
 			self.mode = dat1lib.VERSION_MSMR
 
-		self.vertexes = []
+		self.positions, self.normals, self.uvs = None, None, None
 		if model is not None:
 			s = model.dat1.get_section(SECTION_VERTEXES)
-			self.vertexes = s.vertexes
+			self.positions, self.normals, self.uvs = s.get_arrays()
 
 		self.meshes = []
 		if model is not None:
@@ -103,26 +96,47 @@ class GltfWriter(object):
 
 	#
 
-	def write_model(self, filename, model, animclip, looks, lod):
+	def write_model(self, filename, model, animclips, looks, lod): # animclips are [(name, animclip)], each becomes an animation
 		self.init(model)
 
 		meshes_indexes = self.get_meshes_indexes_by_looks_and_lod(looks, lod)
-		skin, rcra_skin = self.get_skin()
+		skin, rcra_skin = dat1lib.types.sections.model.skin.get_model_skin(self.model.dat1)
 
-		self.add_skeleton(model, animclip) # first, so created nodes' indexes == bones indexes
+		self.add_skeleton(model) # first, so created nodes' indexes == bones indexes
+		for name, animclip in animclips:
+			self.add_animation(animclip, name)
 		self.add_meshes(meshes_indexes, skin, rcra_skin)
 
-		self.gltf.save(filename)
+		if self.glb:
+			self.save_glb(filename)
+		else:
+			self.gltf.save(filename)
+
+	def save_glb(self, filename):
+		json_data = self.gltf.gltf_to_json(separators=(',', ':'), indent=None).encode("utf-8")
+		json_data += b" " * (-len(json_data) % GLB_ALIGNMENT)
+
+		chunks = [(b"JSON", json_data)]
+		if len(self.binary_blob) > 0:
+			chunks += [(b"BIN\0", self.binary_blob)] # already aligned
+
+		with open(filename, "wb") as f:
+			f.write(struct.pack("<4sII", b"glTF", 2, 12 + sum([8 + len(data) for _, data in chunks])))
+			for tag, data in chunks:
+				f.write(struct.pack("<I4s", len(data), tag))
+				f.write(data)
+
 
 	#
 
-	def add_skeleton(self, model, animclip):
+	def add_skeleton(self, model):
 		joints_section = model.dat1.get_section(0x15DF9D3B)
 		joints_transform_section = model.dat1.get_section(0xDCC88A19)
 
 		bones_count = len(joints_section.joints)
 		bone_indexes = [None for i in range(bones_count)]
 		matrixes = []
+		positions, rotations = [], []
 		for i, bone in enumerate(joints_section.joints):
 			name = model.dat1.get_string(bone.string_offset)
 			parent = bone.parent
@@ -141,10 +155,12 @@ class GltfWriter(object):
 			gltf_node.translation = pos
 
 			matrixes += [joints_transform_section.matrixes44[i]]
+			positions += [pos]
+			rotations += [rot]
 
 		#
 
-		matrixes_buffer_data = self.make_buffer_func(matrixes, lambda x: struct.pack("<16f", x[0], x[1], x[2], x[3], x[4], x[5], x[6], x[7], x[8], x[9], x[10], x[11], x[12], x[13], x[14], x[15]))
+		matrixes_buffer_data = np.array(matrixes, dtype=np.float64).reshape(-1, 16).astype("<f4").tobytes()
 		matrixes_buffer_view, matrixes_buffer_view_index = self.create_buffer_view(matrixes_buffer_data, None)
 
 		matrixes_accessor, matrixes_accessor_index = self.create_accessor()
@@ -159,135 +175,134 @@ class GltfWriter(object):
 		gltf_skin.inverseBindMatrices = matrixes_accessor_index
 		self.gltf.skins.append(gltf_skin)
 
-		# animation
+		self.bone_indexes = bone_indexes
+		self.bones_hashes = [bone.hash for bone in joints_section.joints]
+		self.bind_positions = np.array(positions, dtype=np.float64).reshape(-1, 3)
+		self.bind_rotations = np.array(rotations, dtype=np.float64).reshape(-1, 4)
+		self.base_state_times_accessor_index = None # created with first clip's base state, shared by others
 
-		s = animclip.dat1.get_section(SECTION_TRANSFORMS)
-		transforms_data = s._raw
-
-		s = animclip.dat1.get_section(SECTION_BONE_HASHES)
-		hashes = s.entries
-
-		def float12(x):
-			return x/4096.0
+	def add_animation(self, animclip, name):
+		gltf_animation = pygltflib.Animation()
+		gltf_animation.name = name
+		self.gltf.animations.append(gltf_animation)
 
-		def float_log(x, l):
-			return x/(1.0 * (2**l))
+		# TODO: curves and samples (09DC30AB, 3A7B4855, 4FC98D7E, E08AA35F) aren't decoded yet, so clip's motion isn't exported, only its base state
+		self.add_base_state(gltf_animation, animclip)
+		self.add_custom_tracks(gltf_animation, animclip)
 
-		def float16(x):
-			return x/32768.0 # signed
+	def add_base_state(self, gltf_animation, animclip): # bind pose at frame 0, clip's base state at frame 1
+		s = animclip.dat1.get_section(SECTION_TRANSFORMS)
+		if s is None:
+			return
 
-		pose_data = {}
-		for i, h in enumerate(hashes):
-			if h == 0xFFFFFFFF:
-				continue
+		pose_hashes, pose_positions, pose_rotations = s.get_pose()
+		pose_indexes = {h: i for i, h in enumerate(pose_hashes.tolist())}
 
-			qx, qy, qz, qw, x, y, z, log_scale, log_scale2 = struct.unpack("<7hBB", transforms_data[i*16:i*16+16])
+		bones = [i for i, h in enumerate(self.bones_hashes) if h in pose_indexes]
+		if len(bones) == 0:
+			return
 
-			qx, qy, qz, qw = float16(qx), float16(qy), float16(qz), float16(qw) # blender (gltf?) probably normalizes this which is why there's not much difference which multiplier to use
-			x, y, z = float_log(x, log_scale2), float_log(y, log_scale2), float_log(z, log_scale2)
+		poses = [pose_indexes[self.bones_hashes[i]] for i in bones]
 
-			pose_data[h] = [(x, y, z), (qx, qy, qz, qw)]
+		# blender (gltf?) probably normalizes rotations, which is why there's not much difference which multiplier to use
+		positions = np.stack([self.bind_positions[bones], pose_positions[poses]], axis=1) # (bones, 2 frames, 3)
+		rotations = np.stack([self.bind_rotations[bones], pose_rotations[poses]], axis=1) # (bones, 2 frames, 4)
 
-    	#
+		#
 
-		times = [0.0, 1.0 / 25.0] # 25 seems to be default blender fps
-		times_buffer_data = self.make_buffer_func(times, lambda x: struct.pack("<f", x))
-		times_buffer_view, times_buffer_view_index = self.create_buffer_view(times_buffer_data, pygltflib.ARRAY_BUFFER)
+		if self.base_state_times_accessor_index is None:
+			times = [0.0, 1.0 / 25.0] # 25 seems to be default blender fps
+			self.base_state_times_accessor_index = self.create_times_accessor(np.array(times, dtype=np.float64))
 
-		animation_time_accessor, animation_time_accessor_index = self.create_accessor()
-		animation_time_accessor.bufferView = times_buffer_view_index
-		animation_time_accessor.byteOffset = 0
-		animation_time_accessor.componentType = pygltflib.FLOAT
-		animation_time_accessor.count = len(times)
-		animation_time_accessor.type = pygltflib.SCALAR
-		animation_time_accessor.min = [min(times)]
-		animation_time_accessor.max = [max(times)]
+		# all bones' keyframes are in one buffer view, each bone has an accessor into it
 
-		#
+		positions_accessors = self.create_keyframes_accessors(positions, pygltflib.VEC3)
+		rotations_accessors = self.create_keyframes_accessors(rotations, pygltflib.VEC4)
 
-		gltf_animation = pygltflib.Animation()
-		gltf_animation.name = "base state"
-		self.gltf.animations.append(gltf_animation)
+		for bone, position_accessor_index, rotation_accessor_index in zip(bones, positions_accessors, rotations_accessors):
+			self.add_channel(gltf_animation, self.base_state_times_accessor_index, position_accessor_index, self.bone_indexes[bone], "translation")
+			self.add_channel(gltf_animation, self.base_state_times_accessor_index, rotation_accessor_index, self.bone_indexes[bone], "rotation")
 
-		for i, gltf_node_index in enumerate(bone_indexes):
-			bone = joints_section.joints[i]
-			if bone.hash not in pose_data:
-				continue
+	def add_custom_tracks(self, gltf_animation, animclip): # glTF can't animate arbitrary values, so these are only listed in animation's extras
+		tracks_section = animclip.dat1.get_section(SECTION_TRACKS)
+		built_section = animclip.dat1.get_section(SECTION_CLIP_BUILT)
+		if tracks_section is None or built_section is None:
+			return
 
-			pos = joints_transform_section.get_joint_position(i)
-			rot = joints_transform_section.get_joint_quaternion(i)
+		tracks = [t for t in tracks_section.get_tracks() if len(t[2]) > 0]
+		if len(tracks) == 0:
+			return
 
-			pos2, rot2 = pose_data[bone.hash]
-
-			#
-
-			points = [pos, pos2]
-			bone_position_animation_buffer_data = self.make_buffer_func(points, lambda x: struct.pack("<3f", x[0], x[1], x[2]))
-			bone_position_animation_buffer_view, bone_position_animation_buffer_view_index = self.create_buffer_view(bone_position_animation_buffer_data, pygltflib.ARRAY_BUFFER)
-			v_min, v_max = minmax_positions(points)
-
-			bone_position_animation_accessor, bone_position_animation_accessor_index = self.create_accessor()
-			bone_position_animation_accessor.bufferView = bone_position_animation_buffer_view_index
-			bone_position_animation_accessor.byteOffset = 0
-			bone_position_animation_accessor.componentType = pygltflib.FLOAT
-			bone_position_animation_accessor.count = len(points)
-			bone_position_animation_accessor.type = pygltflib.VEC3
-			bone_position_animation_accessor.min = v_min
-			bone_position_animation_accessor.max = v_max
-
-			position_sampler_index = len(gltf_animation.samplers)
-			position_sampler = pygltflib.AnimationSampler()
-			position_sampler.input = animation_time_accessor_index
-			position_sampler.interpolation = pygltflib.ANIM_LINEAR
-			position_sampler.output = bone_position_animation_accessor_index
-			gltf_animation.samplers.append(position_sampler)
-
-			#
-
-			points = [rot, rot2]
-			bone_rotation_animation_buffer_data = self.make_buffer_func(points, lambda x: struct.pack("<4f", x[0], x[1], x[2], x[3]))
-			bone_rotation_animation_buffer_view, bone_rotation_animation_buffer_view_index = self.create_buffer_view(bone_rotation_animation_buffer_data, pygltflib.ARRAY_BUFFER)
-			v_min, v_max = minmax_positions(points)
-
-			bone_rotation_animation_accessor, bone_rotation_animation_accessor_index = self.create_accessor()
-			bone_rotation_animation_accessor.bufferView = bone_rotation_animation_buffer_view_index
-			bone_rotation_animation_accessor.byteOffset = 0
-			bone_rotation_animation_accessor.componentType = pygltflib.FLOAT
-			bone_rotation_animation_accessor.count = len(points)
-			bone_rotation_animation_accessor.type = pygltflib.VEC4
-			bone_rotation_animation_accessor.min = v_min
-			bone_rotation_animation_accessor.max = v_max
-
-			rotation_sampler_index = len(gltf_animation.samplers)
-			rotation_sampler = pygltflib.AnimationSampler()
-			rotation_sampler.input = animation_time_accessor_index
-			rotation_sampler.interpolation = pygltflib.ANIM_LINEAR
-			rotation_sampler.output = bone_rotation_animation_accessor_index
-			gltf_animation.samplers.append(rotation_sampler)
-
-			#
-
-			pos_target = pygltflib.AnimationChannelTarget()
-			pos_target.node = gltf_node_index
-			pos_target.path = "translation"
-			
-			pos_channel = pygltflib.AnimationChannel()
-			pos_channel.sampler = position_sampler_index
-			pos_channel.target = pos_target
-
-			gltf_animation.channels.append(pos_channel)
-
-			#
-
-			rot_target = pygltflib.AnimationChannelTarget()
-			rot_target.node = gltf_node_index
-			rot_target.path = "rotation"
-			
-			rot_channel = pygltflib.AnimationChannel()
-			rot_channel.sampler = rotation_sampler_index
-			rot_channel.target = rot_target
-
-			gltf_animation.channels.append(rot_channel)
+		values = np.concatenate([v for _, _, v in tracks]).reshape(-1, 1)
+		times = np.concatenate([built_section.get_frame_times(len(v)) for _, _, v in tracks])
+
+		values_view_index = self.create_buffer_view(values.astype("<f4").tobytes(), None)[1]
+		times_view_index = self.create_buffer_view(times.astype("<f4").tobytes(), None)[1]
+
+		custom_tracks = []
+		offset = 0
+		for h, name, v in tracks:
+			times_accessor_index = self.create_scalars_accessor(times_view_index, offset, times[offset:offset + len(v)])
+			values_accessor_index = self.create_scalars_accessor(values_view_index, offset, values[offset:offset + len(v), 0])
+			offset += len(v)
+
+			custom_tracks += [{"hash": "{:08X}".format(h), "name": name, "input": times_accessor_index, "output": values_accessor_index}]
+
+		gltf_animation.extras["customTracks"] = custom_tracks
+
+	def create_times_accessor(self, times): # => accessor index
+		times_buffer_data = times.astype("<f4").tobytes()
+		times_buffer_view, times_buffer_view_index = self.create_buffer_view(times_buffer_data, None)
+		return self.create_scalars_accessor(times_buffer_view_index, 0, times)
+
+	def create_scalars_accessor(self, buffer_view_index, index, values): # float scalars starting at index-th value of buffer view => accessor index
+		accessor, accessor_index = self.create_accessor()
+		accessor.bufferView = buffer_view_index
+		accessor.byteOffset = 4 * index
+		accessor.componentType = pygltflib.FLOAT
+		accessor.count = len(values)
+		accessor.type = pygltflib.SCALAR
+		accessor.min = [float(values.min())]
+		accessor.max = [float(values.max())]
+		return accessor_index
+
+	def create_keyframes_accessors(self, keyframes, accessor_type): # (bones, frames, K) array => [accessor index per bone]
+		bones_count, frames_count, components = keyframes.shape
+		stride = 4 * frames_count * components
+
+		buffer_view, buffer_view_index = self.create_buffer_view(keyframes.astype("<f4").tobytes(), None)
+		v_mins, v_maxs = keyframes.min(axis=1).tolist(), keyframes.max(axis=1).tolist()
+
+		accessors = []
+		for i in range(bones_count):
+			accessor, accessor_index = self.create_accessor()
+			accessor.bufferView = buffer_view_index
+			accessor.byteOffset = i * stride
+			accessor.componentType = pygltflib.FLOAT
+			accessor.count = frames_count
+			accessor.type = accessor_type
+			accessor.min = v_mins[i]
+			accessor.max = v_maxs[i]
+			accessors += [accessor_index]
+
+		return accessors
+
+	def add_channel(self, gltf_animation, input_accessor_index, output_accessor_index, node_index, path):
+		sampler_index = len(gltf_animation.samplers)
+		sampler = pygltflib.AnimationSampler()
+		sampler.input = input_accessor_index
+		sampler.interpolation = pygltflib.ANIM_LINEAR
+		sampler.output = output_accessor_index
+		gltf_animation.samplers.append(sampler)
+
+		target = pygltflib.AnimationChannelTarget()
+		target.node = node_index
+		target.path = path
+
+		channel = pygltflib.AnimationChannel()
+		channel.sampler = sampler_index
+		channel.target = target
+		gltf_animation.channels.append(channel)
 
 	def add_meshes(self, meshes_indexes, skin, rcra_skin):
 		morph_section = self.model.dat1.get_section(0x380A5744)
@@ -298,58 +313,43 @@ class GltfWriter(object):
 		for mi in meshes_indexes:
 			self.add_mesh(self.make_intermediate(self.meshes[mi]), self.meshes[mi], skin, rcra_skin, mi, shapekeys)
 
-	def make_intermediate(self, mesh):
-		points = []
-		normals = []
-		uvs = []
-		triangles = []
-
+	def make_intermediate(self, mesh): # => (points, normals, uvs, triangles) arrays
 		# vertexes
 
-		for vi in range(mesh.vertexStart, mesh.vertexStart + mesh.vertexCount):
-			v = self.vertexes[vi]
-			points += [[v.x, v.y, v.z]]
-			normals += [[v.nx, v.ny, v.nz]]
-			uvs += [[v.u * self.uv_scale, v.v * self.uv_scale, 0]]
+		start, end = mesh.vertexStart, mesh.vertexStart + mesh.vertexCount
+		points = self.positions[start:end]
+		normals = self.normals[start:end]
+		uvs = self.uvs[start:end] * self.uv_scale
 
 		# indexes
 
 		s = self.model.dat1.get_section(SECTION_INDEXES)
-		indexes = s.values
+		indexes = s.get_indexes()
 		
 		vc = mesh.vertexStart
 		if (mesh.get_flags() & 0x10) > 0:
 			vc = 0 # indexes are relative already
 
 		faces_count = mesh.indexCount // 3
-		for j in range(faces_count):
-			index_index = mesh.indexStart + j*3
-			#triangles += [[indexes[index_index+2]-vc, indexes[index_index+1]-vc, indexes[index_index]-vc]] # .ascii
-			triangles += [[indexes[index_index]-vc, indexes[index_index+1]-vc, indexes[index_index+2]-vc]] # .gltf
+		triangles = indexes[mesh.indexStart:mesh.indexStart + faces_count*3].astype(np.int64).reshape(-1, 3) - vc # .gltf order (.ascii has them reversed)
 
 		return (points, normals, uvs, triangles)
 
 	def add_mesh(self, mesh, ig_mesh, skin, rcra_skin, orig_mesh_index, shapekeys):
 		points, normals, uvs, triangles = mesh
 
-		vertexes_buffer_data = self.make_buffer_func(points, lambda x: struct.pack("<3f", x[0], x[1], x[2]))
-		indexes_buffer_data = self.make_buffer_func(triangles, lambda x: struct.pack("<3H", x[0], x[1], x[2]))
-		normals_buffer_data = self.make_buffer_func(normals, lambda x: struct.pack("<3f", x[0], x[1], x[2]))
-		uvs_buffer_data = self.make_buffer_func(uvs, lambda x: struct.pack("<2f", x[0], x[1]))
+		vertexes_buffer_data = points.astype("<f4").tobytes()
+		index_dtype, index_component_type = ("<u2", pygltflib.UNSIGNED_SHORT) if len(triangles) == 0 or triangles.max() <= 0xFFFF else ("<u4", pygltflib.UNSIGNED_INT)
+		indexes_buffer_data = triangles.astype(index_dtype).tobytes()
+		normals_buffer_data = normals.astype("<f4").tobytes()
+		uvs_buffer_data = uvs.astype("<f4").tobytes()
 
 		vertexes_buffer_view, vertexes_buffer_view_index = self.create_buffer_view(vertexes_buffer_data, pygltflib.ARRAY_BUFFER)
 		indexes_buffer_view, indexes_buffer_view_index = self.create_buffer_view(indexes_buffer_data, pygltflib.ELEMENT_ARRAY_BUFFER)
 		normals_buffer_view, normals_buffer_view_index = self.create_buffer_view(normals_buffer_data, pygltflib.ARRAY_BUFFER)
 		uvs_buffer_view, uvs_buffer_view_index = self.create_buffer_view(uvs_buffer_data, pygltflib.ARRAY_BUFFER)
 
-		min_ndx, max_ndx = None, None
-		for t in triangles:
-			for ndx in t:
-				if min_ndx is None or min_ndx > ndx:
-					min_ndx = ndx
-				if max_ndx is None or max_ndx < ndx:
-					max_ndx = ndx
-
+		(min_ndx,), (max_ndx,) = minmax_positions(triangles.reshape(-1, 1))
 		v_min, v_max = minmax_positions(points)
 
 		vertexes_accessor, vertexes_accessor_index = self.create_accessor()
@@ -364,7 +364,7 @@ class GltfWriter(object):
 		indexes_accessor, indexes_accessor_index = self.create_accessor()
 		indexes_accessor.bufferView = indexes_buffer_view_index
 		indexes_accessor.byteOffset = 0
-		indexes_accessor.componentType = pygltflib.UNSIGNED_SHORT
+		indexes_accessor.componentType = index_component_type
 		indexes_accessor.count = 3 * len(triangles)
 		indexes_accessor.type = pygltflib.SCALAR
 		indexes_accessor.min = [min_ndx]
@@ -394,36 +394,17 @@ class GltfWriter(object):
 		#
 
 		if skin is not None:
-			groups_count = 4
-			for vi in range(ig_mesh.vertexStart, ig_mesh.vertexStart + ig_mesh.vertexCount):
-				groups_count = max(len(skin[vi]), groups_count)
+			start, end = ig_mesh.vertexStart, ig_mesh.vertexStart + ig_mesh.vertexCount
+			groups_count = max(skin.get_width(start, end), 4)
+			joints_slots, weights_slots = skin.get_slots(start, end, (groups_count + 3) // 4 * 4)
 
 			for wi in range(0, groups_count, 4):
 				bufndx = wi//4
-				joints_buffer = []
-				weights_buffer = []
+				joints_buffer = joints_slots[:, wi:wi+4]
+				weights_buffer = weights_slots[:, wi:wi+4]
 
-				for vi in range(ig_mesh.vertexStart, ig_mesh.vertexStart + ig_mesh.vertexCount):
-					vertex = skin[vi]
-					joints = []
-					weights = []
-
-					for j in range(0, 4):
-						g = 0
-						w = 0
-						if wi + j < len(vertex):
-							g, w = vertex[wi + j]
-							if w == 0:
-								g = 0
-
-						joints += [g]
-						weights += [w]
-
-					joints_buffer += [joints]
-					weights_buffer += [weights]
-
-				joints_buffer_data = self.make_buffer_func(joints_buffer, lambda x: struct.pack("<4H", x[0], x[1], x[2], x[3]))
-				weights_buffer_data = self.make_buffer_func(weights_buffer, lambda x: struct.pack("<4f", x[0], x[1], x[2], x[3]))
+				joints_buffer_data = joints_buffer.astype("<u2").tobytes()
+				weights_buffer_data = weights_buffer.astype("<f4").tobytes()
 
 				joints_buffer_view, joints_buffer_view_index = self.create_buffer_view(joints_buffer_data, pygltflib.ARRAY_BUFFER)
 				weights_buffer_view, weights_buffer_view_index = self.create_buffer_view(weights_buffer_data, pygltflib.ARRAY_BUFFER)
@@ -587,43 +568,21 @@ class GltfWriter(object):
 				print(f"-- sm{subset_id:02}, {mi.packing_count}, {len(mi.subset_data_tables[i])}, {sorted(indexes) == list(range(len(indexes)))}, ranges: {joined_ranges(indexes)}")
 			print(f"shapekey '{sk_name}': {len(positions)}/{len(indexes)} vertexes into {orig_vertexes_count}, min={min(indexes)}, max={max(indexes)}")
 
-		positions_buffer = [(0,0,0) for i in range(orig_vertexes_count)]
-		for i, ndx in enumerate(indexes):
-			positions_buffer[ndx] = positions[i]
+		positions_buffer = np.zeros((orig_vertexes_count, 3), dtype=np.float64)
+		positions_buffer[indexes] = np.array(positions, dtype=np.float64).reshape(-1, 3)[:len(indexes)]
 
-		normals_buffer = [(0,0,0) for i in range(orig_vertexes_count)]
+		normals_buffer = np.zeros((orig_vertexes_count, 3), dtype=np.float64)
 		if len(normals) > 0:
-			for i, ndx in enumerate(indexes):
-				normals_buffer[ndx] = normals[i]
+			normals_buffer[indexes] = np.array(normals, dtype=np.float64).reshape(-1, 3)[:len(indexes)]
 
-		skpos_buffer_data = self.make_buffer_func(positions_buffer, lambda x: struct.pack("<3f", x[0], x[1], x[2]))
+		skpos_buffer_data = positions_buffer.astype("<f4").tobytes()
 		skpos_buffer_view, skpos_buffer_view_index = self.create_buffer_view(skpos_buffer_data, pygltflib.ARRAY_BUFFER)
 
 		sknorm_buffer_data, sknorm_buffer_view, sknorm_buffer_view_index = None, None, None
 		if len(normals) > 0:
-			sknorm_buffer_data = self.make_buffer_func(normals_buffer, lambda x: struct.pack("<3f", x[0], x[1], x[2]))
+			sknorm_buffer_data = normals_buffer.astype("<f4").tobytes()
 			sknorm_buffer_view, sknorm_buffer_view_index = self.create_buffer_view(sknorm_buffer_data, pygltflib.ARRAY_BUFFER)
 
-		def minmax_positions(positions):
-			min_x, min_y, min_z = None, None, None
-			max_x, max_y, max_z = None, None, None
-			for p in positions:
-				x, y, z = p[0], p[1], p[2]
-				if min_x is None or min_x > x:
-					min_x = x
-				if min_y is None or min_y > y:
-					min_y = y
-				if min_z is None or min_z > z:
-					min_z = z
-				if max_x is None or max_x < x:
-					max_x = x
-				if max_y is None or max_y < y:
-					max_y = y
-				if max_z is None or max_z < z:
-					max_z = z
-
-			return ([min_x, min_y, min_z], [max_x, max_y, max_z])
-
 		v_min, v_max = minmax_positions(positions_buffer)
 
 		skpos_accessor, skpos_accessor_index = self.create_accessor()
@@ -659,20 +618,6 @@ class GltfWriter(object):
 
 	#	
 
-	def make_buffer(self, values, struct_format):
-		of = io.BytesIO(bytes())
-		for v in values:
-			of.write(struct.pack(struct_format, v))
-		of.seek(0)
-		return of.read()
-
-	def make_buffer_func(self, values, func):
-		of = io.BytesIO(bytes())
-		for v in values:
-			of.write(func(v))
-		of.seek(0)
-		return of.read()
-
 	def create_mesh(self):
 		gltf_mesh = pygltflib.Mesh()
 		gltf_mesh_index = self.current_mesh_index
@@ -694,6 +639,9 @@ class GltfWriter(object):
 		return (gltf_node, gltf_node_index)
 
 	def create_buffer_view(self, data, buffer_view_target):
+		if self.glb:
+			return self.create_buffer_view2(data, buffer_view_target)
+
 		buffer = pygltflib.Buffer()
 		buffer_index = self.current_buffer_index
 		self.current_buffer_index += 1
@@ -712,12 +660,11 @@ class GltfWriter(object):
 		if buffer_view_target is not None:
 			buffer_view.target = buffer_view_target
 
-		# self.binary_blob += data
 		buffer.uri = "data:application/octet-stream;base64," + base64.b64encode(data).decode("ascii")
 
 		return (buffer_view, buffer_view_index)
 
-	def create_buffer_view2(self, data, buffer_view_target):
+	def create_buffer_view2(self, data, buffer_view_target): # appends to the single buffer, saved as GLB's BIN chunk
 		if self.current_buffer_index == 0:
 			buffer = pygltflib.Buffer()
 			buffer.byteLength = 0
@@ -733,15 +680,16 @@ class GltfWriter(object):
 		self.current_buffer_view_index += 1
 		self.gltf.bufferViews.append(buffer_view)
 
-		offset = buffer.byteLength
-		buffer.byteLength += len(data)
+		offset = len(self.binary_blob)
+		self.binary_blob += data
+		self.binary_blob += b"\0" * (-len(data) % GLB_ALIGNMENT) # so next view (and BIN chunk end) is aligned
+		buffer.byteLength = len(self.binary_blob)
 
 		buffer_view.buffer = buffer_index
 		buffer_view.byteOffset = offset
 		buffer_view.byteLength = len(data)
-		buffer_view.target = buffer_view_target
-
-		self.binary_blob += data
+		if buffer_view_target is not None:
+			buffer_view.target = buffer_view_target
 
 		return (buffer_view, buffer_view_index)
 
@@ -755,115 +703,8 @@ class GltfWriter(object):
 
 	#
 
-	def get_skin(self):
-		skin_section = self.model.dat1.get_section(SECTION_SKIN_DATA)
-		skin_batch_section = self.model.dat1.get_section(SECTION_SKIN_BATCH)
-
-		has_skin = (skin_section is not None and skin_batch_section is not None)
-		skin = None
-		rcra_skin = None
-
-		if has_skin:
-			skin = []
-
-			has_to_be_len = 0
-			for i, l in enumerate(skin_batch_section.batches):
-				offset = l.offset
-				count = l.vertex_count
-
-				for j in range(0, count, 16):
-					groups = skin_section._raw[offset] + 1
-					offset += 1
-
-					for z in range(16):
-						if j + z >= count:
-							break
-
-						vertex = []
-
-						if groups == 1:
-							bone = skin_section._raw[offset]
-							offset += 1
-							vertex += [(bone, 1.0)]
-						else:
-							for k in range(groups):
-								bone, weight = struct.unpack("<BB", skin_section._raw[offset:offset+2])
-								offset += 2
-								vertex += [(bone, weight/256.0)]
-
-						skin += [vertex]
-
-			def fix_weights(v):
-				mp = {}
-				order = []
-				for b, w in v:
-					mp[b] = mp.get(b, 0) + w
-					if b not in order:
-						order += [b]
-				return [(b, mp[b]) for b in order]
-
-			skin = [fix_weights(v) for v in skin]
-
-		#
-
-		rcra_skin_section = self.model.dat1.get_section(SECTION_RCRA_SKIN)
-		if rcra_skin_section is not None:
-			rcra_skin = []
-			for v in rcra_skin_section.entries:
-				b1, b2, b3, b4, w1, w2, w3, w4 = v
-				
-				temp = {}
-				temp[b1] = w1
-				temp[b2] = temp.get(b2, 0) + w2
-				temp[b3] = temp.get(b3, 0) + w3
-				temp[b4] = temp.get(b4, 0) + w4
-
-				sm = w1 + w2 + w3 + w4
-				if sm > 0 and sm != 1:
-					for k in temp:
-						temp[k] = temp[k] / sm
-
-				weights = [(k, temp[k]) for k in temp]
-				weights = sorted(weights, key=lambda x: -x[1])
-				weights = [w for w in weights if w[1] > 0]
-
-				rcra_skin += [weights]
-
-			if has_skin:
-				def diff_skins(skin, rcra_skin):
-					def same_weights(v1, v2):
-						if len(v1) != len(v2):
-							return False
-
-						for a, b in zip(v1, v2):
-							b1, w1 = a
-							b2, w2 = b
-							if b1 != b2 or abs(w1 - w2) >= 0.01:
-								return False
-
-						return True
-
-					print(len(skin), len(rcra_skin))
-					same = True
-					for v1, v2 in zip(skin, rcra_skin):
-						if not same_weights(v1, v2):
-							print(v1, v2)
-							same = False
-							# break
-					if same:
-						print("same skin")
-
-				# diff_skins(skin, rcra_skin)
-
-			# skin = rcra_skin
-			# has_skin = True
-
-		#
-
-		return skin, rcra_skin
-
 	def get_weights(self, i, skin, weights_count):
-		vertex = skin[i]
+		vertex = skin.get_vertex(i)
 		fmt = pretty_format
 
 		groups = ""
@@ -917,36 +758,94 @@ class GltfWriter(object):
 
 ###
 
+import os.path
 import sys
 
 import dat1lib
+import dat1lib.types.autogen
 import dat1lib.types.dat1
 import dat1lib.types.model
 
 ###
 
-def main(argv):
-	if len(argv) < 3:
-		print("Usage:")
-		print("$ {} <.model filename> <.animclip filename> [output .gltf filename]".format(argv[0]))
-		return
-
-	#
-
-	fn = argv[1]
-	model = None
+def read_asset(fn): # => asset or None (reason is printed)
 	try:
 		with open(fn, "rb") as f:
-			model = dat1lib.read(f)
+			asset = dat1lib.read(f)
 	except Exception as e:
 		print("[!] Couldn't open '{}'".format(fn))
 		print(e)
+		return None
+
+	if asset is None:
+		print("[!] Couldn't comprehend '{}'".format(fn))
+	return asset
+
+def get_clip_name(animclip, fn):
+	s = animclip.dat1.get_section(SECTION_CLIP_BUILT)
+	name = None if s is None else s.get_name()
+	if name is None:
+		name = os.path.basename(fn)
+	return name
+
+def get_animset_clips(animset, root): # => [(name, animclip)] of referenced clips found in root (extracted assets, e.g. <output>/<span>)
+	s = animset.dat1.get_section(SECTION_CLIPS)
+	if s is None:
+		return []
+
+	clips = []
+	for aid, string_offset in zip(s.hashes, s.string_offsets):
+		path = animset.dat1._strings_map.get(string_offset, None)
+		candidates = ["{:016X}".format(aid)] # how extract_assets.py names assets with unknown paths
+		if path is not None:
+			candidates = [path.lower().replace('\\', '/').strip()] + candidates
+
+		found = [os.path.join(root, c) for c in candidates if os.path.isfile(os.path.join(root, c))]
+		if len(found) == 0:
+			print("[!] Clip {:016X} ({}) not found in '{}'".format(aid, path, root))
+			continue
+
+		animclip = read_asset(found[0])
+		if isinstance(animclip, dat1lib.types.autogen.AnimClip):
+			clips += [(get_clip_name(animclip, found[0]), animclip)]
+
+	return clips
+
+def main(argv):
+	options = {"--glb": False, "--root": "."}
+	args = []
+	i = 1
+	while i < len(argv):
+		if argv[i] == "--glb":
+			options["--glb"] = True
+		elif argv[i] == "--root" and i+1 < len(argv):
+			options["--root"] = argv[i+1]
+			i += 1
+		else:
+			args += [argv[i]]
+		i += 1
+
+	glb = options["--glb"]
+
+	output_fn = None
+	if len(args) > 2 and args[-1].lower().endswith((".gltf", ".glb")):
+		output_fn = args[-1]
+		args = args[:-1]
+
+	if len(args) < 2:
+		print("Usage:")
+		print("$ {} <.model filename> <.animclip or .animset filename> [more .animclip/.animset filenames...] [output .gltf/.glb filename] [--root DIR] [--glb]".format(argv[0]))
+		print("")
+		print("Every clip becomes a separate animation of the same skeleton in one file.")
+		print("")
+		print("  --root DIR  where to look for clips referenced by .animset (extracted span directory; current directory by default)")
+		print("  --glb       write binary .glb (single buffer in BIN chunk) instead of .gltf with base64 buffers")
 		return
 
 	#
-	
+
+	model = read_asset(args[0])
 	if model is None:
-		print("[!] Couldn't comprehend '{}'".format(fn))
 		return
 
 	if not isinstance(model, (dat1lib.types.model.Model, dat1lib.types.model.Model2, dat1lib.types.model.ModelRcra)):
@@ -955,37 +854,35 @@ def main(argv):
 
 	#
 
-	ac_fn = argv[2]
-	animclip = None
-	try:
-		with open(ac_fn, "rb") as f:
-			animclip = dat1lib.read(f)
-	except Exception as e:
-		print("[!] Couldn't open '{}'".format(ac_fn))
-		print(e)
-		return
+	animclips = []
+	for fn in args[1:]:
+		asset = read_asset(fn)
+		if asset is None:
+			return
 
-	#
-	
-	if animclip is None:
-		print("[!] Couldn't comprehend '{}'".format(ac_fn))
-		return
+		if isinstance(asset, dat1lib.types.autogen.AnimClip):
+			animclips += [(get_clip_name(asset, fn), asset)]
+		elif isinstance(asset, dat1lib.types.autogen.AnimSet):
+			animclips += get_animset_clips(asset, options["--root"])
+		else:
+			print("[!] '{}' is not an animclip or animset".format(fn))
+			return
 
-	if not isinstance(animclip, dat1lib.types.autogen.AnimClip):
-		print("[!] Not an animclip")
+	if len(animclips) == 0:
+		print("[!] No clips to apply")
 		return
 
 	#
 
-	output_fn = ac_fn + ".gltf"
-	if len(argv) > 3:
-		output_fn = argv[3]
+	if output_fn is None:
+		output_fn = args[1] + (".glb" if glb else ".gltf")
 
 	looks = [0]
 	looks = None # all looks
 	lod = 0
-	helper = GltfWriter()
-	helper.write_model(output_fn, model, animclip, looks, lod)
+	helper = GltfWriter(glb)
+	helper.write_model(output_fn, model, animclips, looks, lod)
+	print("{} clips written to '{}'".format(len(animclips), output_fn))
 
 if __name__ == "__main__":
 	main(sys.argv)
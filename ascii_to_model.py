@@ -11,6 +11,7 @@ import dat1lib.types.sections.model.meshes
 import dat1lib.types.sections.model.skin
 import dat1lib.types.sections.model.unknowns
 import dat1lib.utils as utils
+import numpy as np
 import struct
 
 SECTION_INDEXES     = dat1lib.types.sections.model.geo.IndexesSection.TAG
@@ -394,74 +395,32 @@ class ModelInjector(object):
 		return meshes_updates
 
 	def calculate_tangents(self, meshes_count):
-		tangent = []
-		bitangent = []
-
-		for i in range(self.current_vertex_index):
-			tangent += [(0, 0, 0)]
-			bitangent += [(0, 0, 0)]
+		positions, _, uvs = self.vertexes_section.get_arrays()
+		indexes = np.array(self.indexes_section.values, dtype=np.int64)
 
 		s = self.model.dat1.get_section(SECTION_MESHES)
 		meshes = s.meshes
+		triangles = []
 		for mi in range(meshes_count):
 			mesh = meshes[mi]
 
 			vs = mesh.vertexStart
 			f0 = mesh.indexStart
-			nf = mesh.indexCount
+			nf = mesh.indexCount // 3 * 3
 			v_offset = vs
 
 			if (mesh.get_flags() & 0x10) > 0:
 				v_offset = 0
 
-			for f in range(0, nf, 3):
-				i0 = self.indexes_section.values[f0 + f + 2] - v_offset
-				i1 = self.indexes_section.values[f0 + f + 1] - v_offset
-				i2 = self.indexes_section.values[f0 + f + 0] - v_offset
-
-				v0 = self.vertexes_section.vertexes[vs + i0]
-				p0 = (v0.x, v0.y, v0.z)
-
-				v1 = self.vertexes_section.vertexes[vs + i1]
-				p1 = (v1.x, v1.y, v1.z)
-
-				v2 = self.vertexes_section.vertexes[vs + i2]
-				p2 = (v2.x, v2.y, v2.z)
-
-				def vec_mult_scalar(vc, sc):
-					return (vc[0] * sc, vc[1] * sc, vc[2] * sc)
-
-				def vec_minus_vec(vc1, vc2):
-					return (vc1[0] - vc2[0], vc1[1] - vc2[1], vc1[2] - vc2[2])
-
-				def vec_plus_vec(vc1, vc2):
-					return (vc1[0] + vc2[0], vc1[1] + vc2[1], vc1[2] + vc2[2])
-
-				e1 = vec_minus_vec(p1, p0)
-				e2 = vec_minus_vec(p2, p0)
-
-				x1 = v1.u - v0.u
-				x2 = v2.u - v0.u
-				y1 = v1.v - v0.v
-				y2 = v2.v - v0.v
-				r = x1*y2 - x2*y1
-				if r > 0:
-					r = 1.0 / r
-
-				t = vec_mult_scalar(vec_minus_vec(vec_mult_scalar(e1, y2), vec_mult_scalar(e2, y1)), r) # (e1 * y2 - e2 * y1) * r
-				b = vec_mult_scalar(vec_minus_vec(vec_mult_scalar(e2, x1), vec_mult_scalar(e1, x2)), r) # (e2 * x1 - e1 * x2) * r
-
-				tangent[vs + i0] = vec_plus_vec(tangent[vs + i0], t)
-				tangent[vs + i1] = vec_plus_vec(tangent[vs + i1], t)
-				tangent[vs + i2] = vec_plus_vec(tangent[vs + i2], t)
+			triangles += [indexes[f0:f0 + nf].reshape(-1, 3)[:, ::-1] - v_offset + vs] # reversed, same as faces are written
 
-				bitangent[vs + i0] = vec_plus_vec(bitangent[vs + i0], b)
-				bitangent[vs + i1] = vec_plus_vec(bitangent[vs + i1], b)
-				bitangent[vs + i2] = vec_plus_vec(bitangent[vs + i2], b)
+		triangles = np.concatenate(triangles) if len(triangles) > 0 else np.zeros((0, 3), dtype=np.int64)
+		tangents, bitangents = dat1lib.types.sections.model.geo.calculate_tangents(positions, uvs.astype(np.float64), triangles, self.current_vertex_index)
 
-		for i in range(self.current_vertex_index):
-			self.vertexes_section.vertexes[i].tangent = tangent[i]
-			self.vertexes_section.vertexes[i].bitangent = bitangent[i]
+		vertexes = self.vertexes_section.vertexes
+		for i, (t, b) in enumerate(zip(tangents.tolist(), bitangents.tolist())):
+			vertexes[i].tangent = tuple(t)
+			vertexes[i].bitangent = tuple(b)
 
 	#
 
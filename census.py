@@ -0,0 +1,323 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import dat1lib
+import dat1lib.extraction
+import dat1lib.types.dat1
+import dat1lib.types.sections
+import dat1lib.types.toc
+import dat1lib.types.toc2
+import concurrent.futures
+import io
+import json
+import multiprocessing
+import os
+import os.path
+import struct
+import sys
+import traceback
+
+DAT1_MAGIC = 0x44415431
+ASSET_HEADER_SIZE = 36
+PREFIX_SIZE = 4096 # enough for DAT1 header of almost any asset; the rest are read fully
+CHUNK_SIZE = 1024 # assets per task
+
+###
+
+class Stat(object):
+	def __init__(self):
+		self.count = 0
+		self.total = 0
+		self.min, self.min_example = None, None
+		self.max, self.max_example = None, None
+		self.histogram = {} # bit length -> count, so buckets are [2^(n-1), 2^n)
+
+	def add(self, value, example):
+		self.count += 1
+		self.total += value
+		if self.min is None or value < self.min:
+			self.min, self.min_example = value, example
+		if self.max is None or value > self.max:
+			self.max, self.max_example = value, example
+
+		b = value.bit_length()
+		self.histogram[b] = self.histogram.get(b, 0) + 1
+
+	def merge(self, other):
+		if other.count == 0:
+			return
+
+		self.count += other.count
+		self.total += other.total
+		if self.min is None or other.min < self.min:
+			self.min, self.min_example = other.min, other.min_example
+		if self.max is None or other.max > self.max:
+			self.max, self.max_example = other.max, other.max_example
+
+		for b in other.histogram:
+			self.histogram[b] = self.histogram.get(b, 0) + other.histogram[b]
+
+	def to_json(self):
+		histogram = {}
+		for b in sorted(self.histogram):
+			lo = 0 if b == 0 else (1 << (b-1))
+			histogram["{}..{}".format(lo, (1 << b) - 1)] = self.histogram[b]
+
+		return {
+			"min": self.min,
+			"max": self.max,
+			"avg": round(self.total / self.count, 1) if self.count > 0 else None,
+			"histogram": histogram,
+			"examples": {"min": _format_aid(self.min_example), "max": _format_aid(self.max_example)}
+		}
+
+def _format_aid(aid):
+	if aid is None:
+		return None
+	return "{:016X}".format(aid)
+
+class TypeStats(object):
+	def __init__(self):
+		self.sizes = Stat()
+		self.sections = Stat()
+		self.tags = {} # tag -> Stat of section sizes
+
+	def add(self, aid, size, sections):
+		self.sizes.add(size, aid)
+		if sections is None: # not a DAT1-based asset
+			return
+
+		self.sections.add(len(sections), aid)
+		for tag, section_size in sections:
+			if tag not in self.tags:
+				self.tags[tag] = Stat()
+			self.tags[tag].add(section_size, aid)
+
+	def merge(self, other):
+		self.sizes.merge(other.sizes)
+		self.sections.merge(other.sections)
+		for tag in other.tags:
+			if tag not in self.tags:
+				self.tags[tag] = Stat()
+			self.tags[tag].merge(other.tags[tag])
+
+	def to_json(self, magic):
+		name = None
+		if magic in dat1lib.types.KNOWN_TYPES:
+			name = dat1lib.types.KNOWN_TYPES[magic].__name__
+
+		tags = {}
+		for tag in sorted(self.tags, key=lambda t: -self.tags[t].count):
+			stat = self.tags[tag]
+			section_name = None
+			if tag in dat1lib.types.sections.KNOWN_SECTIONS:
+				section_name = dat1lib.types.sections.KNOWN_SECTIONS[tag].__name__
+
+			tags["{:08X}".format(tag)] = {
+				"name": section_name,
+				"occurrences": stat.count,
+				"always_present": (stat.count == self.sections.count),
+				"size": stat.to_json()
+			}
+
+		sections = self.sections.to_json()
+		sections["examples"] = {"max": sections["examples"]["max"]}
+
+		return {
+			"name": name,
+			"count": self.sizes.count,
+			"size": self.sizes.to_json(),
+			"sections": sections,
+			"tags": tags
+		}
+
+###
+
+class NeedFullData(Exception):
+	pass
+
+def parse_sections(data): # => [(tag, size)] or None, if asset isn't DAT1-based
+	for start in (ASSET_HEADER_SIZE, 0):
+		if len(data) < start + 16:
+			continue
+
+		if struct.unpack_from("<I", data, start)[0] != DAT1_MAGIC:
+			# DAT1 might be compressed, and it's only parsed by DAT1 class from the whole asset
+			for shift in (1, 2, 3):
+				if len(data) >= start + shift + 4 and struct.unpack_from("<I", data, start + shift)[0] == DAT1_MAGIC:
+					raise NeedFullData()
+			continue
+
+		sections_count = struct.unpack_from("<H", data, start + 12)[0]
+		if len(data) < start + 16 + 12 * sections_count:
+			raise NeedFullData()
+
+		result = []
+		for i in range(sections_count):
+			tag, _, size = struct.unpack_from("<III", data, start + 16 + 12 * i)
+			result += [(tag, size)]
+		return result
+
+	return None
+
+def parse_sections_fully(data):
+	for start in (ASSET_HEADER_SIZE, 0):
+		try:
+			dat1 = dat1lib.types.dat1.DAT1(io.BytesIO(data[start:]), ignore_sections_exceptions=True)
+			if dat1.header.magic == DAT1_MAGIC:
+				return [(s.tag, s.size) for s in dat1.header.sections]
+		except:
+			pass
+
+	return None
+
+def _census_chunk(rcra, archive_fn, entries): # runs in a worker process; entries are sorted by offset => ({magic: TypeStats}, failed)
+	toc_module = dat1lib.types.toc2 if rcra else dat1lib.types.toc
+
+	types, failed = {}, 0
+	def add(entry, data, sections):
+		magic = struct.unpack_from("<I", data, 0)[0]
+		if magic not in types:
+			types[magic] = TypeStats()
+		header = getattr(entry, "header", None)
+		types[magic].add(entry.asset_id, entry.size + (len(header) if header is not None else 0), sections)
+
+	full = []
+	try:
+		for entry, data in dat1lib.extraction.read_archive(toc_module, archive_fn, entries, PREFIX_SIZE):
+			try:
+				add(entry, data, parse_sections(data))
+			except NeedFullData:
+				full += [entry]
+			except:
+				failed += 1
+
+		for entry, data in dat1lib.extraction.read_archive(toc_module, archive_fn, full):
+			try:
+				add(entry, data, parse_sections_fully(data))
+			except:
+				failed += 1
+	except:
+		print(traceback.format_exc())
+		failed = len(entries)
+
+	return (types, failed)
+
+###
+
+def run_census(toc, jobs=None):
+	rcra = isinstance(toc, dat1lib.types.toc2.TOC2)
+
+	# every asset is counted once, even if it's present in several spans
+	by_archive = {}
+	seen = set()
+	ids = toc.get_assets_section().ids
+	for i in range(len(ids)):
+		if ids[i] in seen:
+			continue
+		seen.add(ids[i])
+
+		entry = toc.get_asset_entry_by_index(i)
+		if entry is None:
+			continue
+		if entry.archive not in by_archive:
+			by_archive[entry.archive] = []
+		by_archive[entry.archive] += [entry]
+
+	total = sum([len(by_archive[a]) for a in by_archive])
+	types, failed, done = {}, 0, 0
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+		futures = {}
+		for archive_index in by_archive:
+			archive_fn = toc.get_archive_path(archive_index)
+			entries = sorted(by_archive[archive_index], key=lambda e: e.offset)
+			for i in range(0, len(entries), CHUNK_SIZE):
+				chunk = entries[i:i+CHUNK_SIZE]
+				futures[pool.submit(_census_chunk, rcra, archive_fn, chunk)] = len(chunk)
+
+		for future in concurrent.futures.as_completed(futures):
+			done += futures[future]
+			try:
+				chunk_types, chunk_failed = future.result()
+				failed += chunk_failed
+				for magic in chunk_types:
+					if magic not in types:
+						types[magic] = TypeStats()
+					types[magic].merge(chunk_types[magic])
+			except:
+				failed += futures[future]
+				print(traceback.format_exc())
+
+			print("\r{}/{} assets, {} failed".format(done, total, failed), end="")
+
+	print("")
+
+	result = {"assets": total, "failed": failed, "types": {}}
+	for magic in sorted(types, key=lambda m: -types[m].sizes.count):
+		result["types"]["{:08X}".format(magic)] = types[magic].to_json(magic)
+	return result
+
+def main(argv):
+	if len(argv) < 2:
+		print("Usage:")
+		print("$ {} <asset_archive path> [--jobs N] [-o census.json]".format(argv[0]))
+		print("")
+		print("Parse DAT1 headers of all assets in toc (in parallel) and write")
+		print("per-type and per-section statistics: counts, sizes and examples")
+		return
+
+	#
+
+	asset_archive_path = argv[1]
+	jobs = None
+	output_fn = "census.json"
+	i = 2
+	while i < len(argv):
+		if argv[i] == "--jobs" and i+1 < len(argv):
+			jobs = max(1, int(argv[i+1]))
+		elif argv[i] == "-o" and i+1 < len(argv):
+			output_fn = argv[i+1]
+		else:
+			print("[!] Bad argument '{}'".format(argv[i]))
+			return
+		i += 2
+
+	#
+
+	toc_fn = os.path.join(asset_archive_path, "toc")
+	toc = None
+	try:
+		with open(toc_fn, "rb") as f:
+			toc = dat1lib.read(f)
+	except Exception as e:
+		print("[!] Couldn't open '{}'".format(toc_fn))
+		print(e)
+		return
+
+	#
+
+	if toc is None:
+		print("[!] Couldn't comprehend '{}'".format(toc_fn))
+		return
+
+	if not isinstance(toc, (dat1lib.types.toc.TOC, dat1lib.types.toc2.TOC2)):
+		print("[!] Not a toc")
+		return
+
+	toc.set_archives_dir(asset_archive_path)
+
+	#
+
+	result = run_census(toc, jobs)
+	result["toc"] = toc_fn
+
+	with open(output_fn, "w") as f:
+		json.dump(result, f, indent=4)
+
+	print("{} types, written to '{}'".format(len(result["types"]), output_fn))
+
+if __name__ == "__main__":
+	main(sys.argv)
@@ -41,6 +41,8 @@ def __import_submodules(module):
 		try:
 			md = importlib.import_module(mname + "." + m)
 			result += [md]
+		except ImportError:
+			raise # missing dependency (such as numpy) shouldn't silently turn assets into unknown ones
 		except:
 			pass
 
@@ -70,6 +72,8 @@ def __import_sections(module, directory):
 						types.sections.KNOWN_SECTIONS[c.TAG] = c
 				except:
 					pass
+		except ImportError:
+			raise # missing dependency (such as numpy) shouldn't silently turn sections into unknown ones
 		except:
 			pass
 
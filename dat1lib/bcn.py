@@ -0,0 +1,572 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+# decoder for BC1-BC7 (and some of the uncompressed) DXGI formats into RGBA8 arrays
+# blocks are decoded in bulk, a few block rows at a time, instead of one by one
+# tables are from Pillow's BcnDecode.c (public domain), which is also based on:
+# https://www.khronos.org/registry/OpenGL/extensions/ARB/ARB_texture_compression_bptc.txt
+
+DXGI_FORMAT_R32G32B32A32_FLOAT = 2
+DXGI_FORMAT_R16G16B16A16_FLOAT = 10
+DXGI_FORMAT_R8G8B8A8_UNORM = 28
+DXGI_FORMAT_R8G8B8A8_UNORM_SRGB = 29
+DXGI_FORMAT_R8G8_UNORM = 49
+DXGI_FORMAT_R8_UNORM = 61
+DXGI_FORMAT_A8_UNORM = 65
+DXGI_FORMAT_B8G8R8A8_UNORM = 87
+DXGI_FORMAT_B8G8R8X8_UNORM = 88
+DXGI_FORMAT_B8G8R8A8_UNORM_SRGB = 91
+
+BLOCK_FORMATS = { # DXGI format => (decoder name, block size)
+	70: ("BC1", 8), 71: ("BC1", 8), 72: ("BC1", 8),
+	73: ("BC2", 16), 74: ("BC2", 16), 75: ("BC2", 16),
+	76: ("BC3", 16), 77: ("BC3", 16), 78: ("BC3", 16),
+	79: ("BC4", 8), 80: ("BC4", 8), 81: ("BC4S", 8),
+	82: ("BC5", 16), 83: ("BC5", 16), 84: ("BC5S", 16),
+	94: ("BC6H", 16), 95: ("BC6H", 16), 96: ("BC6HS", 16),
+	97: ("BC7", 16), 98: ("BC7", 16), 99: ("BC7", 16)
+}
+
+PIXEL_FORMATS = { # DXGI format => bytes per pixel
+	DXGI_FORMAT_R32G32B32A32_FLOAT: 16,
+	DXGI_FORMAT_R16G16B16A16_FLOAT: 8,
+	DXGI_FORMAT_R8G8B8A8_UNORM: 4,
+	DXGI_FORMAT_R8G8B8A8_UNORM_SRGB: 4,
+	DXGI_FORMAT_R8G8_UNORM: 2,
+	DXGI_FORMAT_R8_UNORM: 1,
+	DXGI_FORMAT_A8_UNORM: 1,
+	DXGI_FORMAT_B8G8R8A8_UNORM: 4,
+	DXGI_FORMAT_B8G8R8X8_UNORM: 4,
+	DXGI_FORMAT_B8G8R8A8_UNORM_SRGB: 4
+}
+
+BLOCKS_PER_CHUNK = 16384 # how many blocks are decoded at once (at least one row is always decoded)
+
+###
+
+def is_supported(fmt):
+	return (fmt in BLOCK_FORMATS or fmt in PIXEL_FORMATS)
+
+def decode(data, width, height, fmt): # -> (height, width, 4) uint8 array
+	if fmt in PIXEL_FORMATS:
+		return _decode_pixels(data, width, height, fmt)
+
+	if fmt not in BLOCK_FORMATS:
+		raise Exception("Unsupported DXGI format: {}".format(fmt))
+
+	name, block_size = BLOCK_FORMATS[fmt]
+	decoder = DECODERS[name]
+
+	bw = max(1, (width + 3) // 4)
+	bh = max(1, (height + 3) // 4)
+	needed = bw * bh * block_size
+
+	blocks = np.frombuffer(data, dtype=np.uint8, count=min(len(data), needed))
+	if len(blocks) < needed:
+		blocks = np.concatenate([blocks, np.zeros(needed - len(blocks), dtype=np.uint8)])
+	blocks = blocks.reshape(bh, bw, block_size)
+
+	result = np.empty((bh * 4, bw * 4, 4), dtype=np.uint8)
+	rows_per_chunk = max(1, BLOCKS_PER_CHUNK // bw)
+	for y in range(0, bh, rows_per_chunk):
+		rows = blocks[y:y + rows_per_chunk]
+		n = rows.shape[0]
+		pixels = decoder(rows.reshape(n * bw, block_size)) # (blocks, 16, 4)
+		pixels = pixels.reshape(n, bw, 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(n * 4, bw * 4, 4)
+		result[y * 4:(y + n) * 4] = pixels
+
+	return result[:height, :width]
+
+def _decode_pixels(data, width, height, fmt):
+	bpp = PIXEL_FORMATS[fmt]
+	needed = width * height * bpp
+
+	raw = np.frombuffer(data, dtype=np.uint8, count=min(len(data), needed))
+	if len(raw) < needed:
+		raw = np.concatenate([raw, np.zeros(needed - len(raw), dtype=np.uint8)])
+
+	result = np.zeros((height, width, 4), dtype=np.uint8)
+	result[:, :, 3] = 255
+
+	if fmt in (DXGI_FORMAT_R8G8B8A8_UNORM, DXGI_FORMAT_R8G8B8A8_UNORM_SRGB):
+		result[:] = raw.reshape(height, width, 4)
+	elif fmt in (DXGI_FORMAT_B8G8R8A8_UNORM, DXGI_FORMAT_B8G8R8A8_UNORM_SRGB, DXGI_FORMAT_B8G8R8X8_UNORM):
+		result[:] = raw.reshape(height, width, 4)[:, :, [2, 1, 0, 3]]
+		if fmt == DXGI_FORMAT_B8G8R8X8_UNORM:
+			result[:, :, 3] = 255
+	elif fmt == DXGI_FORMAT_R8G8_UNORM:
+		result[:, :, :2] = raw.reshape(height, width, 2)
+	elif fmt == DXGI_FORMAT_R8_UNORM:
+		result[:, :, :3] = raw.reshape(height, width, 1)
+	elif fmt == DXGI_FORMAT_A8_UNORM:
+		result[:, :, 3] = raw.reshape(height, width)
+	elif fmt in (DXGI_FORMAT_R16G16B16A16_FLOAT, DXGI_FORMAT_R32G32B32A32_FLOAT):
+		dtype = "<f2" if fmt == DXGI_FORMAT_R16G16B16A16_FLOAT else "<f4"
+		values = raw.view(dtype).reshape(height, width, 4).astype(np.float32)
+		result[:] = _to_unorm8(values)
+
+	return result
+
+def _to_unorm8(values):
+	values = np.nan_to_num(values, nan=0.0, posinf=1.0, neginf=0.0)
+	return (np.clip(values, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+### BC1-BC5
+
+PIXELS = np.arange(16)
+
+def _load_le(blocks, start, count): # little-endian integer from `count` bytes of each block
+	result = np.zeros(blocks.shape[0], dtype=np.int64)
+	for i in range(count):
+		result |= blocks[:, start + i].astype(np.int64) << (8 * i)
+	return result
+
+def _decode_565(c):
+	r = (c >> 11) & 31
+	g = (c >> 5) & 63
+	b = c & 31
+	return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=1)
+
+def _decode_bc1_color(blocks, separate_alpha): # -> (N, 16, 4) int64
+	c0 = _load_le(blocks, 0, 2)
+	c1 = _load_le(blocks, 2, 2)
+	rgb0 = _decode_565(c0)
+	rgb1 = _decode_565(c1)
+
+	N = blocks.shape[0]
+	palette = np.zeros((N, 4, 4), dtype=np.int64)
+	palette[:, 0, :3] = rgb0
+	palette[:, 1, :3] = rgb1
+	palette[:, :3, 3] = 255
+
+	# BC2 and BC3 reuse BC1 color blocks but always act like c0 > c1
+	four_colors = (c0 > c1) | separate_alpha
+	palette[:, 2, :3] = np.where(four_colors[:, None], (2 * rgb0 + rgb1) // 3, (rgb0 + rgb1) // 2)
+	palette[:, 3, :3] = np.where(four_colors[:, None], (rgb0 + 2 * rgb1) // 3, 0)
+	palette[:, 3, 3] = np.where(four_colors, 255, 0)
+
+	indexes = (_load_le(blocks, 4, 4)[:, None] >> (2 * PIXELS)) & 3
+	return np.take_along_axis(palette, indexes[:, :, None], axis=1)
+
+def _decode_bc3_alpha(blocks, signed): # -> (N, 16) int64
+	a0 = blocks[:, 0].astype(np.int64)
+	a1 = blocks[:, 1].astype(np.int64)
+	if signed: # map [-128; 127] to [0; 255]
+		a0 = (a0 ^ 0x80)
+		a1 = (a1 ^ 0x80)
+
+	N = blocks.shape[0]
+	palette = np.zeros((N, 8), dtype=np.int64)
+	palette[:, 0] = a0
+	palette[:, 1] = a1
+
+	eight_values = (a0 > a1)
+	for i in range(1, 7):
+		palette[:, i + 1] = np.where(eight_values, ((7 - i) * a0 + i * a1) // 7, ((5 - i) * a0 + i * a1) // 5)
+	palette[:, 6] = np.where(eight_values, palette[:, 6], 0)
+	palette[:, 7] = np.where(eight_values, palette[:, 7], 255)
+
+	indexes = (_load_le(blocks, 2, 6)[:, None] >> (3 * PIXELS)) & 7
+	return np.take_along_axis(palette, indexes, axis=1)
+
+def _decode_bc1(blocks):
+	return _decode_bc1_color(blocks, False).astype(np.uint8)
+
+def _decode_bc2(blocks):
+	result = _decode_bc1_color(blocks[:, 8:], True)
+	alpha = (_load_le(blocks, 0, 8)[:, None] >> (4 * PIXELS)) & 15
+	result[:, :, 3] = (alpha << 4) | alpha
+	return result.astype(np.uint8)
+
+def _decode_bc3(blocks):
+	result = _decode_bc1_color(blocks[:, 8:], True)
+	result[:, :, 3] = _decode_bc3_alpha(blocks, False)
+	return result.astype(np.uint8)
+
+def _decode_bc4(blocks, signed=False):
+	result = np.empty((blocks.shape[0], 16, 4), dtype=np.uint8)
+	result[:, :, :3] = _decode_bc3_alpha(blocks, signed)[:, :, None]
+	result[:, :, 3] = 255
+	return result
+
+def _decode_bc5(blocks, signed=False):
+	result = np.zeros((blocks.shape[0], 16, 4), dtype=np.uint8)
+	result[:, :, 0] = _decode_bc3_alpha(blocks, signed)
+	result[:, :, 1] = _decode_bc3_alpha(blocks[:, 8:], signed)
+	result[:, :, 3] = 255
+	return result
+
+### BC6H and BC7 common stuff
+
+BC7_PARTITIONS_2 = np.array([
+	0xcccc, 0x8888, 0xeeee, 0xecc8, 0xc880, 0xfeec, 0xfec8, 0xec80, 0xc800, 0xffec,
+	0xfe80, 0xe800, 0xffe8, 0xff00, 0xfff0, 0xf000, 0xf710, 0x008e, 0x7100, 0x08ce,
+	0x008c, 0x7310, 0x3100, 0x8cce, 0x088c, 0x3110, 0x6666, 0x366c, 0x17e8, 0x0ff0,
+	0x718e, 0x399c, 0xaaaa, 0xf0f0, 0x5a5a, 0x33cc, 0x3c3c, 0x55aa, 0x9696, 0xa55a,
+	0x73ce, 0x13c8, 0x324c, 0x3bdc, 0x6996, 0xc33c, 0x9966, 0x0660, 0x0272, 0x04e4,
+	0x4e40, 0x2720, 0xc936, 0x936c, 0x39c6, 0x639c, 0x9336, 0x9cc6, 0x817e, 0xe718,
+	0xccf0, 0x0fcc, 0x7744, 0xee22
+], dtype=np.int64) # 1 bit per pixel
+
+BC7_PARTITIONS_3 = np.array([
+	0xaa685050, 0x6a5a5040, 0x5a5a4200, 0x5450a0a8, 0xa5a50000, 0xa0a05050, 0x5555a0a0,
+	0x5a5a5050, 0xaa550000, 0xaa555500, 0xaaaa5500, 0x90909090, 0x94949494, 0xa4a4a4a4,
+	0xa9a59450, 0x2a0a4250, 0xa5945040, 0x0a425054, 0xa5a5a500, 0x55a0a0a0, 0xa8a85454,
+	0x6a6a4040, 0xa4a45000, 0x1a1a0500, 0x0050a4a4, 0xaaa59090, 0x14696914, 0x69691400,
+	0xa08585a0, 0xaa821414, 0x50a4a450, 0x6a5a0200, 0xa9a58000, 0x5090a0a8, 0xa8a09050,
+	0x24242424, 0x00aa5500, 0x24924924, 0x24499224, 0x50a50a50, 0x500aa550, 0xaaaa4444,
+	0x66660000, 0xa5a0a5a0, 0x50a050a0, 0x69286928, 0x44aaaa44, 0x66666600, 0xaa444444,
+	0x54a854a8, 0x95809580, 0x96969600, 0xa85454a8, 0x80959580, 0xaa141414, 0x96960000,
+	0xaaaa1414, 0xa05050a0, 0xa0a5a5a0, 0x96000000, 0x40804080, 0xa9a8a9a8, 0xaaaaaa44,
+	0x2a4a5254
+], dtype=np.int64) # 2 bits per pixel
+
+BC7_ANCHORS_2 = np.array([
+	15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15,
+	15, 2, 8, 2, 2, 8, 8, 15, 2, 8, 2, 2, 8, 8, 2, 2,
+	15, 15, 6, 8, 2, 8, 15, 15, 2, 8, 2, 2, 2, 15, 15, 6,
+	6, 2, 6, 8, 15, 15, 2, 2, 15, 15, 15, 15, 15, 2, 2, 15
+], dtype=np.int64) # second subset of 2
+
+BC7_ANCHORS_3A = np.array([
+	3, 3, 15, 15, 8, 3, 15, 15, 8, 8, 6, 6, 6, 5, 3, 3,
+	3, 3, 8, 15, 3, 3, 6, 10, 5, 8, 8, 6, 8, 5, 15, 15,
+	8, 15, 3, 5, 6, 10, 8, 15, 15, 3, 15, 5, 15, 15, 15, 15,
+	3, 15, 5, 5, 5, 8, 5, 10, 5, 10, 8, 13, 15, 12, 3, 3
+], dtype=np.int64) # second subset of 3
+
+BC7_ANCHORS_3B = np.array([
+	15, 8, 8, 3, 15, 15, 3, 8, 15, 15, 15, 15, 15, 15, 15, 8,
+	15, 8, 15, 3, 15, 8, 15, 8, 3, 15, 6, 10, 15, 15, 10, 8,
+	15, 3, 15, 10, 10, 8, 9, 10, 6, 15, 8, 15, 3, 6, 6, 8,
+	15, 3, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 3, 15, 15, 8
+], dtype=np.int64) # third subset of 3
+
+BC7_WEIGHTS = {
+	2: np.array([0, 21, 43, 64], dtype=np.int64),
+	3: np.array([0, 9, 18, 27, 37, 46, 55, 64], dtype=np.int64),
+	4: np.array([0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64], dtype=np.int64)
+}
+
+def _unpack_bits(blocks): # -> (N, 128 + padding) array of 0/1, so reads a bit past the end are safe
+	bits = np.unpackbits(blocks, axis=1, bitorder='little')
+	return np.concatenate([bits, np.zeros((bits.shape[0], 8), dtype=np.uint8)], axis=1)
+
+def _get_bits(bits, start, count): # start is either a number or an array of per-block (or per-pixel) offsets
+	if count == 0:
+		return np.zeros(bits.shape[0] if not isinstance(start, np.ndarray) else start.shape, dtype=np.int64)
+
+	weights = np.int64(1) << np.arange(count, dtype=np.int64)
+	if not isinstance(start, np.ndarray):
+		return bits[:, start:start + count].astype(np.int64) @ weights
+
+	indexes = start.reshape(start.shape[0], -1)[:, :, None] + np.arange(count)
+	values = np.take_along_axis(bits, indexes.reshape(start.shape[0], -1), axis=1).reshape(indexes.shape)
+	return (values.astype(np.int64) @ weights).reshape(start.shape)
+
+def _get_subsets(ns, partition): # -> (N, 16) subset index of each pixel
+	if ns == 2:
+		return (BC7_PARTITIONS_2[partition][:, None] >> PIXELS) & 1
+	if ns == 3:
+		return (BC7_PARTITIONS_3[partition][:, None] >> (2 * PIXELS)) & 3
+	return np.zeros((partition.shape[0], 16), dtype=np.int64)
+
+def _get_indexes(bits, start, ns, partition, ib): # -> (N, 16) indexes, anchor pixels have one bit less
+	widths = np.full((partition.shape[0], 16), ib, dtype=np.int64)
+	widths[:, 0] -= 1
+	if ns == 2:
+		widths[PIXELS[None, :] == BC7_ANCHORS_2[partition][:, None]] -= 1
+	elif ns == 3:
+		widths[PIXELS[None, :] == BC7_ANCHORS_3A[partition][:, None]] -= 1
+		widths[PIXELS[None, :] == BC7_ANCHORS_3B[partition][:, None]] -= 1
+
+	starts = start + np.cumsum(widths, axis=1) - widths
+	return _get_bits(bits, starts, ib) & ((1 << widths) - 1)
+
+### BC7
+
+BC7_MODES = [ # ns, pb, rb, isb, cb, ab, epb, spb, ib, ib2
+	(3, 4, 0, 0, 4, 0, 1, 0, 3, 0),
+	(2, 6, 0, 0, 6, 0, 0, 1, 3, 0),
+	(3, 6, 0, 0, 5, 0, 0, 0, 2, 0),
+	(2, 6, 0, 0, 7, 0, 1, 0, 2, 0),
+	(1, 0, 2, 1, 5, 6, 0, 0, 2, 3),
+	(1, 0, 2, 0, 7, 8, 0, 0, 2, 2),
+	(1, 0, 0, 0, 7, 7, 1, 0, 4, 0),
+	(2, 6, 0, 0, 5, 5, 1, 0, 2, 0)
+]
+
+def _decode_bc7(blocks):
+	N = blocks.shape[0]
+	result = np.zeros((N, 16, 4), dtype=np.uint8) # reserved mode (no bits set in the first byte) decodes into zeros
+
+	# mode is the number of unset bits before the first set bit
+	modes = np.full(N, 8, dtype=np.int64)
+	for bit in range(7, -1, -1):
+		modes[(blocks[:, 0] >> bit) & 1 == 1] = bit
+
+	for mode in range(8):
+		selected = np.nonzero(modes == mode)[0]
+		if len(selected) > 0:
+			result[selected] = _decode_bc7_mode(blocks[selected], mode)
+
+	return result
+
+def _decode_bc7_mode(blocks, mode):
+	ns, pb, rb, isb, cb, ab, epb, spb, ib, ib2 = BC7_MODES[mode]
+	bits = _unpack_bits(blocks)
+	N = blocks.shape[0]
+	numep = ns * 2
+
+	bit = mode + 1
+	partition = _get_bits(bits, bit, pb)
+	bit += pb
+	rotation = _get_bits(bits, bit, rb)
+	bit += rb
+	index_sel = _get_bits(bits, bit, isb)
+	bit += isb
+
+	endpoints = np.zeros((N, numep, 4), dtype=np.int64)
+	for channel in range(3):
+		for i in range(numep):
+			endpoints[:, i, channel] = _get_bits(bits, bit, cb)
+			bit += cb
+
+	for i in range(numep):
+		if ab:
+			endpoints[:, i, 3] = _get_bits(bits, bit, ab)
+			bit += ab
+		else:
+			endpoints[:, i, 3] = 255
+
+	channels = 4 if ab else 3
+	if epb: # per endpoint
+		cb += 1
+		ab += 1 if ab else 0
+		for i in range(numep):
+			p = _get_bits(bits, bit, 1)[:, None]
+			bit += 1
+			endpoints[:, i, :channels] = (endpoints[:, i, :channels] << 1) | p
+
+	if spb: # per subset
+		cb += 1
+		ab += 1 if ab else 0
+		for i in range(0, numep, 2):
+			p = _get_bits(bits, bit, 1)[:, None, None]
+			bit += 1
+			endpoints[:, i:i+2, :channels] = (endpoints[:, i:i+2, :channels] << 1) | p
+
+	def expand(v, b):
+		v = v << (8 - b)
+		return v | (v >> b)
+
+	endpoints[:, :, :3] = expand(endpoints[:, :, :3], cb)
+	if ab:
+		endpoints[:, :, 3] = expand(endpoints[:, :, 3], ab)
+
+	# indexes
+
+	subsets = _get_subsets(ns, partition) * 2
+	e0 = np.take_along_axis(endpoints, subsets[:, :, None], axis=1)
+	e1 = np.take_along_axis(endpoints, subsets[:, :, None] + 1, axis=1)
+
+	i0 = _get_indexes(bits, bit, ns, partition, ib)
+	cw = BC7_WEIGHTS[ib][i0]
+	aw = cw
+
+	if ab and ib2:
+		i1 = _get_indexes(bits, bit + 16 * ib - ns, 1, partition, ib2)
+		aw = BC7_WEIGHTS[ib2][i1]
+		swap = (index_sel == 1)[:, None]
+		cw, aw = np.where(swap, aw, cw), np.where(swap, cw, aw)
+
+	weights = np.empty((N, 16, 4), dtype=np.int64)
+	weights[:, :, :3] = cw[:, :, None]
+	weights[:, :, 3] = aw
+	result = ((64 - weights) * e0 + weights * e1 + 32) >> 6
+
+	for r in (1, 2, 3):
+		rotated = (rotation == r)
+		if rotated.any():
+			channel = r - 1
+			result[rotated, :, channel], result[rotated, :, 3] = result[rotated, :, 3], result[rotated, :, channel].copy()
+
+	return result.astype(np.uint8)
+
+### BC6H
+
+BC6_MODES = [ # ns, tr, pb, epb, rb, gb, bb
+	(2, 1, 5, 10, 5, 5, 5),
+	(2, 1, 5, 7, 6, 6, 6),
+	(2, 1, 5, 11, 5, 4, 4),
+	(2, 1, 5, 11, 4, 5, 4),
+	(2, 1, 5, 11, 4, 4, 5),
+	(2, 1, 5, 9, 5, 5, 5),
+	(2, 1, 5, 8, 6, 5, 5),
+	(2, 1, 5, 8, 5, 6, 5),
+	(2, 1, 5, 8, 5, 5, 6),
+	(2, 0, 5, 6, 6, 6, 6),
+	(1, 0, 0, 10, 10, 10, 10),
+	(1, 1, 0, 11, 9, 9, 9),
+	(1, 1, 0, 12, 8, 8, 8),
+	(1, 1, 0, 16, 4, 4, 4)
+]
+
+# each value is (endpoint component << 4) | bit within it: r0, g0, b0, r1, g1, b1, r2, ...
+BC6_BIT_PACKINGS = [
+	[116, 132, 180, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 32, 33, 34, 35, 36, 37, 38,
+	 39, 40, 41, 48, 49, 50, 51, 52, 164, 112, 113, 114, 115, 64, 65, 66, 67, 68, 176, 160, 161, 162, 163, 80, 81, 82, 83, 84, 177, 128,
+	 129, 130, 131, 96, 97, 98, 99, 100, 178, 144, 145, 146, 147, 148, 179],
+	[117, 164, 165, 0, 1, 2, 3, 4, 5, 6, 176, 177, 132, 16, 17, 18, 19, 20, 21, 22, 133, 178, 116, 32, 33, 34, 35, 36, 37, 38,
+	 179, 181, 180, 48, 49, 50, 51, 52, 53, 112, 113, 114, 115, 64, 65, 66, 67, 68, 69, 160, 161, 162, 163, 80, 81, 82, 83, 84, 85, 128,
+	 129, 130, 131, 96, 97, 98, 99, 100, 101, 144, 145, 146, 147, 148, 149],
+	[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41,
+	 48, 49, 50, 51, 52, 10, 112, 113, 114, 115, 64, 65, 66, 67, 26, 176, 160, 161, 162, 163, 80, 81, 82, 83, 42, 177, 128, 129, 130, 131,
+	 96, 97, 98, 99, 100, 178, 144, 145, 146, 147, 148, 179],
+	[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41,
+	 48, 49, 50, 51, 10, 164, 112, 113, 114, 115, 64, 65, 66, 67, 68, 26, 160, 161, 162, 163, 80, 81, 82, 83, 42, 177, 128, 129, 130, 131,
+	 96, 97, 98, 99, 176, 178, 144, 145, 146, 147, 116, 179],
+	[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41,
+	 48, 49, 50, 51, 10, 132, 112, 113, 114, 115, 64, 65, 66, 67, 26, 176, 160, 161, 162, 163, 80, 81, 82, 83, 84, 42, 128, 129, 130, 131,
+	 96, 97, 98, 99, 177, 178, 144, 145, 146, 147, 180, 179],
+	[0, 1, 2, 3, 4, 5, 6, 7, 8, 132, 16, 17, 18, 19, 20, 21, 22, 23, 24, 116, 32, 33, 34, 35, 36, 37, 38, 39, 40, 180,
+	 48, 49, 50, 51, 52, 164, 112, 113, 114, 115, 64, 65, 66, 67, 68, 176, 160, 161, 162, 163, 80, 81, 82, 83, 84, 177, 128, 129, 130, 131,
+	 96, 97, 98, 99, 100, 178, 144, 145, 146, 147, 148, 179],
+	[0, 1, 2, 3, 4, 5, 6, 7, 164, 132, 16, 17, 18, 19, 20, 21, 22, 23, 178, 116, 32, 33, 34, 35, 36, 37, 38, 39, 179, 180,
+	 48, 49, 50, 51, 52, 53, 112, 113, 114, 115, 64, 65, 66, 67, 68, 176, 160, 161, 162, 163, 80, 81, 82, 83, 84, 177, 128, 129, 130, 131,
+	 96, 97, 98, 99, 100, 101, 144, 145, 146, 147, 148, 149],
+	[0, 1, 2, 3, 4, 5, 6, 7, 176, 132, 16, 17, 18, 19, 20, 21, 22, 23, 117, 116, 32, 33, 34, 35, 36, 37, 38, 39, 165, 180,
+	 48, 49, 50, 51, 52, 164, 112, 113, 114, 115, 64, 65, 66, 67, 68, 69, 160, 161, 162, 163, 80, 81, 82, 83, 84, 177, 128, 129, 130, 131,
+	 96, 97, 98, 99, 100, 178, 144, 145, 146, 147, 148, 179],
+	[0, 1, 2, 3, 4, 5, 6, 7, 177, 132, 16, 17, 18, 19, 20, 21, 22, 23, 133, 116, 32, 33, 34, 35, 36, 37, 38, 39, 181, 180,
+	 48, 49, 50, 51, 52, 164, 112, 113, 114, 115, 64, 65, 66, 67, 68, 176, 160, 161, 162, 163, 80, 81, 82, 83, 84, 85, 128, 129, 130, 131,
+	 96, 97, 98, 99, 100, 178, 144, 145, 146, 147, 148, 179],
+	[0, 1, 2, 3, 4, 5, 164, 176, 177, 132, 16, 17, 18, 19, 20, 21, 117, 133, 178, 116, 32, 33, 34, 35, 36, 37, 165, 179, 181, 180,
+	 48, 49, 50, 51, 52, 53, 112, 113, 114, 115, 64, 65, 66, 67, 68, 69, 160, 161, 162, 163, 80, 81, 82, 83, 84, 85, 128, 129, 130, 131,
+	 96, 97, 98, 99, 100, 101, 144, 145, 146, 147, 148, 149],
+	[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25,
+	 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 48, 49, 50, 51, 52, 53, 54, 55, 56, 57,
+	 64, 65, 66, 67, 68, 69, 70, 71, 72, 73, 80, 81, 82, 83, 84, 85, 86, 87, 88, 89],
+	[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25,
+	 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 48, 49, 50, 51, 52, 53, 54, 55, 56, 10,
+	 64, 65, 66, 67, 68, 69, 70, 71, 72, 26, 80, 81, 82, 83, 84, 85, 86, 87, 88, 42],
+	[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25,
+	 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 48, 49, 50, 51, 52, 53, 54, 55, 11, 10,
+	 64, 65, 66, 67, 68, 69, 70, 71, 27, 26, 80, 81, 82, 83, 84, 85, 86, 87, 43, 42],
+	[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25,
+	 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 48, 49, 50, 51, 15, 14, 13, 12, 11, 10,
+	 64, 65, 66, 67, 31, 30, 29, 28, 27, 26, 80, 81, 82, 83, 47, 46, 45, 44, 43, 42]
+]
+
+def _sign_extend(v, prec):
+	sign = np.int64(1) << (prec - 1)
+	v = v & ((np.int64(1) << prec) - 1)
+	return (v ^ sign) - sign
+
+def _bc6_unquantize(v, prec, signed):
+	if not signed:
+		if prec >= 15:
+			return v
+		result = ((v << 15) + 0x4000) >> (prec - 1)
+		result = np.where(v == (1 << prec) - 1, 0xffff, result)
+		return np.where(v == 0, 0, result)
+
+	if prec >= 16:
+		return v
+	x = np.abs(v)
+	result = np.where(x >= (1 << (prec - 1)) - 1, 0x7fff, ((x << 15) + 0x4000) >> (prec - 1))
+	result = np.where(x == 0, 0, result)
+	return np.where(v < 0, -result, result)
+
+def _bc6_finalize(v, signed): # -> float values
+	if signed:
+		halves = np.where(v < 0, 0x8000 | ((-v) * 31 // 32), v * 31 // 32)
+	else:
+		halves = v * 31 // 64
+	return halves.astype(np.uint16).view(np.float16).astype(np.float32)
+
+def _decode_bc6h(blocks, signed=False):
+	N = blocks.shape[0]
+	result = np.zeros((N, 16, 4), dtype=np.uint8) # invalid modes decode into zeros
+	result[:, :, 3] = 255
+
+	m = blocks[:, 0].astype(np.int64) & 0x1f
+	modes = np.where((m & 3) < 2, m & 3, np.where((m & 3) == 2, 2 + (m >> 2), 10 + (m >> 2)))
+
+	for mode in range(len(BC6_MODES)):
+		selected = np.nonzero(modes == mode)[0]
+		if len(selected) > 0:
+			result[selected, :, :3] = _decode_bc6h_mode(blocks[selected], mode, signed)
+
+	return result
+
+def _decode_bc6h_mode(blocks, mode, signed):
+	ns, tr, pb, epb, rb, gb, bb = BC6_MODES[mode]
+	bits = _unpack_bits(blocks)
+	N = blocks.shape[0]
+	numep = 12 if ns == 2 else 6
+
+	bit = 5
+	epbits = 72
+	ib = 3
+	if mode < 2:
+		bit = 2
+		epbits = 75
+	elif mode >= 10:
+		epbits = 60
+		ib = 4
+
+	endpoints = np.zeros((N, 12), dtype=np.int64)
+	for i in range(epbits):
+		packing = BC6_BIT_PACKINGS[mode][i]
+		endpoints[:, packing >> 4] |= bits[:, bit + i].astype(np.int64) << (packing & 15)
+	bit += epbits
+
+	partition = _get_bits(bits, bit, pb)
+	bit += pb
+
+	if signed:
+		endpoints[:, 0:3] = _sign_extend(endpoints[:, 0:3], epb)
+
+	if signed or tr:
+		for i in range(3, numep, 3):
+			for c, prec in enumerate((rb, gb, bb)):
+				endpoints[:, i + c] = _sign_extend(endpoints[:, i + c], prec)
+
+	if tr: # deltas
+		mask = (1 << epb) - 1
+		for i in range(3, numep, 3):
+			endpoints[:, i:i+3] = (endpoints[:, i:i+3] + endpoints[:, 0:3]) & mask
+			if signed:
+				endpoints[:, i:i+3] = _sign_extend(endpoints[:, i:i+3], epb)
+
+	endpoints = _bc6_unquantize(endpoints[:, :numep], epb, signed).reshape(N, numep // 3, 3)
+
+	subsets = _get_subsets(ns, partition) * 2
+	e0 = np.take_along_axis(endpoints, subsets[:, :, None], axis=1)
+	e1 = np.take_along_axis(endpoints, subsets[:, :, None] + 1, axis=1)
+
+	indexes = _get_indexes(bits, bit, ns, partition, ib)
+	w = BC7_WEIGHTS[ib][indexes][:, :, None]
+	values = (e0 * (64 - w) + e1 * w) >> 6
+
+	return _to_unorm8(_bc6_finalize(values, signed))
+
+###
+
+DECODERS = {
+	"BC1": _decode_bc1,
+	"BC2": _decode_bc2,
+	"BC3": _decode_bc3,
+	"BC4": _decode_bc4,
+	"BC4S": lambda blocks: _decode_bc4(blocks, True),
+	"BC5": _decode_bc5,
+	"BC5S": lambda blocks: _decode_bc5(blocks, True),
+	"BC6H": _decode_bc6h,
+	"BC6HS": lambda blocks: _decode_bc6h(blocks, True),
+	"BC7": _decode_bc7
+}
@@ -0,0 +1,68 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import concurrent.futures
+import os
+import struct
+import zlib
+
+LEVEL_FAST = 1
+LEVEL_DEFAULT = zlib.Z_DEFAULT_COMPRESSION
+LEVEL_MAX = 9
+
+CHUNK_SIZE = 1024 * 1024
+WINDOW_SIZE = 32 * 1024
+
+# makes a zlib stream, same as zlib.compress() would
+#
+# with threads > 1, data is split into chunks which are compressed independently
+# (zlib releases GIL while compressing, so threads work in parallel) as raw deflate
+# streams, each primed with the last 32 KB of previous chunk as a dictionary, so
+# the ratio stays close to single-threaded one. Every chunk but the last ends with
+# a sync flush (which byte-aligns it with an empty stored block), so they can be
+# simply concatenated, and the result is wrapped with zlib header and adler32
+
+def compress(data, level=LEVEL_DEFAULT, threads=1):
+	if threads is None:
+		threads = os.cpu_count() or 1
+
+	if threads <= 1 or len(data) <= CHUNK_SIZE:
+		c = zlib.compressobj(level)
+		return c.compress(data) + c.flush()
+
+	data = memoryview(data)
+	chunks = [(i, min(i + CHUNK_SIZE, len(data))) for i in range(0, len(data), CHUNK_SIZE)]
+
+	def compress_chunk(index):
+		start, end = chunks[index]
+		if start == 0:
+			c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+		else:
+			c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=data[max(0, start - WINDOW_SIZE):start])
+
+		last = (index == len(chunks)-1)
+		return c.compress(data[start:end]) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+		compressed = list(pool.map(compress_chunk, range(len(chunks))))
+
+	return _make_header(level) + b"".join(compressed) + struct.pack(">I", zlib.adler32(data))
+
+def _make_header(level):
+	if level < 0:
+		level = 6
+
+	flevel = 3
+	if level < 2:
+		flevel = 0
+	elif level < 6:
+		flevel = 1
+	elif level == 6:
+		flevel = 2
+
+	cmf = 0x78 # deflate, 32 KB window
+	flg = flevel << 6
+	flg += (31 - ((cmf * 256 + flg) % 31)) % 31
+	return bytes([cmf, flg])
@@ -0,0 +1,156 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import dat1lib.types.toc
+import dat1lib.types.toc2
+import bisect
+import collections
+import threading
+import traceback
+
+MAX_BUFFERED_BYTES = 64 * 1024 * 1024
+
+def get_toc_module(toc):
+	if isinstance(toc, dat1lib.types.toc2.TOC2):
+		return dat1lib.types.toc2
+	return dat1lib.types.toc
+
+def read_archive(toc_module, archive_fn, entries, limit=None): # entries must be sorted by offset => yields (entry, data)
+	# with limit, only first <limit> bytes of every asset (not counting toc-stored header) are read
+	f, compressed = toc_module.open_archive_file(archive_fn)
+	try:
+		if not compressed:
+			for entry in entries:
+				f.seek(entry.offset)
+				yield (entry, _with_header(entry, f.read(_get_read_size(entry, limit))))
+			return
+
+		blocks = toc_module.read_blocks(f)
+		starts = [b[0] for b in blocks]
+		decompressed = {} # block index -> data
+
+		for entry in entries:
+			asset_offset = entry.offset
+			asset_end = asset_offset + _get_read_size(entry, limit)
+
+			first = max(0, bisect.bisect_right(starts, asset_offset) - 1)
+
+			# entries are sorted, so blocks before this one won't be needed anymore
+			for i in [i for i in decompressed if i < first]:
+				del decompressed[i]
+
+			data = bytearray()
+			i = first
+			while i < len(blocks) and blocks[i][0] < asset_end:
+				if i not in decompressed:
+					decompressed[i] = toc_module.decompress_block(f, blocks[i])
+
+				real_offset, real_size = blocks[i][0], blocks[i][2]
+				block_start = max(real_offset, asset_offset) - real_offset
+				block_end   = min(asset_end, real_offset + real_size) - real_offset
+				data += decompressed[i][block_start:block_end]
+				i += 1
+
+			yield (entry, _with_header(entry, data))
+	finally:
+		f.close()
+
+def _get_read_size(entry, limit):
+	if limit is None:
+		return entry.size
+	return min(entry.size, limit)
+
+def _with_header(entry, data):
+	header = getattr(entry, "header", None)
+	if header is None:
+		return data
+	return header + data
+
+# reads a bunch of assets in order that makes I/O sequential: grouped by
+# archive and sorted by offset (and so by compressed block), so every
+# block is decompressed once, even if it contains many small assets
+#
+# reading happens in a background thread, ahead of the consumer, and
+# stops when MAX_BUFFERED_BYTES of extracted data is waiting to be taken
+
+class ExtractionScheduler(object):
+	def __init__(self, toc, max_buffered_bytes=MAX_BUFFERED_BYTES):
+		self.toc = toc
+		self.max_buffered_bytes = max_buffered_bytes
+		self.cv = threading.Condition()
+
+	def extract(self, entries): # => yields (entry, data) in I/O order
+		self.buffer = collections.deque() # (entry, data), data is None if entry couldn't be read
+		self.buffered_bytes = 0
+		self.finished = False
+		self.cancelled = False
+
+		by_archive = {}
+		for entry in entries:
+			if entry.archive not in by_archive:
+				by_archive[entry.archive] = []
+			by_archive[entry.archive] += [entry]
+
+		plan = []
+		for archive_index in sorted(by_archive):
+			plan += [(archive_index, sorted(by_archive[archive_index], key=lambda e: e.offset))]
+
+		t = threading.Thread(target=self._read, args=(plan,), daemon=True)
+		t.start()
+
+		try:
+			while True:
+				with self.cv:
+					while len(self.buffer) == 0 and not self.finished:
+						self.cv.wait()
+
+					if len(self.buffer) == 0:
+						break
+
+					entry, data = self.buffer.popleft()
+					if data is not None:
+						self.buffered_bytes -= len(data)
+					self.cv.notify_all()
+
+				yield (entry, data)
+		finally:
+			with self.cv:
+				self.cancelled = True
+				self.cv.notify_all()
+
+	def _put(self, entry, data):
+		with self.cv:
+			while not self.cancelled and len(self.buffer) > 0 and self.buffered_bytes >= self.max_buffered_bytes:
+				self.cv.wait()
+
+			if self.cancelled:
+				return False
+
+			self.buffer.append((entry, data))
+			if data is not None:
+				self.buffered_bytes += len(data)
+			self.cv.notify_all()
+			return True
+
+	def _read(self, plan):
+		toc_module = get_toc_module(self.toc)
+
+		try:
+			for archive_index, entries in plan:
+				done = 0
+				try:
+					for entry, data in read_archive(toc_module, self.toc.get_archive_path(archive_index), entries):
+						done += 1
+						if not self._put(entry, data):
+							return
+				except:
+					print(traceback.format_exc())
+					for entry in entries[done:]:
+						if not self._put(entry, None):
+							return
+		finally:
+			with self.cv:
+				self.finished = True
+				self.cv.notify_all()
@@ -0,0 +1,158 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import dat1lib
+import dat1lib.extraction
+import dat1lib.types.config
+import dat1lib.types.toc
+import dat1lib.types.toc2
+import io
+import struct
+
+DAT1_MAGIC = 0x44415431
+ASSET_HEADER_SIZE = 36
+
+MODE_BYTES = "bytes"     # pattern is hex, matched anywhere in asset
+MODE_STRING = "string"   # pattern is text, matched (case-insensitive) against DAT1 strings block
+MODE_CONFIG = "config"   # pattern is text, matched (case-insensitive) against serialized config keys and values
+MODES = [MODE_BYTES, MODE_STRING, MODE_CONFIG]
+
+CONFIG_MAGICS = [dat1lib.types.config.Config.MAGIC, dat1lib.types.config.Config2.MAGIC]
+
+class Query(object):
+	def __init__(self, mode, pattern, version=None):
+		if mode not in MODES:
+			raise Exception("Bad search mode '{}'".format(mode))
+
+		self.mode = mode
+		self.version = version
+		if mode == MODE_BYTES:
+			self.needle = bytes.fromhex(pattern.replace(" ", ""))
+		else:
+			self.needle = pattern.lower()
+
+		if len(self.needle) == 0:
+			raise Exception("Empty search pattern")
+
+# match is (section tag or None, offset in asset or None, where: str or None)
+
+def search_asset(query, data):
+	if query.mode == MODE_BYTES:
+		return _search_bytes(query, data)
+	elif query.mode == MODE_STRING:
+		return _search_strings(query, data)
+	return _search_config(query, data)
+
+def _get_dat1_layout(data): # => (dat1 start, [(tag, offset, size)]) or (None, [])
+	for start in (ASSET_HEADER_SIZE, 0):
+		if len(data) < start + 16 or struct.unpack_from("<I", data, start)[0] != DAT1_MAGIC:
+			continue
+
+		sections_count = struct.unpack_from("<H", data, start + 12)[0]
+		if len(data) < start + 16 + 12 * sections_count:
+			continue
+
+		sections = []
+		for i in range(sections_count):
+			sections += [struct.unpack_from("<III", data, start + 16 + 12 * i)]
+		return (start, sections)
+
+	return (None, [])
+
+def _search_bytes(query, data):
+	start, sections = _get_dat1_layout(data)
+
+	results = []
+	i = data.find(query.needle)
+	while i != -1:
+		tag = None
+		if start is not None:
+			for t, offset, size in sections:
+				if start + offset <= i < start + offset + size:
+					tag = t
+					break
+
+		results += [(tag, i, None)]
+		i = data.find(query.needle, i + 1)
+
+	return results
+
+def _search_strings(query, data):
+	start, sections = _get_dat1_layout(data)
+	if start is None:
+		return []
+
+	strings_start = start + 16 + 12 * struct.unpack_from("<H", data, start + 12)[0] + 8 * struct.unpack_from("<H", data, start + 14)[0]
+	strings_end = len(data)
+	for t, offset, size in sections:
+		strings_end = min(strings_end, start + offset)
+
+	results = []
+	i = strings_start
+	for s in bytes(data[strings_start:strings_end]).split(b'\0'):
+		if len(s) > 0:
+			text = s.decode('utf-8', errors='replace')
+			if query.needle in text.lower():
+				results += [(None, i, text)]
+		i += len(s) + 1
+
+	return results
+
+def _search_config(query, data):
+	if len(data) < 4 or struct.unpack_from("<I", data, 0)[0] not in CONFIG_MAGICS:
+		return []
+
+	config = dat1lib.read(io.BytesIO(data), try_unknown=False, version=query.version)
+	if config is None:
+		return []
+
+	section = config.get_content_section()
+	if section is None:
+		return []
+
+	results = []
+	def walk(node, where):
+		if isinstance(node, dict):
+			for k in node:
+				key_where = "{}.{}".format(where, k) if where != "" else "{}".format(k)
+				if query.needle in "{}".format(k).lower():
+					results.append((section.TAG, None, key_where))
+				walk(node[k], key_where)
+		elif isinstance(node, list):
+			for i, v in enumerate(node):
+				walk(v, "{}[{}]".format(where, i))
+		elif node is not None and query.needle in "{}".format(node).lower():
+			results.append((section.TAG, None, "{} = {}".format(where, node)))
+
+	walk(section.root, "")
+	return results
+
+#
+
+def search_archive_chunk(rcra, archive_fn, entries, query): # runs in a worker process; entries are sorted by offset => [(aid, tag, offset, where)]
+	toc_module = dat1lib.types.toc2 if rcra else dat1lib.types.toc
+
+	results = []
+	for entry, data in dat1lib.extraction.read_archive(toc_module, archive_fn, entries):
+		try:
+			for tag, offset, where in search_asset(query, data):
+				results += [(entry.asset_id, tag, offset, where)]
+		except:
+			pass
+
+	return results
+
+def search_files_chunk(files, query): # runs in a worker process; files are [(key, filename)] => [(key, tag, offset, where)]
+	results = []
+	for key, fn in files:
+		try:
+			with open(fn, "rb") as f:
+				data = f.read()
+			for tag, offset, where in search_asset(query, data):
+				results += [(key, tag, offset, where)]
+		except:
+			pass
+
+	return results
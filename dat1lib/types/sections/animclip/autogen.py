@@ -7,8 +7,15 @@ import dat1lib.crc32 as crc32
 import dat1lib.types.sections
 import dat1lib.utils as utils
 import io
+import numpy as np
 import struct
 
+DEFAULT_FPS = 30.0 # for clips with no fps in built section
+
+# 16 bytes per joint: rotation quaternion in signed fixed point (1/32768),
+# position in fixed point with per-joint power of 2 scale (x / 2**log_scale2)
+BASE_STATE_DTYPE = np.dtype([("rotation", "<i2", (4,)), ("position", "<i2", (3,)), ("log_scale", "u1"), ("log_scale2", "u1")])
+
 #
 
 class x09DC30AB_Section(dat1lib.types.sections.Section):
@@ -195,6 +202,22 @@ class x2BB5BC8F_Section(dat1lib.types.sections.Section):
 
 		# then, some extra data
 
+		self._pose = None # decoded on first get_pose(); edits of entries aren't tracked
+
+	def get_pose(self): # => (hashes (N,) uint32, positions (N, 3), rotations (N, 4)), joints with FFFFFFFF hash are skipped
+		if self._pose is None:
+			hashes_section = self._dat1.get_section(xA3B26640_Section.TAG)
+			hashes = np.array([] if hashes_section is None else hashes_section.entries, dtype=np.uint32)
+
+			records = np.frombuffer(self._raw, dtype=BASE_STATE_DTYPE, count=len(hashes))
+			rotations = records["rotation"] / 32768.0 # signed
+			positions = np.ldexp(records["position"].astype(np.float64), -records["log_scale2"].astype(np.int32)[:, None]) # == x / 2**log_scale2
+
+			used = (hashes != 0xFFFFFFFF)
+			self._pose = (hashes[used], positions[used], rotations[used])
+
+		return self._pose
+
 	def save(self):
 		of = io.BytesIO(bytes())
 		for e in self.entries:
@@ -266,6 +289,18 @@ class x14014CB6_Section(dat1lib.types.sections.Section):
 		of.seek(0)
 		return of.read()
 
+	def get_tracks(self): # => [(hash, name or None, (count,) float32 values)]
+		data_section = self._dat1.get_section(x116EB684_Section.TAG)
+
+		tracks = []
+		for l in self.entries:
+			values = np.zeros(0, dtype=np.float32)
+			if data_section is not None and l[8] > 0:
+				values = np.frombuffer(data_section._raw, dtype="<f4", count=l[8], offset=l[4])
+			tracks += [(l[0], self._dat1._strings_map.get(l[1], None), values)]
+
+		return tracks
+
 	def get_short_suffix(self):
 		return "14014CB6 ({})".format(len(self.entries))
 
@@ -622,6 +657,18 @@ class AnimClipBuiltSection(dat1lib.types.sections.Section):
 		return of.read()
 	"""
 
+	def get_name(self):
+		return self._dat1._strings_map.get(self.string_offset, None)
+
+	def get_fps(self):
+		fps = self.entries[2]
+		if not fps > 0: # also NaN
+			fps = DEFAULT_FPS
+		return fps
+
+	def get_frame_times(self, count): # => (count,) seconds of frames 0..count-1
+		return np.arange(count, dtype=np.float64) / self.get_fps()
+
 	def get_short_suffix(self):
 		return "Anim Clip Built ({})".format(len(self.entries))
 
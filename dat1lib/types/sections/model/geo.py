@@ -8,6 +8,7 @@ import dat1lib.utils as utils
 import io
 import struct
 import math
+import numpy as np
 
 class IndexesSection(dat1lib.types.sections.Section):
 	TAG = 0x0859863D # Model Index
@@ -44,64 +45,63 @@ class IndexesSection(dat1lib.types.sections.Section):
 		if self.version is None:
 			self.version = dat1lib.VERSION_MSMR
 
-		self.values = []
+		self._values = None # list, only made if legacy code asks for `values`
 
 		if self.version == dat1lib.VERSION_MSMR:
-			self._delta_encoded = utils.read_struct_N_array_data(data, len(data)//2, "<h")
+			# delta encoded: running sum of shorts, modulo 2^16
+			deltas = np.frombuffer(data, dtype="<i2", count=len(data)//2)
+			self.indexes = (np.cumsum(deltas, dtype=np.int64) % 2**16).astype(np.uint16)
 
-			if len(self._delta_encoded) > 0:
-				self.values += [self._delta_encoded[0]]
+		elif self.version == dat1lib.VERSION_RCRA or self.version == dat1lib.VERSION_SO:
+			self.indexes = np.frombuffer(data, dtype="<u2", count=len(data)//2).copy()
+
+		else:
+			self.indexes = np.zeros(0, dtype=np.uint16)
 
-			for i in range(1, len(self._delta_encoded)):
-				self.values += [self.values[i-1] + self._delta_encoded[i]]
+	@property
+	def values(self):
+		if self._values is None:
+			self._values = self.indexes.tolist()
+		return self._values
 
-			for i in range(len(self.values)):
-				self.values[i] %= 2**16
+	@values.setter
+	def values(self, values):
+		self._values = values
 
-		elif self.version == dat1lib.VERSION_RCRA or self.version == dat1lib.VERSION_SO:
-			self.values = utils.read_struct_N_array_data(data, len(data)//2, "<H")
+	def get_indexes(self): # => np.uint16 array, with changes made through `values`
+		if self._values is not None:
+			return np.array(self._values, dtype=np.uint16)
+		return self.indexes
 
 	def save(self):
 		if self.version == dat1lib.VERSION_SO:
 			return self._raw
 			return None # TODO
 
-		if self.version == dat1lib.VERSION_RCRA:
-			of = io.BytesIO(bytes())
-			for v in self.values:
-				of.write(struct.pack("<H", v))
-			of.seek(0)
-			return of.read()
-
-		def short_overflow(v):
-			while v < -0x7FFF - 1:
-				v += 2**16
+		indexes = self.get_indexes()
 
-			while v > 0x7FFF:
-				v -= 2**16
-
-			return v
+		if self.version == dat1lib.VERSION_RCRA:
+			return indexes.astype("<u2").tobytes()
 
-		of = io.BytesIO(bytes())
-		prev = 0
-		for v in self.values:
-			of.write(struct.pack("<h", short_overflow(v - prev)))
-			prev = v
-		of.seek(0)
-		return of.read()
+		# delta from previous one, wrapped into short
+		deltas = np.diff(indexes.astype(np.int64), prepend=0)
+		deltas = (deltas + 0x8000) % 2**16 - 0x8000
+		return deltas.astype("<i2").tobytes()
 
 	def get_short_suffix(self):
-		return "model_index ({})".format(len(self.values))
+		return "model_index ({})".format(len(self.get_indexes()))
 
 	def print_verbose(self, config):
 		##### "{:08X} | ............ | {:6} ..."
-		print("{:08X} | model_index  | {:6} shorts".format(self.TAG, len(self.values)))
+		print("{:08X} | model_index  | {:6} shorts".format(self.TAG, len(self.get_indexes())))
 
 	def web_repr(self):
-		return {"name": "Indexes", "type": "text", "readonly": True, "content": "{} indexes".format(len(self.values))}
+		return {"name": "Indexes", "type": "text", "readonly": True, "content": "{} indexes".format(len(self.get_indexes()))}
 
 ###
 
+VERTEX_I29_DTYPE = np.dtype([("xyzw", "<i2", 4), ("n", "<u4"), ("uv", "<i2", 2)])
+
 def _decode_normal(norm):
 	norm = norm & 0xFFFFFFFF
 	nx = float((norm & 0x3FF)) * 0.00276483595 - math.sqrt(2)
@@ -124,6 +124,166 @@ def _decode_normal(norm):
 
 	return (nx, ny, nz)
 
+def _decode_normals(norm): # same as _decode_normal, but for np.uint32 array => (N, 3) array
+	norm = norm.astype(np.uint32)
+	nx = (norm & 0x3FF).astype(np.float64) * 0.00276483595 - math.sqrt(2)
+	ny = ((norm >> 10) & 0x3FF).astype(np.float64) * 0.00276483595 - math.sqrt(2)
+	flip = (norm >> 31) == 0
+
+	nxxyy = nx * nx + ny * ny
+	nw = np.sqrt(np.maximum(1 - 0.25 * nxxyy, 0))
+
+	nz = 1 - 0.5 * nxxyy
+	nz[flip] = -nz[flip]
+
+	return np.stack([nx * nw, ny * nw, nz], axis=1)
+
+def _make_vertexes(cls, positions, normals, uvs): # => [cls], made from already decoded arrays
+	result = []
+	for (x, y, z), (nx, ny, nz), (u, v) in zip(positions.tolist(), normals.tolist(), uvs.tolist()):
+		vertex = cls.__new__(cls)
+		vertex.x, vertex.y, vertex.z = x, y, z
+		vertex.nx, vertex.ny, vertex.nz = nx, ny, nz
+		vertex.u, vertex.v = u, v
+		vertex.tangent = None
+		vertex.bitangent = None
+		result += [vertex]
+	return result
+
+# encoders for whole arrays of vertexes, matching what per-vertex code did bit by bit
+
+def _to_shorts(values): # truncated floats => int64 array, failing as struct.pack("<h") would
+	if not np.isfinite(values).all():
+		raise ValueError("cannot convert float NaN or infinity to integer")
+
+	values = values.astype(np.int64)
+	if len(values) > 0 and (values.min() < -0x8000 or values.max() > 0x7FFF):
+		raise struct.error("short format requires -32768 <= number <= 32767")
+
+	return values
+
+def _clamp_short(values): # rounded floats => int64 array
+	return np.clip(values, -0x7FFF - 1, 0x7FFF).astype(np.int64)
+
+def _xor_delta(values):
+	result = values.copy()
+	result[1:] ^= values[:-1]
+	return result
+
+def _encode_vertexes_i29(positions, normals, uvs): # => bytes, 16 per vertex
+	scale = 1/4096.0
+	xyz = _to_shorts(np.trunc(positions / scale))
+
+	nX = _to_shorts(np.trunc((normals[:, 0] + 1.0)*511.0))
+	nY = _to_shorts(np.trunc((normals[:, 1] + 1.0)*511.0))
+	nZ = _to_shorts(np.trunc((normals[:, 2] + 1.0)*2047.0))
+	NXYZ = (nX & 0b1111111111) | ((nY & 0b1111111111) << 10) | ((nZ & 0b111111111111) << 20) # TODO: this is wrong normals encoding
+
+	uv = _to_shorts(np.trunc(uvs * 32768.0))
+
+	entries = np.zeros(len(positions), dtype=VERTEX_I29_DTYPE)
+	entries["xyzw"][:, :3] = xyz
+	entries["n"] = NXYZ
+	entries["uv"] = uv
+	return entries.tobytes()
+
+def _encode_normals(n): # inverse of _decode_normals => int64 array
+	nx, ny, nz = n[:, 0], n[:, 1], n[:, 2]
+
+	flip = np.where(nz < 0, 0, 1)
+	nz = np.where(nz < 0, -nz, nz)
+
+	nxxyy = (1 - nz)*2.0
+	nw = np.sqrt(np.maximum(1 - 0.25*nxxyy, 0))
+	positive = (nw > 0)
+	safe_nw = np.where(positive, nw, 1)
+	nx = np.where(positive, nx/safe_nw, nx)
+	ny = np.where(positive, ny/safe_nw, ny)
+
+	c = math.sqrt(2) / (0x3FF / 2.0)
+	n1 = np.rint((nx + math.sqrt(2)) / c).astype(np.int64) & 0x3FF
+	n2 = np.rint((ny + math.sqrt(2)) / c).astype(np.int64) & 0x3FF
+
+	return (flip<<31) | (n2<<10) | n1
+
+def _encode_tangents(n, t, b): # => (packed normal and tangent, bitangent short), both int64 arrays
+	def dot(a, b):
+		return a[:, 0]*b[:, 0] + a[:, 1]*b[:, 1] + a[:, 2]*b[:, 2]
+
+	def normalize(vc):
+		l = np.sqrt(dot(vc, vc))
+		positive = (l > 0)
+		safe_l = np.where(positive, l, 1)[:, None]
+		return np.where(positive[:, None], vc/safe_l, np.array([1.0, 0.0, 0.0]))
+
+	def cross(a, b):
+		return np.stack([
+			a[:, 1]*b[:, 2] - a[:, 2]*b[:, 1],
+			a[:, 2]*b[:, 0] - a[:, 0]*b[:, 2],
+			a[:, 0]*b[:, 1] - a[:, 1]*b[:, 0]
+		], axis=1)
+
+	def clamp01(x): # same as min(max(0, x), 1)
+		x = np.where(x > 0, x, 0)
+		return np.where(1 < x, 1, x)
+
+	def encode_xy(v): # => (x part, y part, sign of z)
+		n3 = v[:, 2]
+		sign = np.where(n3 < 0, -1, 1)
+		n3 = np.where(n3 < 0, -n3, n3)
+
+		sqrxy = np.sqrt(1 - (1 - n3) / 2.0)
+		n1 = clamp01((v[:, 0] / sqrxy) / sqr2 + 0.5)
+		n2 = clamp01((v[:, 1] / sqrxy) / sqr2 + 0.5)
+		return (np.trunc(n1 * 1023).astype(np.int64), np.trunc(n2 * 1023).astype(np.int64), sign)
+
+	sqr2 = math.sqrt(2) * 2
+
+	thist = normalize(t - n * dot(n, t)[:, None])
+
+	has_tb = (np.sqrt(dot(t, t)) > 0) & (np.sqrt(dot(b, b)) > 0)
+	bts = dot(cross(normalize(t), normalize(b)), n)
+	btsign = np.where(has_tb, np.where(bts > 0, 1, -1), 0)
+
+	n1, n2, nsign = encode_xy(n)
+	t1, t2, tsign = encode_xy(thist)
+
+	norm1 = (n2 << 10) | n1 | (t1 << 20)
+	norm1 |= np.where(nsign > 0, 0x80000000, 0)
+	norm1 |= np.where(tsign > 0, 0x40000000, 0)
+	rv1 = (norm1 & (0x7FF<<20)) | _encode_normals(n)
+
+	norm1 = t2 | 0x7C00
+	norm1 = np.where(btsign > 0, -norm1, norm1)
+	rv2 = np.clip(norm1, -0x7FFF - 1, 0x7FFF)
+
+	return (rv1, rv2)
+
+def calculate_tangents(positions, uvs, triangles, count): # triangles are (F, 3) vertex indexes => ((count, 3) tangents, (count, 3) bitangents), summed over faces that use vertex
+	p0, p1, p2 = positions[triangles[:, 0]], positions[triangles[:, 1]], positions[triangles[:, 2]]
+	uv0, uv1, uv2 = uvs[triangles[:, 0]], uvs[triangles[:, 1]], uvs[triangles[:, 2]]
+
+	e1 = p1 - p0
+	e2 = p2 - p0
+
+	x1 = (uv1[:, 0] - uv0[:, 0])[:, None]
+	x2 = (uv2[:, 0] - uv0[:, 0])[:, None]
+	y1 = (uv1[:, 1] - uv0[:, 1])[:, None]
+	y2 = (uv2[:, 1] - uv0[:, 1])[:, None]
+	r = x1*y2 - x2*y1
+	r = np.where(r > 0, 1.0 / np.where(r > 0, r, 1), r) # isn't inverted if not positive
+
+	t = (e1 * y2 - e2 * y1) * r
+	b = (e2 * x1 - e1 * x2) * r
+
+	# np.add.at adds in order of indexes, so sums are the same as if faces were added one by one
+	tangents = np.zeros((count, 3))
+	bitangents = np.zeros((count, 3))
+	np.add.at(tangents, triangles.reshape(-1), np.repeat(t, 3, axis=0))
+	np.add.at(bitangents, triangles.reshape(-1), np.repeat(b, 3, axis=0))
+
+	return (tangents, bitangents)
+
 class Vertex_I20(object):
 	def __init__(self, xyz, nxyz, uv):
 		self.x, self.y, self.z = xyz
@@ -171,26 +331,7 @@ class Vertex_I29(object):
 		return cls((0,0,0), 0, (0,0))
 
 	def save(self):
-		scale = 1/4096.0
-		X, Y, Z, W = self.x / scale, self.y / scale, self.z / scale, 0
-		X, Y, Z = int(X), int(Y), int(Z)
-
-		nX = (self.nx + 1.0)*511.0
-		nY = (self.ny + 1.0)*511.0
-		nZ = (self.nz + 1.0)*2047.0
-		nX = int(nX)
-		nY = int(nY)
-		nZ = int(nZ)
-		nX = struct.unpack("<H", struct.pack("<h", nX))[0]
-		nY = struct.unpack("<H", struct.pack("<h", nY))[0]
-		nZ = struct.unpack("<H", struct.pack("<h", nZ))[0]	
-		NXYZ = (nX & 0b1111111111) | ((nY & 0b1111111111) << 10) | ((nZ & 0b111111111111) << 20) # TODO: this is wrong normals encoding
-
-		U = self.u * 32768.0
-		V = self.v * 32768.0
-		U, V = int(U), int(V)
-
-		return struct.pack("<4hI2h", X, Y, Z, W, NXYZ, U, V)
+		return _encode_vertexes_i29(np.array([[self.x, self.y, self.z]]), np.array([[self.nx, self.ny, self.nz]]), np.array([[self.u, self.v]]))
 
 class VertexesSection(dat1lib.types.sections.Section):
 	TAG = 0xA98BE69B # Model Std Vert
@@ -228,259 +369,141 @@ class VertexesSection(dat1lib.types.sections.Section):
 		if self.version is None:
 			self.version = dat1lib.VERSION_MSMR
 
-		self.vertexes = []
+		# vertexes are decoded into arrays:
+		#   positions: (N, 3) floats
+		#   normals:   (N, 3) floats
+		#   uvs:       (N, 2), raw shorts on MSMR (to be multiplied by Built section's uv scale) and floats on RCRA/SO
+		# and per-vertex objects are only made if legacy code asks for `vertexes`
+
+		self._vertexes = None
 
 		if self.version == dat1lib.VERSION_MSMR:
+			# batches of up to 8 buffers, each buffer is XOR delta encoded:
+			# packed normal (spans first two buffers), x, y, z, bitangent, u, v
 			BUFS = 8
 			MAX_BUF_SIZE = 0x10000
 
+			packed_normals, shorts = [], []
 			for offset in range(0, len(data), BUFS*MAX_BUF_SIZE):
 				end = min(offset + BUFS*MAX_BUF_SIZE, len(data))
-				batch = data[offset:end]
 				buf_size = (end - offset)//BUFS
+				count = buf_size//2
 
-				buffers = []
-				for i in range(BUFS):
-					buffers += [[]]
+				def buffer(i):
+					return np.frombuffer(data, dtype="<i2", count=count, offset=offset + i*buf_size)
 
-				for i in range(BUFS):
-					buffers[i] += list(struct.unpack("<{}h".format(buf_size//2), batch[i*buf_size:(i+1)*buf_size]))
+				# x, y, z, u, v (bitangent isn't decoded)
+				shorts += [np.bitwise_xor.accumulate(np.stack([buffer(2), buffer(3), buffer(4), buffer(6), buffer(7)]), axis=1)]
 
-				N_buffer = list(struct.unpack("<{}I".format(buf_size//2), batch[0:2*buf_size]))
+				N = np.frombuffer(data, dtype="<u4", count=count, offset=offset)
+				packed_normals += [np.bitwise_xor.accumulate(N)]
 
-				N = 0
-				X, Y, Z = 0, 0, 0
-				U, V = 0, 0
-
-				for i in range(len(buffers[0])):
-					x, y, z, _ = buffers[2][i], buffers[3][i], buffers[4][i], buffers[5][i]
-					u, v = buffers[6][i], buffers[7][i]
-					N ^= N_buffer[i]
-					X ^= x
-					Y ^= y
-					Z ^= z
-					U ^= u
-					V ^= v
-					self.vertexes += [Vertex_I20((X, Y, Z), N, (U, V))]
+			shorts = np.concatenate(shorts, axis=1) if len(shorts) > 0 else np.zeros((5, 0), dtype=np.int16)
+			self.packed_normals = np.concatenate(packed_normals) if len(packed_normals) > 0 else np.zeros(0, dtype=np.uint32)
+			self.positions = shorts[0:3].T.astype(np.float64) / 4096.0
+			self.normals = _decode_normals(self.packed_normals)
+			self.uvs = shorts[3:5].T.copy()
 
 		elif self.version == dat1lib.VERSION_RCRA or self.version == dat1lib.VERSION_SO:
-			for i in range(0, len(data), 16):
-				X, Y, Z, W, NXYZ, U, V = struct.unpack("<4hI2h", data[i:i+16])
-				self.vertexes += [Vertex_I29((X, Y, Z), NXYZ, (U, V))]
+			count = len(data)//16
+			entries = np.frombuffer(data, dtype=VERTEX_I29_DTYPE, count=count)
+
+			self.packed_normals = entries["n"].copy()
+			self.positions = entries["xyzw"][:, :3].astype(np.float64) * (1/4096.0)
+			self.normals = _decode_normals(self.packed_normals)
+			self.uvs = entries["uv"].astype(np.float64) / 32768.0
+
+		else:
+			self.packed_normals = np.zeros(0, dtype=np.uint32)
+			self.positions = np.zeros((0, 3))
+			self.normals = np.zeros((0, 3))
+			self.uvs = np.zeros((0, 2))
+
+	@property
+	def vertexes(self):
+		if self._vertexes is None:
+			cls = Vertex_I20 if self.version == dat1lib.VERSION_MSMR else Vertex_I29
+			self._vertexes = _make_vertexes(cls, self.positions, self.normals, self.uvs)
+		return self._vertexes
+
+	@vertexes.setter
+	def vertexes(self, vertexes):
+		self._vertexes = vertexes
+
+	def get_arrays(self): # => (positions, normals, uvs), with changes made through `vertexes`
+		if self._vertexes is None:
+			return (self.positions, self.normals, self.uvs)
+
+		vs = self._vertexes
+		positions = np.array([(v.x, v.y, v.z) for v in vs], dtype=np.float64).reshape(-1, 3)
+		normals = np.array([(v.nx, v.ny, v.nz) for v in vs], dtype=np.float64).reshape(-1, 3)
+		uvs = np.array([(v.u, v.v) for v in vs]).reshape(-1, 2)
+		return (positions, normals, uvs)
+
+	def get_vertexes_count(self):
+		if self._vertexes is None:
+			return len(self.positions)
+		return len(self._vertexes)
 
 	def save(self):
-		of = io.BytesIO(bytes())
-		
+		positions, normals, uvs = self.get_arrays()
+
 		if self.version == dat1lib.VERSION_RCRA:
-			for e in self.vertexes:
-				of.write(e.save())
-		else:
-			MAX_BATCH = 0x8000
+			return _encode_vertexes_i29(positions, normals, uvs)
 
-			mscale = 1.0/4096.0
-			uv_scale = 1.0/16384.0
-		
-			SECTION_BUILT = 0x283D0383
-			s = self._dat1.get_section(SECTION_BUILT)
-			if s:
-				uv_scale = s.get_uv_scale()
-
-			def clamp_short(v):
-				return min(max(-0x7FFF - 1, v), 0x7FFF)
-
-			def clamp_ushort(v):
-				return min(max(0, v), 0xFFFF)
-
-			def encode_position(pos, scale):
-				return clamp_short(int(round(pos / scale)))
-
-			def encode_texcoord(pos, scale):
-				pos = int(round(pos / scale))
-				return clamp_short(pos)
-
-			def _encode_normal(nx, ny, nz):
-				flip = 1
-				if nz < 0:
-					nz = -nz
-					flip = 0
-
-				nxxyy = (1 - nz)*2.0
-				nw = 0
-				try:
-					nw = math.sqrt(1 - 0.25*nxxyy)
-				except:
-					pass
-				if nw > 0:
-					nx = nx/nw
-					ny = ny/nw
-				
-				c = math.sqrt(2) / (0x3FF / 2.0)
-				n1 = int(round((nx + math.sqrt(2)) / c)) & 0x3FF
-				n2 = int(round((ny + math.sqrt(2)) / c)) & 0x3FF
-				
-				return (flip<<31) | (n2<<10) | n1
-
-			def encode_tangents(n, t, b):
-				def vec_mult_scalar(vc, sc):
-					return (vc[0] * sc, vc[1] * sc, vc[2] * sc)
-
-				def vec_minus_vec(vc1, vc2):
-					return (vc1[0] - vc2[0], vc1[1] - vc2[1], vc1[2] - vc2[2])
-
-				def vec_plus_vec(vc1, vc2):
-					return (vc1[0] + vc2[0], vc1[1] + vc2[1], vc1[2] + vc2[2])
-
-				def vec_dot(vc1, vc2):
-					return (vc1[0] * vc2[0]) + (vc1[1] * vc2[1]) + (vc1[2] * vc2[2])
-
-				def vec_length(vc):
-					return math.sqrt(vec_dot(vc, vc))
-
-				def vec_normalize(vc):
-					l = vec_length(vc)
-					if l <= 0:
-						return (1, 0, 0)
-					return (vc[0]/l, vc[1]/l, vc[2]/l)
-
-				def vec_cross(a, b):
-					a1, a2, a3 = a
-					b1, b2, b3 = b
-					return (a2*b3 - a3*b2, a3*b1 - a1*b3, a1*b2 - a2*b1)
-
-				sqr2 = math.sqrt(2) * 2
-
-				thisn = n
-				thist = vec_minus_vec(t, vec_mult_scalar(thisn, vec_dot(thisn, t)))
-				thist = vec_normalize(thist)
-				btsign = 0
-				if vec_length(t) > 0 and vec_length(b) > 0:
-					t = vec_normalize(t)
-					b = vec_normalize(b)
-					cr = vec_cross(t, b)
-					bts = vec_dot(cr, thisn)
-					if bts > 0:
-						btsign = 1
-					else:
-						btsign = -1
-
-				n3 = n[2]
-				nsign = 1
-				if n3 < 0:
-					nsign = -1
-					n3 = -n3
-
-				sqrxy = math.sqrt(1 - (1 - n3) / 2.0)
-				n1 = n[0] / sqrxy
-				n2 = n[1] / sqrxy
-				n1 = n1 / sqr2 + 0.5
-				n2 = n2 / sqr2 + 0.5
-
-				n1 = min(max(0, n1), 1)
-				n2 = min(max(0, n2), 1)
-
-				norm1 = int(n2 * 1023) << 10
-				norm1 |= int(n1 * 1023)
-				
-				n3 = thist[2]
-				tsign = 1
-				if n3 < 0:
-					tsign = -1
-					n3 = -n3
-
-				sqrxy = math.sqrt(1 - (1 - n3) / 2.0)
-				n1 = thist[0] / sqrxy
-				n2 = thist[1] / sqrxy
-				n1 = n1 / sqr2 + 0.5
-				n2 = n2 / sqr2 + 0.5
-
-				n1 = min(max(0, n1), 1)
-				n2 = min(max(0, n2), 1)
-
-				norm1 |= int(n1 * 1023) << 20
-				if nsign > 0:
-					norm1 |= 0x80000000
-				if tsign > 0:
-					norm1 |= 0x40000000
-				rv1 = norm1 & (0x7FF<<20)
-				rv1 |= _encode_normal(*n)
-
-				norm1 = int(n2 * 1023)
-				norm1 |= 0x7C00
-				if btsign > 0:
-					norm1 = ~norm1 + 1
-				rv2 = clamp_short(norm1)
-
-				return (rv1, rv2)
-
-			ln = len(self.vertexes)
-			for i in range(0, ln, MAX_BATCH):
-				batch_end = i + MAX_BATCH
-				if batch_end > ln:
-					batch_end = ln
-				batch = self.vertexes[i:batch_end]
-
-				# normal/tangent
-				prev = 0
-				for v in batch:
-					curr = 0x7FF80200
-					if v.tangent is not None and v.bitangent is not None:
-						curr, _ = encode_tangents((v.nx, v.ny, v.nz), v.tangent, v.bitangent)
-					of.write(struct.pack("<I", prev ^ curr))
-					prev = curr
-				
-				# x
-				prev = 0
-				for v in batch:
-					curr = encode_position(v.x, mscale)
-					of.write(struct.pack("<h", prev ^ curr))
-					prev = curr
-
-				# y
-				prev = 0
-				for v in batch:
-					curr = encode_position(v.y, mscale)
-					of.write(struct.pack("<h", prev ^ curr))
-					prev = curr
-
-				# z
-				prev = 0
-				for v in batch:
-					curr = encode_position(v.z, mscale)
-					of.write(struct.pack("<h", prev ^ curr))
-					prev = curr
-
-				# bitangent
-				prev = 0
-				for v in batch:
-					curr = 0x7E
-					if v.tangent is not None and v.bitangent is not None:
-						_, curr = encode_tangents((v.nx, v.ny, v.nz), v.tangent, v.bitangent)
-					of.write(struct.pack("<h", prev ^ curr))
-					prev = curr
-
-				# u
-				prev = 0
-				for v in batch:
-					curr = encode_texcoord(v.u, uv_scale)
-					of.write(struct.pack("<h", prev ^ curr))
-					prev = curr
-
-				# v
-				prev = 0
-				for v in batch:
-					curr = encode_texcoord(v.v, uv_scale)
-					of.write(struct.pack("<h", prev ^ curr))
-					prev = curr
+		MAX_BATCH = 0x8000
 
-		of.seek(0)
-		return of.read()
+		mscale = 1.0/4096.0
+		uv_scale = 1.0/16384.0
+
+		SECTION_BUILT = 0x283D0383
+		s = self._dat1.get_section(SECTION_BUILT)
+		if s:
+			uv_scale = s.get_uv_scale()
+
+		count = len(positions)
+		packed = np.full(count, 0x7FF80200, dtype=np.int64) # normal/tangent
+		bitangents = np.full(count, 0x7E, dtype=np.int64)
+
+		tangents_mask, t, b = self._get_tangents()
+		if tangents_mask is not None and tangents_mask.any():
+			packed[tangents_mask], bitangents[tangents_mask] = _encode_tangents(normals[tangents_mask], t[tangents_mask], b[tangents_mask])
+
+		xyz = _clamp_short(np.rint(positions / mscale))
+		uv = _clamp_short(np.rint(uvs.astype(np.float64) / uv_scale))
+
+		# batches of 8 buffers, each one XOR delta encoded
+		result = []
+		for i in range(0, count, MAX_BATCH):
+			batch = slice(i, min(i + MAX_BATCH, count))
+			result += [_xor_delta(packed[batch]).astype("<u4").tobytes()]
+			for column in (xyz[batch, 0], xyz[batch, 1], xyz[batch, 2], bitangents[batch], uv[batch, 0], uv[batch, 1]):
+				result += [_xor_delta(column).astype("<i2").tobytes()]
+
+		return b"".join(result)
+
+	def _get_tangents(self): # => (mask of vertexes that have both, tangents, bitangents) or (None, None, None)
+		if self._vertexes is None:
+			return (None, None, None)
+
+		mask = np.zeros(len(self._vertexes), dtype=bool)
+		t = np.zeros((len(self._vertexes), 3))
+		b = np.zeros((len(self._vertexes), 3))
+		for i, v in enumerate(self._vertexes):
+			tangent, bitangent = getattr(v, "tangent", None), getattr(v, "bitangent", None)
+			if tangent is not None and bitangent is not None:
+				mask[i] = True
+				t[i] = tangent
+				b[i] = bitangent
+
+		return (mask, t, b)
 
 	def get_short_suffix(self):
-		return "vertexes ({})".format(len(self.vertexes))
+		return "vertexes ({})".format(self.get_vertexes_count())
 
 	def print_verbose(self, config):
 		##### "{:08X} | ............ | {:6} ..."
-		print("{:08X} | Vertexes     | {:6} vertexes".format(self.TAG, len(self.vertexes)))
+		print("{:08X} | Vertexes     | {:6} vertexes".format(self.TAG, self.get_vertexes_count()))
 		if config.get("web", False):
 			return
 		
@@ -488,13 +511,15 @@ class VertexesSection(dat1lib.types.sections.Section):
 		#######........ | 123  12345678  12345678  12345678  12345678  12345678  12345678
 		print("           #           x         y         z        nx        ny        nz         U         V")
 		print("         -------------------------------------------------------------------------------------")
-		for i, l in enumerate(self.vertexes[:32]):
-			print("         - {:<3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}".format(i, l.x, l.y, l.z, l.nx, l.ny, l.nz, l.u, l.v))
+		positions, normals, uvs = self.get_arrays()
+		for i in range(min(32, len(positions))):
+			(x, y, z), (nx, ny, nz), (u, v) = positions[i].tolist(), normals[i].tolist(), uvs[i].tolist()
+			print("         - {:<3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}  {:8.3}".format(i, x, y, z, nx, ny, nz, u, v))
 		print("...")
 		print("")
 
 	def web_repr(self):
-		return {"name": "Vertexes", "type": "text", "readonly": True, "content": "{} vertexes".format(len(self.vertexes))}
+		return {"name": "Vertexes", "type": "text", "readonly": True, "content": "{} vertexes".format(self.get_vertexes_count())}
 
 ###
 
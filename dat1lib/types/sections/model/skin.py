@@ -5,8 +5,139 @@
 
 import dat1lib.types.sections
 import io
+import numpy as np
 import struct
 
+class SkinWeights(object): # fixed-width influences of all vertexes, same for both skin formats
+	def __init__(self, joints, weights, counts):
+		self.joints = joints # (N, K) np.uint16; unused slots are 0
+		self.weights = weights # (N, K) np.float64; unused slots are 0
+		self.counts = counts # (N,) influences per vertex
+
+	def __len__(self):
+		return len(self.counts)
+
+	def get_width(self, start=0, end=None): # => max influences of a vertex in range
+		counts = self.counts[start:end]
+		if len(counts) == 0:
+			return 0
+		return int(counts.max())
+
+	def get_vertex(self, i): # => [(joint, weight)]
+		n = self.counts[i]
+		return list(zip(self.joints[i, :n].tolist(), self.weights[i, :n].tolist()))
+
+	def get_slots(self, start, end, width): # => (joints, weights) of vertexes in range, padded (or cut) to width; joints with zero weight are 0
+		joints = np.zeros((end - start, width), dtype=np.uint16)
+		weights = np.zeros((end - start, width), dtype=np.float64)
+		k = min(width, self.joints.shape[1])
+		joints[:, :k] = self.joints[start:end, :k]
+		weights[:, :k] = self.weights[start:end, :k]
+		joints[weights == 0] = 0
+		return (joints, weights)
+
+def _merge_joints(joints, weights, valid): # sums weights of repeated joints into first occurrence (in order, same as adding one by one) => (weights, first occurrence mask)
+	weights = np.where(valid, weights, 0)
+	first = valid.copy()
+	for j in range(1, joints.shape[1]):
+		for i in range(j):
+			dup = first[:, i] & first[:, j] & (joints[:, i] == joints[:, j])
+			weights[dup, i] += weights[dup, j]
+			first[dup, j] = False
+	weights[~first] = 0
+	return (weights, first)
+
+def _compact(joints, weights, keep, order): # moves kept slots to the front (in given order) => SkinWeights
+	joints = np.take_along_axis(joints, order, axis=1)
+	weights = np.take_along_axis(weights, order, axis=1)
+	counts = np.take_along_axis(keep, order, axis=1).sum(axis=1)
+
+	width = int(counts.max()) if len(counts) > 0 else 0
+	joints = joints[:, :width].astype(np.uint16)
+	weights = weights[:, :width].copy()
+
+	unused = (np.arange(width)[None, :] >= counts[:, None])
+	joints[unused] = 0
+	weights[unused] = 0
+	return SkinWeights(joints, weights, counts)
+
+def _decode_batched(raw, batches): # => SkinWeights
+	# every 16 vertexes of a batch start with a byte of (influences - 1);
+	# then each vertex is either a single joint byte (weight is 1), or (joint, weight/256) byte pairs
+
+	# only groups' layout is walked in python, vertexes are decoded with numpy
+	starts, sizes, groups = [], [], []
+	for b in batches:
+		offset = b.offset
+		for j in range(0, b.vertex_count, 16):
+			g = raw[offset] + 1
+			n = min(16, b.vertex_count - j)
+			starts += [offset + 1]
+			sizes += [n]
+			groups += [g]
+			offset += 1 + n * (1 if g == 1 else g * 2)
+
+	data = np.frombuffer(raw, dtype=np.uint8)
+	sizes = np.array(sizes, dtype=np.int64)
+	groups = np.repeat(np.array(groups, dtype=np.int64), sizes)
+	strides = np.where(groups == 1, 1, groups * 2)
+
+	count = len(groups)
+	width = int(groups.max()) if count > 0 else 0
+
+	# vertex offsets: group start + stride * index in group
+	first_in_group = np.repeat(np.cumsum(sizes) - sizes, sizes)
+	offsets = np.repeat(np.array(starts, dtype=np.int64), sizes) + strides * (np.arange(count) - first_in_group)
+
+	joints = np.zeros((count, width), dtype=np.int64)
+	weights = np.zeros((count, width), dtype=np.float64)
+	valid = (np.arange(width)[None, :] < groups[:, None])
+
+	single = (groups == 1)
+	if width > 0:
+		joints[single, 0] = data[offsets[single]]
+		weights[single, 0] = 1.0
+
+	multi = ~single
+	for k in range(width):
+		rows = multi & (groups > k)
+		joints[rows, k] = data[offsets[rows] + 2*k]
+		weights[rows, k] = data[offsets[rows] + 2*k + 1] / 256.0
+
+	weights, first = _merge_joints(joints, weights, valid)
+	order = np.argsort(~first, axis=1, kind="stable")
+	return _compact(joints, weights, first, order)
+
+def _decode_rcra(entries): # (N, 8) array of 4 joints and 4 weights => SkinWeights
+	joints = entries[:, :4].astype(np.int64)
+	weights = entries[:, 4:].astype(np.float64)
+	weights, _ = _merge_joints(joints, weights, np.ones(joints.shape, dtype=bool))
+
+	# normalized (unless already), most important first, zeros dropped
+	sm = entries[:, 4:].astype(np.int64).sum(axis=1)
+	normalize = (sm > 0) & (sm != 1)
+	weights[normalize] /= sm[normalize, None]
+
+	order = np.argsort(-weights, axis=1, kind="stable")
+	return _compact(joints, weights, weights > 0, order)
+
+def get_model_skin(dat1): # => (SkinWeights or None, RCRA SkinWeights or None)
+	skin_section = dat1.get_section(ModelSkinDataSection.TAG)
+	skin_batch_section = dat1.get_section(ModelSkinBatchSection.TAG)
+	rcra_skin_section = dat1.get_section(xCCBAFF15_Section.TAG)
+
+	skin = None
+	if skin_section is not None and skin_batch_section is not None:
+		skin = skin_section.get_weights(skin_batch_section)
+
+	rcra_skin = None
+	if rcra_skin_section is not None:
+		rcra_skin = rcra_skin_section.get_weights()
+
+	return skin, rcra_skin
+
+#
+
 class SkinBatch(object):
 	ENTRY_SIZE = 16
 
@@ -118,7 +249,14 @@ class ModelSkinDataSection(dat1lib.types.sections.Section): # vertex weights
 		# size = 5..7348561 (avg = 249085.2)
 		#
 		# examples: 8B4C8E19832AE134 (min size), 988A53437037246E (max size)
-		pass
+
+		self._weights = None # (batches layout, SkinWeights)
+
+	def get_weights(self, batch_section): # => SkinWeights, decoded once per batches layout (in-place edits of _raw aren't tracked)
+		key = [(b.offset, b.vertex_count) for b in batch_section.batches]
+		if self._weights is None or self._weights[0] != key:
+			self._weights = (key, _decode_batched(self._raw, batch_section.batches))
+		return self._weights[1]
 
 	def save(self):
 		of = io.BytesIO(bytes())
@@ -159,26 +297,48 @@ class xCCBAFF15_Section(dat1lib.types.sections.Section):
 		
 		ENTRY_SIZE = 8
 		count = len(data)//ENTRY_SIZE
-		self.entries = [struct.unpack("<8B", data[i*ENTRY_SIZE:(i+1)*ENTRY_SIZE]) for i in range(count)]
+		self.packed = np.frombuffer(data, dtype=np.uint8, count=count*ENTRY_SIZE).reshape(count, ENTRY_SIZE)
 		# <bone><bone><bone><bone>
 		# <weight><weight><weight><weight>
 
+		self._entries = None # list of tuples, only made if legacy code asks for `entries`
+		self._weights = None
+
+	@property
+	def entries(self):
+		if self._entries is None:
+			self._entries = [tuple(e) for e in self.packed.tolist()]
+		return self._entries
+
+	@entries.setter
+	def entries(self, entries):
+		self._entries = entries
+
+	def get_entries(self): # => (N, 8) np.uint8 array, with changes made through `entries`
+		if self._entries is not None:
+			return np.array(self._entries, dtype=np.uint8).reshape(-1, 8)
+		return self.packed
+
+	def get_weights(self): # => SkinWeights, cached while `entries` aren't touched
+		if self._entries is not None:
+			return _decode_rcra(self.get_entries())
+
+		if self._weights is None:
+			self._weights = _decode_rcra(self.packed)
+		return self._weights
+
 	def save(self):
-		of = io.BytesIO(bytes())
-		for e in self.entries:
-			of.write(struct.pack("<8B", *e))
-		of.seek(0)
-		return of.read()
+		return self.get_entries().tobytes()
 
 	def get_short_suffix(self):
-		return "RCRA weights ({})".format(len(self.entries))
+		return "RCRA weights ({})".format(len(self.packed))
 
 	def print_verbose(self, config):
 		if config.get("web", False):
 			return
 		
 		##### "{:08X} | ............ | {:6} ..."
-		print("{:08X} | RCRA weights | {:6} entries".format(self.TAG, len(self.entries)))
+		print("{:08X} | RCRA weights | {:6} entries".format(self.TAG, len(self.packed)))
 
 	def web_repr(self):
-		return {"name": "RCRA weights", "type": "text", "readonly": True, "content": f"{len(self.entries)} weights"}
+		return {"name": "RCRA weights", "type": "text", "readonly": True, "content": f"{len(self.packed)} weights"}
@@ -21,18 +21,18 @@ class ArchiveFileEntry(object):
 			self.install_bucket, self.chunkmap = struct.unpack("<II", data[:8])
 
 	@classmethod
-	def make(cls, bucket, chunk, filename):
+	def make(cls, bucket, chunk, filename, version=None):
 		data = struct.pack("<II", bucket, chunk)
 		f = io.BytesIO()
 		f.write(data)
 		f.write(filename.encode('ascii'))
 		LN = 64
-		if self._version == dat1lib.VERSION_SO:
+		if version == dat1lib.VERSION_SO:
 			LN = 16
 		if len(filename) < LN:
 			f.write(b'\0' * (LN - len(filename)))
 		f.seek(0)
-		return cls(f.read())
+		return cls(f.read(), version)
 
 class ArchivesSection(dat1lib.types.sections.Section):
 	TAG = 0x398ABFF0 # Archive TOC File Metadata
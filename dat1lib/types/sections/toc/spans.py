@@ -4,6 +4,7 @@
 # A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
 
 import dat1lib.types.sections
+import io
 import struct
 
 class SpanEntry(object):
@@ -21,6 +22,13 @@ class SpansSection(dat1lib.types.sections.Section):
 		count = len(data)//ENTRY_SIZE
 		self.entries = [SpanEntry(data[i*ENTRY_SIZE:(i+1)*ENTRY_SIZE]) for i in range(count)]
 
+	def save(self):
+		of = io.BytesIO(bytes())
+		for e in self.entries:
+			of.write(struct.pack("<II", e.asset_index, e.count))
+		of.seek(0)
+		return bytearray(of.read())
+
 	def get_short_suffix(self):
 		return "spans ({})".format(len(self.entries))
 
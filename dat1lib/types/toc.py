@@ -5,6 +5,7 @@
 
 import dat1lib.decompression as decompression
 import dat1lib.crc64 as crc64
+import dat1lib.deflate as deflate
 import dat1lib.types.dat1
 import dat1lib.types.sections.toc.archives
 import dat1lib.types.sections.toc.asset_ids
@@ -16,6 +17,33 @@ import os.path
 import struct
 import zlib
 
+SECTION_ARCHIVES_MAP = dat1lib.types.sections.toc.archives.ArchivesSection.TAG
+SECTION_ASSET_IDS = dat1lib.types.sections.toc.asset_ids.AssetIdsSection.TAG
+SECTION_OFFSET_ENTRIES = dat1lib.types.sections.toc.offsets.OffsetsSection.TAG
+SECTION_SIZE_ENTRIES = dat1lib.types.sections.toc.sizes.SizesSection.TAG
+SECTION_SPAN_ENTRIES = dat1lib.types.sections.toc.spans.SpansSection.TAG
+
+def open_archive_file(path): # => (f:FileHandle, compressed:bool)
+	f = open(path, "rb")
+	v = struct.unpack("<I", f.read(4))[0]
+	return (f, v == 0x52415344)
+
+def read_blocks(f): # => [(real_offset, comp_offset, real_size, comp_size)], sorted by real_offset
+	f.seek(12)
+	blocks_header_end = struct.unpack("<I", f.read(4))[0]
+	f.seek(32)
+	blocks = []
+	while f.tell() < blocks_header_end:
+		real_offset, _, comp_offset, _, real_size, comp_size, _, _ = struct.unpack("<IIIIIIII", f.read(32))
+		blocks += [(real_offset, comp_offset, real_size, comp_size)]
+	return blocks
+
+def decompress_block(f, block):
+	real_offset, comp_offset, real_size, comp_size = block
+	f.seek(comp_offset)
+	compressed_data = f.read(comp_size)
+	return decompression.decompress(compressed_data, real_size)
+
 class AssetEntry(object):
 	def __init__(self, index, aid, archive, offset, size):
 		self.index = index
@@ -45,15 +73,14 @@ class TOC(object):
 		self._archives = {} # (f:FileHandle, compressed:bool)
 		self._archives_dir = None
 
-	def save(self, f):
+	def save(self, f, level=deflate.LEVEL_DEFAULT, threads=1):
+		# threads > 1 (or None for all cores) compresses chunks in parallel
 		of = io.BytesIO(bytes())
 		self.dat1.save(of)
 		of.seek(0)
 		uncompressed = of.read()
 
-		c = zlib.compressobj()
-		compressed = c.compress(uncompressed)
-		compressed += c.flush()
+		compressed = deflate.compress(uncompressed, level, threads)
 		
 		f.write(struct.pack("<II", self.magic, len(uncompressed)))
 		f.write(compressed)
@@ -78,14 +105,7 @@ class TOC(object):
 		self._archives_dir = path
 		self._archives = {}
 
-	def _get_archive(self, index):
-		if index in self._archives:
-			return self._archives[index]
-
-		if self._archives_dir is None:
-			print("[!] Can't open archive when 'asset_archive' is not specified")
-			return (None, False)
-
+	def get_archive_path(self, index):
 		s = self.get_archives_section()
 		fn = s.archives[index].filename
 
@@ -95,10 +115,17 @@ class TOC(object):
 		fn = fn.decode('ascii')
 		fn = fn.replace("\\", "/")
 
-		f = open(os.path.join(self._archives_dir, fn), "rb")
-		v = struct.unpack("<I", f.read(4))[0]
-		compressed = (v == 0x52415344)
-		self._archives[index] = (f, compressed)
+		return os.path.join(self._archives_dir, fn)
+
+	def _get_archive(self, index):
+		if index in self._archives:
+			return self._archives[index]
+
+		if self._archives_dir is None:
+			print("[!] Can't open archive when 'asset_archive' is not specified")
+			return (None, False)
+
+		self._archives[index] = open_archive_file(self.get_archive_path(index))
 		return self._archives[index]
 
 	#
@@ -161,13 +188,7 @@ class TOC(object):
 			return f.read(entry.size)
 
 		# TODO: read blocks map once per archive and reuse it
-		f.seek(12)
-		blocks_header_end = struct.unpack("<I", f.read(4))[0]
-		f.seek(32)
-		blocks = []
-		while f.tell() < blocks_header_end:
-			real_offset, _, comp_offset, _, real_size, comp_size, _, _ = struct.unpack("<IIIIIIII", f.read(32))
-			blocks += [(real_offset, comp_offset, real_size, comp_size)]
+		blocks = read_blocks(f)
 
 		asset_offset = entry.offset
 		asset_end = asset_offset + entry.size
@@ -179,7 +200,7 @@ class TOC(object):
 
 		started_reading = False
 		for block in blocks:
-			real_offset, comp_offset, real_size, comp_size = block
+			real_offset, _, real_size, _ = block
 
 			real_end = real_offset + real_size
 			is_first_block = real_offset <= asset_offset and asset_offset < real_end
@@ -189,9 +210,7 @@ class TOC(object):
 				started_reading = True
 
 			if started_reading:
-				f.seek(comp_offset)
-				compressed_data = f.read(comp_size)
-				decompressed_data = decompression.decompress(compressed_data, real_size)
+				decompressed_data = decompress_block(f, block)
 				block_start = max(real_offset, asset_offset) - real_offset
 				block_end   = min(asset_end, real_end) - real_offset
 				data += decompressed_data[block_start:block_end]
@@ -200,3 +219,169 @@ class TOC(object):
 				break
 
 		return data
+
+# collects assets changes and applies them all at once on commit():
+# reroutes are applied in place, added and removed assets cause one sorted
+# merge per affected span, and every changed section gets serialized once
+
+class TocTransaction(object):
+	def __init__(self, toc):
+		self.toc = toc
+		self._reset()
+
+	def _reset(self):
+		self._index = None # aid -> [asset indexes] (ascending; asset can be in several spans)
+		self._updates = {} # asset index -> (archive_index, offset, size)
+		self._added = {} # span index -> {aid: (archive_index, offset, size)}
+		self._removed = set() # asset indexes
+		self._archives_changed = False
+
+	def _get_index(self): # built once per transaction, so lookups don't scan all ids
+		if self._index is None:
+			self._index = {}
+			ids = self.toc.get_assets_section().ids
+			for i in range(len(ids)):
+				aid = ids[i]
+				if aid in self._index:
+					self._index[aid] += [i]
+				else:
+					self._index[aid] = [i]
+		return self._index
+
+	def _get_present(self, aid): # => [asset indexes] of aid that weren't removed
+		return [i for i in self._get_index().get(aid, []) if i not in self._removed]
+
+	def _find_added(self, aid):
+		for span_index in self._added:
+			if aid in self._added[span_index]:
+				return span_index
+		return None
+
+	#
+
+	def find_archive(self, fn): # => archive index or -1
+		s = self.toc.get_archives_section()
+		for i, a in enumerate(s.archives):
+			ndx = len(a.filename)
+			for j in range(len(a.filename)):
+				if a.filename[j] == 0:
+					ndx = j
+					break
+
+			if a.filename[:ndx].decode('ascii') == fn:
+				return i
+
+		return -1
+
+	def add_archive(self, fn): # => archive index
+		s = self.toc.get_archives_section()
+		s.archives += [dat1lib.types.sections.toc.archives.ArchiveFileEntry.make(0, 10000 + len(s.archives), fn, s.version)]
+		self._archives_changed = True
+		return len(s.archives)-1
+
+	def has_asset(self, aid):
+		if len(self._get_present(aid)) > 0:
+			return True
+		return self._find_added(aid) is not None
+
+	def add_or_reroute(self, aid, archive_index, offset, size, span_to_append_to=0): # => True if asset was added
+		present = self._get_present(aid)
+		if len(present) > 0:
+			for i in present: # every span's entry, so asset doesn't get old data from some of them
+				self._updates[i] = (archive_index, offset, size)
+			return False
+
+		span_index = self._find_added(aid)
+		if span_index is not None:
+			self._added[span_index][aid] = (archive_index, offset, size)
+			return False
+
+		if span_to_append_to not in self._added:
+			self._added[span_to_append_to] = {}
+		self._added[span_to_append_to][aid] = (archive_index, offset, size)
+		return True
+
+	def reroute(self, aid, archive_index, offset, size):
+		if not self.has_asset(aid):
+			raise Exception("Asset {:016X} not found".format(aid))
+		self.add_or_reroute(aid, archive_index, offset, size)
+
+	def remove(self, aid, span_index=None): # => number of removed entries
+		spans = self.toc.get_spans_section().entries
+
+		count = 0
+		for i in self._get_present(aid):
+			if span_index is not None:
+				span = spans[span_index]
+				if not (span.asset_index <= i < span.asset_index + span.count):
+					continue
+
+			self._removed.add(i)
+			self._updates.pop(i, None)
+			count += 1
+
+		for si in self._added:
+			if span_index is not None and si != span_index:
+				continue
+
+			if aid in self._added[si]:
+				del self._added[si][aid]
+				count += 1
+
+		return count
+
+	def commit(self):
+		dat1 = self.toc.dat1
+		assets = self.toc.get_assets_section()
+		sizes = self.toc.get_sizes_section()
+		offsets = self.toc.get_offsets_section()
+		spans = self.toc.get_spans_section()
+
+		for i in self._updates:
+			archive_index, offset, size = self._updates[i]
+			sizes.entries[i].value = size
+			offsets.entries[i].archive_index = archive_index
+			offsets.entries[i].offset = offset
+
+		layout_changed = (len(self._removed) > 0 or any(len(a) > 0 for a in self._added.values()))
+		if layout_changed:
+			ids, size_entries, offset_entries = [], [], []
+
+			for span_index, span in enumerate(spans.entries):
+				span_range = range(span.asset_index, span.asset_index + span.count)
+				rows = [(assets.ids[i], sizes.entries[i], offsets.entries[i]) for i in span_range if i not in self._removed]
+
+				added = self._added.get(span_index, {})
+				if len(added) > 0:
+					for aid in added:
+						archive_index, offset, size = added[aid]
+						size_entry = dat1lib.types.sections.toc.sizes.SizeEntry(struct.pack("<III", 1, size, 0))
+						offset_entry = dat1lib.types.sections.toc.offsets.OffsetEntry(struct.pack("<II", archive_index, offset))
+						rows += [(aid, size_entry, offset_entry)]
+					rows = sorted(rows, key=lambda x: x[0]) # span is already sorted, so it's a merge with a sorted run of added ones
+
+				span.asset_index = len(ids)
+				span.count = len(rows)
+				for aid, s, o in rows:
+					ids += [aid]
+					size_entries += [s]
+					offset_entries += [o]
+
+			for i, s in enumerate(size_entries):
+				s.index = i
+
+			assets.ids = ids
+			sizes.entries = size_entries
+			offsets.entries = offset_entries
+
+			dat1.refresh_section_data(SECTION_SPAN_ENTRIES)
+			dat1.refresh_section_data(SECTION_ASSET_IDS)
+
+		if layout_changed or len(self._updates) > 0:
+			dat1.refresh_section_data(SECTION_SIZE_ENTRIES)
+			dat1.refresh_section_data(SECTION_OFFSET_ENTRIES)
+
+		if self._archives_changed:
+			dat1.refresh_section_data(SECTION_ARCHIVES_MAP)
+
+		self._reset()
@@ -4,6 +4,7 @@
 # A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
 
 import dat1lib.crc64 as crc64
+import dat1lib.deflate as deflate
 import dat1lib.decompression as decompression
 import dat1lib.gdeflate as gdeflate
 import dat1lib.types.dat1
@@ -18,6 +19,32 @@ import os.path
 import struct
 import zlib
 
+def open_archive_file(path): # => (f:FileHandle, compressed:bool)
+	f = open(path, "rb")
+	v = struct.unpack("<I", f.read(4))[0]
+	return (f, v == 0x52415344)
+
+def read_blocks(f): # => [(real_offset, comp_offset, real_size, comp_size, comp_type)], sorted by real_offset
+	f.seek(12)
+	blocks_header_end = struct.unpack("<I", f.read(4))[0]
+	f.seek(32)
+	blocks = []
+	while f.tell() < blocks_header_end:
+		real_offset, _, comp_offset, _, real_size, comp_size, comp_type, _, _, _ = struct.unpack("<IIIIIIBBHI", f.read(32))
+		blocks += [(real_offset, comp_offset, real_size, comp_size, comp_type)]
+	return blocks
+
+def decompress_block(f, block):
+	real_offset, comp_offset, real_size, comp_size, comp_type = block
+	f.seek(comp_offset)
+	compressed_data = f.read(comp_size)
+
+	if comp_type == 2:
+		return gdeflate.decompress(compressed_data, real_size)
+	elif comp_type == 3:
+		return decompression.decompress(compressed_data, real_size)
+	return bytearray(real_size)
+
 class AssetEntry(object):
 	def __init__(self, index, aid, archive, offset, size, header):
 		self.index = index
@@ -50,15 +77,14 @@ class TOC2(object): # RCRA version
 		self._archives = {} # (f:FileHandle, compressed:bool)
 		self._archives_dir = None
 
-	def save(self, f):
+	def save(self, f, level=deflate.LEVEL_DEFAULT, threads=1):
+		# threads > 1 (or None for all cores) compresses chunks in parallel
 		of = io.BytesIO(bytes())
 		self.dat1.save(of)
 		of.seek(0)
 		uncompressed = of.read()
 
-		c = zlib.compressobj()
-		compressed = c.compress(uncompressed)
-		compressed += c.flush()
+		compressed = deflate.compress(uncompressed, level, threads)
 		
 		f.write(struct.pack("<II", self.magic, len(uncompressed)))
 		f.write(compressed)
@@ -83,14 +109,7 @@ class TOC2(object): # RCRA version
 		self._archives_dir = path
 		self._archives = {}
 
-	def _get_archive(self, index):
-		if index in self._archives:
-			return self._archives[index]
-
-		if self._archives_dir is None:
-			print("[!] Can't open archive when 'asset_archive' is not specified")
-			return (None, False)
-
+	def get_archive_path(self, index):
 		s = self.get_archives_section()
 		fn = s.archives[index].filename
 
@@ -100,10 +119,17 @@ class TOC2(object): # RCRA version
 		fn = fn.decode('ascii')
 		fn = fn.replace("\\", "/")
 
-		f = open(os.path.join(self._archives_dir, fn), "rb")
-		v = struct.unpack("<I", f.read(4))[0]
-		compressed = (v == 0x52415344)
-		self._archives[index] = (f, compressed)
+		return os.path.join(self._archives_dir, fn)
+
+	def _get_archive(self, index):
+		if index in self._archives:
+			return self._archives[index]
+
+		if self._archives_dir is None:
+			print("[!] Can't open archive when 'asset_archive' is not specified")
+			return (None, False)
+
+		self._archives[index] = open_archive_file(self.get_archive_path(index))
 		return self._archives[index]
 
 	#
@@ -185,13 +211,7 @@ class TOC2(object): # RCRA version
 			return data
 
 		# TODO: read blocks map once per archive and reuse it
-		f.seek(12)
-		blocks_header_end = struct.unpack("<I", f.read(4))[0]
-		f.seek(32)
-		blocks = []
-		while f.tell() < blocks_header_end:
-			real_offset, _, comp_offset, _, real_size, comp_size, comp_type, _, _, _ = struct.unpack("<IIIIIIBBHI", f.read(32))
-			blocks += [(real_offset, comp_offset, real_size, comp_size, comp_type)]
+		blocks = read_blocks(f)
 
 		asset_offset = entry.offset
 		asset_end = asset_offset + entry.size
@@ -205,7 +225,7 @@ class TOC2(object): # RCRA version
 
 		started_reading = False
 		for block in blocks:
-			real_offset, comp_offset, real_size, comp_size, comp_type = block
+			real_offset, _, real_size, _, _ = block
 
 			real_end = real_offset + real_size
 			is_first_block = real_offset <= asset_offset and asset_offset < real_end
@@ -215,17 +235,7 @@ class TOC2(object): # RCRA version
 				started_reading = True
 
 			if started_reading:
-				f.seek(comp_offset)
-				compressed_data = f.read(comp_size)
-
-				decompressed_data = None
-				if comp_type == 2:
-					decompressed_data = gdeflate.decompress(compressed_data, real_size)				
-				elif comp_type == 3:
-					decompressed_data = decompression.decompress(compressed_data, real_size)
-				else:
-					decompressed_data = bytearray(real_size)
-
+				decompressed_data = decompress_block(f, block)
 				block_start = max(real_offset, asset_offset) - real_offset
 				block_end   = min(asset_end, real_end) - real_offset
 				data += decompressed_data[block_start:block_end]
@@ -3,9 +3,11 @@
 # For more details, terms and conditions, see GNU General Public License.
 # A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
 
+import multiprocessing
 import sys
 
 if __name__ == "__main__":
+	multiprocessing.freeze_support() # thumbnails are prerendered in worker processes
 	no_args = (len(sys.argv) < 2)
 	custom_mode = False
 
@@ -4,48 +4,161 @@
 # A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
 
 import dat1lib
+import dat1lib.extraction
 import dat1lib.types.toc
+import dat1lib.types.toc2
+import concurrent.futures
+import multiprocessing
 import os
+import os.path
 import sys
 import traceback
 
-def main(argv):
-	if len(argv) < 2:
-		print("Usage:")
-		print("$ {} <asset_archive path>".format(argv[0]))
-		print("")
-		print("Interactive assets extractor.")
-		return
+CHUNK_SIZE = 256 # assets per task; task's assets are neighbours in the same archive
 
-	#
+###
 
-	asset_archive_path = argv[1]
-	toc_fn = os.path.join(asset_archive_path, "toc")
-	toc = None
+def _extract_chunk(rcra, archive_fn, tasks): # runs in a worker process; tasks are [(AssetEntry, output_fn)] sorted by offset => (extracted, failed)
+	toc_module = dat1lib.types.toc2 if rcra else dat1lib.types.toc
+	output_fns = {entry.index: output_fn for entry, output_fn in tasks}
+
+	extracted, failed = 0, []
 	try:
-		with open(toc_fn, "rb") as f:
-			toc = dat1lib.read(f)
+		for entry, data in dat1lib.extraction.read_archive(toc_module, archive_fn, [entry for entry, _ in tasks]):
+			output_fn = output_fns[entry.index]
+			try:
+				os.makedirs(os.path.dirname(output_fn), exist_ok=True)
+				tmp_fn = output_fn + ".part" # so interrupted writes aren't mistaken for extracted files on resume
+				with open(tmp_fn, "wb") as of:
+					of.write(data)
+				os.replace(tmp_fn, output_fn)
+				extracted += 1
+			except Exception as e:
+				failed += [(output_fn, "{}".format(e))]
 	except Exception as e:
-		print("[!] Couldn't open '{}'".format(toc_fn))
-		print(e)
-		return
+		done = extracted + len(failed)
+		failed += [(output_fn, "{}".format(e)) for _, output_fn in tasks[done:]]
 
-	#
-	
-	if toc is None:
-		print("[!] Couldn't comprehend '{}'".format(toc_fn))
-		return
+	return (extracted, failed)
 
-	if not isinstance(toc, dat1lib.types.toc.TOC):
-		print("[!] Not a toc")
+###
+
+def load_hashes(fn="hashes.txt"): # => {aid:int -> path}
+	def normalize_path(path):
+		return path.lower().replace('\\', '/').strip()
+
+	paths = {}
+	if not os.path.isfile(fn):
+		return paths
+
+	with open(fn, "r") as f:
+		for line in f:
+			try:
+				parts = line.split(",")
+				aid, path = int(parts[0], 16), normalize_path(parts[1])
+				if path != "":
+					paths[aid] = path
+			except:
+				pass
+
+	# some assets are embedded into others, and their paths look like <file>/<embed>,
+	# so these are put into <file>--embed/ directory instead (same as assets browser does)
+	files = set(paths.values())
+	for aid in paths:
+		parts = paths[aid].split("/")
+		for i in range(1, len(parts)):
+			if "/".join(parts[:i]) in files:
+				parts[i-1] += "--embed"
+		paths[aid] = "/".join(parts)
+
+	return paths
+
+def select_entries(toc, span=None, ids=None, path_prefix=None, paths=None): # => [(span_index, AssetEntry)]
+	if path_prefix is not None:
+		path_prefix = path_prefix.lower().replace('\\', '/').strip().strip("/")
+
+	assets = toc.get_assets_section().ids
+	spans = toc.get_spans_section().entries
+
+	result = []
+	for span_index, s in enumerate(spans):
+		if span is not None and span_index != span:
+			continue
+
+		for i in range(s.asset_index, s.asset_index + s.count):
+			aid = assets[i]
+			if ids is not None and aid not in ids:
+				continue
+			if path_prefix is not None:
+				path = paths.get(aid)
+				if path is None or not (path == path_prefix or path.startswith(path_prefix + "/")):
+					continue
+
+			entry = toc.get_asset_entry_by_index(i)
+			if entry is not None:
+				result += [(span_index, entry)]
+
+	return result
+
+def extract_entries(toc, entries, output_dir, paths, jobs=None):
+	rcra = isinstance(toc, dat1lib.types.toc2.TOC2)
+
+	# sorting by (archive, offset) makes every worker read its archive sequentially
+	entries = sorted(entries, key=lambda e: (e[1].archive, e[1].offset))
+
+	tasks_by_archive = {}
+	skipped = 0
+	for span_index, entry in entries:
+		path = paths.get(entry.asset_id, "{:016X}".format(entry.asset_id))
+		output_fn = os.path.join(output_dir, "{}".format(span_index), path)
+
+		header = getattr(entry, "header", None)
+		expected_size = entry.size + (len(header) if header is not None else 0)
+		if os.path.isfile(output_fn) and os.path.getsize(output_fn) == expected_size:
+			skipped += 1
+			continue
+
+		if entry.archive not in tasks_by_archive:
+			tasks_by_archive[entry.archive] = []
+		tasks_by_archive[entry.archive] += [(entry, output_fn)]
+
+	total = sum([len(tasks_by_archive[a]) for a in tasks_by_archive])
+	print("{} assets to extract, {} already extracted".format(total, skipped))
+	if total == 0:
 		return
-	
-	#
 
-	archs = toc.get_archives_section()
-	aids = toc.get_assets_section() # lul
-	print("TOC: {} archives, {} assets".format(len(archs.archives), len(aids.ids)))
-	toc.set_archives_dir(asset_archive_path)
+	extracted, failed = 0, []
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+		futures = []
+		for archive_index in tasks_by_archive:
+			archive_fn = toc.get_archive_path(archive_index)
+			tasks = tasks_by_archive[archive_index]
+			for i in range(0, len(tasks), CHUNK_SIZE):
+				futures += [pool.submit(_extract_chunk, rcra, archive_fn, tasks[i:i+CHUNK_SIZE])]
+
+		for future in concurrent.futures.as_completed(futures):
+			try:
+				e, f = future.result()
+				extracted += e
+				failed += f
+			except Exception as e:
+				print("[!] Failed")
+				print(traceback.format_exc())
+
+			print("\r{}/{} extracted, {} failed".format(extracted, total, len(failed)), end="")
+
+	print("")
+	for output_fn, error in failed:
+		print("[!] {}: {}".format(output_fn, error))
+
+###
+
+def interactive(toc):
+	indexes = {} # aid -> [asset index], instead of linear search for every input
+	for i, aid in enumerate(toc.get_assets_section().ids):
+		if aid not in indexes:
+			indexes[aid] = []
+		indexes[aid] += [i]
 
 	while True:
 		print("")
@@ -60,7 +173,7 @@ def main(argv):
 			print("[!] Invalid input, try again")
 			continue
 
-		entries = toc.get_asset_entries_by_assetid(aid)
+		entries = [toc.get_asset_entry_by_index(i) for i in indexes.get(aid, [])]
 		if len(entries) == 0:
 			print("[!] Asset {:016X} not found".format(aid))
 			continue
@@ -79,5 +192,110 @@ def main(argv):
 			print(e)
 			print(traceback.format_exc())
 
+def print_usage(argv):
+	print("Usage:")
+	print("$ {} <asset_archive path>".format(argv[0]))
+	print("$ {} <asset_archive path> (--all | --span N | --path-prefix P | --ids-file F) [--jobs N] [-o DIR]".format(argv[0]))
+	print("")
+	print("Interactive assets extractor, or bulk extractor if filters are specified.")
+	print("")
+	print("  --all            extract all assets")
+	print("  --span N         only assets from span N")
+	print("  --path-prefix P  only assets with paths (from hashes.txt) starting with P")
+	print("  --ids-file F     only assets with ids listed in F (one hex id per line)")
+	print("  --jobs N         number of worker processes (all cores by default)")
+	print("  -o DIR           output directory ('extracted' by default)")
+	print("")
+	print("Assets are written into DIR/<span>/<path>, ids are used for unknown paths.")
+	print("Already extracted files are skipped, so interrupted extraction can be resumed.")
+
+def main(argv):
+	if len(argv) < 2:
+		print_usage(argv)
+		return
+
+	#
+
+	asset_archive_path = argv[1]
+	options = {}
+	flags = {"--all": False, "--span": True, "--path-prefix": True, "--ids-file": True, "--jobs": True, "-o": True}
+	i = 2
+	while i < len(argv):
+		k = argv[i]
+		if k not in flags or (flags[k] and i+1 >= len(argv)):
+			print("[!] Bad argument '{}'".format(k))
+			print("")
+			print_usage(argv)
+			return
+
+		if flags[k]:
+			options[k] = argv[i+1]
+			i += 2
+		else:
+			options[k] = True
+			i += 1
+
+	#
+
+	toc_fn = os.path.join(asset_archive_path, "toc")
+	toc = None
+	try:
+		with open(toc_fn, "rb") as f:
+			toc = dat1lib.read(f)
+	except Exception as e:
+		print("[!] Couldn't open '{}'".format(toc_fn))
+		print(e)
+		return
+
+	#
+
+	if toc is None:
+		print("[!] Couldn't comprehend '{}'".format(toc_fn))
+		return
+
+	if not isinstance(toc, (dat1lib.types.toc.TOC, dat1lib.types.toc2.TOC2)):
+		print("[!] Not a toc")
+		return
+
+	#
+
+	archs = toc.get_archives_section()
+	aids = toc.get_assets_section() # lul
+	print("TOC: {} archives, {} assets".format(len(archs.archives), len(aids.ids)))
+	toc.set_archives_dir(asset_archive_path)
+
+	if len(options) == 0:
+		interactive(toc)
+		return
+
+	filters = ["--all", "--span", "--path-prefix", "--ids-file"]
+	if not any([k in options for k in filters]):
+		print("[!] No assets selected: specify one of {}".format(", ".join(filters)))
+		return
+
+	#
+
+	span, ids, jobs = None, None, None
+	try:
+		if "--span" in options:
+			span = int(options["--span"])
+		if "--jobs" in options:
+			jobs = max(1, int(options["--jobs"]))
+		if "--ids-file" in options:
+			ids = set()
+			with open(options["--ids-file"], "r") as f:
+				for line in f:
+					line = line.split(",")[0].strip()
+					if line != "":
+						ids.add(int(line, 16))
+	except Exception as e:
+		print("[!] Bad arguments")
+		print(e)
+		return
+
+	paths = load_hashes()
+	entries = select_entries(toc, span, ids, options.get("--path-prefix"), paths)
+	extract_entries(toc, entries, options.get("-o", "extracted"), paths, jobs)
+
 if __name__ == "__main__":
-	main(sys.argv)	
+	main(sys.argv)
@@ -11,6 +11,7 @@ import dat1lib.types.sections.model.meshes
 import dat1lib.types.sections.model.skin
 import dat1lib.types.sections.model.unknowns
 import dat1lib.utils as utils
+import numpy as np
 import struct
 
 import base64
@@ -29,6 +30,25 @@ SECTION_RCRA_SKIN   = dat1lib.types.sections.model.skin.xCCBAFF15_Section.TAG
 SECTION_BUILT       = dat1lib.types.sections.model.unknowns.ModelBuiltSection.TAG
 SECTION_MATERIALS   = dat1lib.types.sections.model.unknowns.ModelMaterialSection.TAG
 
+COMPONENT_DTYPES = {
+	pygltflib.BYTE: "<i1",
+	pygltflib.UNSIGNED_BYTE: "<u1",
+	pygltflib.SHORT: "<i2",
+	pygltflib.UNSIGNED_SHORT: "<u2",
+	pygltflib.UNSIGNED_INT: "<u4",
+	pygltflib.FLOAT: "<f4"
+}
+
+TYPE_SHAPES = { # (columns, rows)
+	pygltflib.SCALAR: (1, 1),
+	pygltflib.VEC2: (1, 2),
+	pygltflib.VEC3: (1, 3),
+	pygltflib.VEC4: (1, 4),
+	pygltflib.MAT2: (2, 2),
+	pygltflib.MAT3: (3, 3),
+	pygltflib.MAT4: (4, 4)
+}
+
 ###
 
 class GltfReader(object):
@@ -89,99 +109,87 @@ class GltfReader(object):
 				weights_bufs += [self.get_accessor_values(getattr(primitive.attributes, f"WEIGHTS_{i}"))]
 				i += 1
 
-		vertexes = []
-		for i in range(len(positions)):
-			position = positions[i]
-			normal = normals[i]
-			color = (1, 1, 1, 1)
-
-			uv = None
-			if uvs is not None:
-				uv = uvs[i]
-
-			groups = []
-			weights = []
-			if has_skin:
-				for (jb, wb) in zip(joints_bufs, weights_bufs):
-					js = jb[i]
-					ws = wb[i]
-					for (j, w) in zip(js, ws):
-						groups += [j]
-						weights += [w]
-
-			vertexes += [
-				(
-					position,
-					normal,
-					color,
-					uv,
-					groups,
-					weights
-				)
-			]
+		# converted to lists at once, so injector gets plain numbers
+
+		positions = positions.astype(np.float64).tolist()
+		normals = normals.astype(np.float64).tolist()
+		uvs = [None] * len(positions) if uvs is None else uvs.astype(np.float64).tolist()
+
+		groups = [[] for i in range(len(positions))]
+		weights = [[] for i in range(len(positions))]
+		if has_skin and len(joints_bufs) > 0:
+			groups = np.concatenate(joints_bufs, axis=1).tolist()
+			weights = np.concatenate(weights_bufs, axis=1).astype(np.float64).tolist()
+
+		color = (1, 1, 1, 1)
+		vertexes = [(position, normal, color, uv, vg, vw) for position, normal, uv, vg, vw in zip(positions, normals, uvs, groups, weights)]
 
 		return vertexes
 
 	def read_faces(self, mesh):
 		primitive = mesh.primitives[0]
 		indexes = self.get_accessor_values(primitive.indices)
-		
-		faces = []
-		for j in range(0, len(indexes), 3):
-			faces += [[indexes[j+2], indexes[j+1], indexes[j]]]
 
-		return faces
+		faces_count = len(indexes) // 3
+		return indexes[:faces_count*3].astype(np.int64).reshape(-1, 3)[:, ::-1].tolist()
 
 	#
 
-	def get_accessor_values(self, accessorIndex, normalize=False):
-		def unpack_buffer(componentType, accessorType, bufferViewTarget, data, normalize):
-			if bufferViewTarget not in (None, pygltflib.ARRAY_BUFFER, pygltflib.ELEMENT_ARRAY_BUFFER):
-				print(f"[!] accessor {accessorIndex}: bufferView's target unknown ({bufferViewTarget})")
-				return None
+	def get_accessor_values(self, accessorIndex, normalize=False): # => (count,) array for SCALAR, (count, components) array otherwise; None if can't be read
+		a = self.gltf.accessors[accessorIndex]
 
-			if componentType not in (pygltflib.FLOAT, pygltflib.UNSIGNED_SHORT, pygltflib.UNSIGNED_BYTE):
-				print(f"[!] accessor {accessorIndex}: componentType unknown ({componentType})")
-				return None
+		if a.componentType not in COMPONENT_DTYPES:
+			print(f"[!] accessor {accessorIndex}: componentType unknown ({a.componentType})")
+			return None
+
+		if a.type not in TYPE_SHAPES:
+			print(f"[!] accessor {accessorIndex}: accessorType unknown ({a.type})")
+			return None
 
-			if accessorType not in (pygltflib.SCALAR, pygltflib.VEC2, pygltflib.VEC3, pygltflib.VEC4, pygltflib.MAT4):
-				print(f"[!] accessor {accessorIndex}: accessorType unknown ({accessorType})")
+		dtype = np.dtype(COMPONENT_DTYPES[a.componentType])
+		columns, rows = TYPE_SHAPES[a.type]
+
+		if a.bufferView is None:
+			values = np.zeros((a.count, columns * rows), dtype=dtype) # all zeros, except for sparse values
+		else:
+			bv = self.gltf.bufferViews[a.bufferView]
+			if bv.target not in (None, pygltflib.ARRAY_BUFFER, pygltflib.ELEMENT_ARRAY_BUFFER):
+				print(f"[!] accessor {accessorIndex}: bufferView's target unknown ({bv.target})")
 				return None
 
-			ct = 'f'
-			nm = 1.0
-			match componentType:
-				case pygltflib.UNSIGNED_SHORT: ct = 'H'; nm = 65535.0
-				case pygltflib.UNSIGNED_BYTE: ct = 'B'; nm = 255.0
+			values = self.read_elements(bv, a.byteOffset or 0, a.count, dtype, columns, rows)
 
-			cnt = 1
-			match accessorType:
-				case pygltflib.VEC2: cnt = 2
-				case pygltflib.VEC3: cnt = 3
-				case pygltflib.VEC4: cnt = 4
-				case pygltflib.MAT4: cnt = 16
+		if a.sparse is not None and a.sparse.count > 0:
+			sparse = a.sparse
+			indices_dtype = np.dtype(COMPONENT_DTYPES[sparse.indices.componentType])
+			indices = self.read_elements(self.gltf.bufferViews[sparse.indices.bufferView], sparse.indices.byteOffset or 0, sparse.count, indices_dtype, 1, 1)[:, 0]
 
-			fmt = f"<{cnt}{ct}"
-			esz = struct.calcsize(fmt)
-			enm = len(data) // esz
+			values = values.copy() # might be a view of buffer
+			values[indices] = self.read_elements(self.gltf.bufferViews[sparse.values.bufferView], sparse.values.byteOffset or 0, sparse.count, dtype, columns, rows)
 
-			result = [struct.unpack(fmt, data[i:i+esz]) for i in range(0, len(data), esz)]
+		if (normalize or a.normalized) and dtype.kind in "iu":
+			values = np.maximum(values / float(np.iinfo(dtype).max), -1.0) # signed types have two values for -1.0
 
-			if normalize:
-				def normalized(t, nm):
-					return [x/nm for x in t]
+		if columns * rows == 1:
+			values = values[:, 0]
 
-				result = [normalized(t, nm) for t in result]
+		return values
 
-			if cnt == 1:
-				result = [x[0] for x in result]
+	def read_elements(self, bv, byteOffset, count, dtype, columns, rows): # => (count, columns * rows) array
+		column_size = rows * dtype.itemsize
+		column_stride = column_size
+		if columns > 1:
+			column_stride = (column_size + 3) // 4 * 4 # matrices' columns are aligned to 4 bytes
+		element_size = columns * column_stride
+		stride = bv.byteStride or element_size # no stride means elements are tightly packed
 
-			return result
+		if count == 0:
+			return np.zeros((0, columns * rows), dtype=dtype)
 
-		a = self.gltf.accessors[accessorIndex]
-		bv = self.gltf.bufferViews[a.bufferView]
 		data = self.get_decoded_buffer(bv.buffer)
-		return unpack_buffer(a.componentType, a.type, bv.target, data[bv.byteOffset:bv.byteOffset+bv.byteLength], normalize)
+		raw = np.frombuffer(data, dtype=np.uint8, count=(count - 1) * stride + element_size, offset=(bv.byteOffset or 0) + byteOffset)
+		raw = np.lib.stride_tricks.as_strided(raw, shape=(count, columns, column_size), strides=(stride, column_stride, 1), writeable=False)
+		return np.ascontiguousarray(raw).view(dtype).reshape(count, columns * rows)
 
 	def get_decoded_buffer(self, index):
 		if index in self.decoded_buffers:
@@ -428,74 +436,32 @@ class ModelInjector(object):
 		return meshes_updates
 
 	def calculate_tangents(self, meshes_count):
-		tangent = []
-		bitangent = []
-
-		for i in range(self.current_vertex_index):
-			tangent += [(0, 0, 0)]
-			bitangent += [(0, 0, 0)]
+		positions, _, uvs = self.vertexes_section.get_arrays()
+		indexes = np.array(self.indexes_section.values, dtype=np.int64)
 
 		s = self.model.dat1.get_section(SECTION_MESHES)
 		meshes = s.meshes
+		triangles = []
 		for mi in range(meshes_count):
 			mesh = meshes[mi]
 
 			vs = mesh.vertexStart
 			f0 = mesh.indexStart
-			nf = mesh.indexCount
+			nf = mesh.indexCount // 3 * 3
 			v_offset = vs
 
 			if (mesh.get_flags() & 0x10) > 0:
 				v_offset = 0
 
-			for f in range(0, nf, 3):
-				i0 = self.indexes_section.values[f0 + f + 2] - v_offset
-				i1 = self.indexes_section.values[f0 + f + 1] - v_offset
-				i2 = self.indexes_section.values[f0 + f + 0] - v_offset
-
-				v0 = self.vertexes_section.vertexes[vs + i0]
-				p0 = (v0.x, v0.y, v0.z)
-
-				v1 = self.vertexes_section.vertexes[vs + i1]
-				p1 = (v1.x, v1.y, v1.z)
-
-				v2 = self.vertexes_section.vertexes[vs + i2]
-				p2 = (v2.x, v2.y, v2.z)
-
-				def vec_mult_scalar(vc, sc):
-					return (vc[0] * sc, vc[1] * sc, vc[2] * sc)
-
-				def vec_minus_vec(vc1, vc2):
-					return (vc1[0] - vc2[0], vc1[1] - vc2[1], vc1[2] - vc2[2])
-
-				def vec_plus_vec(vc1, vc2):
-					return (vc1[0] + vc2[0], vc1[1] + vc2[1], vc1[2] + vc2[2])
-
-				e1 = vec_minus_vec(p1, p0)
-				e2 = vec_minus_vec(p2, p0)
-
-				x1 = v1.u - v0.u
-				x2 = v2.u - v0.u
-				y1 = v1.v - v0.v
-				y2 = v2.v - v0.v
-				r = x1*y2 - x2*y1
-				if r > 0:
-					r = 1.0 / r
-
-				t = vec_mult_scalar(vec_minus_vec(vec_mult_scalar(e1, y2), vec_mult_scalar(e2, y1)), r) # (e1 * y2 - e2 * y1) * r
-				b = vec_mult_scalar(vec_minus_vec(vec_mult_scalar(e2, x1), vec_mult_scalar(e1, x2)), r) # (e2 * x1 - e1 * x2) * r
-
-				tangent[vs + i0] = vec_plus_vec(tangent[vs + i0], t)
-				tangent[vs + i1] = vec_plus_vec(tangent[vs + i1], t)
-				tangent[vs + i2] = vec_plus_vec(tangent[vs + i2], t)
+			triangles += [indexes[f0:f0 + nf].reshape(-1, 3)[:, ::-1] - v_offset + vs] # reversed, same as faces are written
 
-				bitangent[vs + i0] = vec_plus_vec(bitangent[vs + i0], b)
-				bitangent[vs + i1] = vec_plus_vec(bitangent[vs + i1], b)
-				bitangent[vs + i2] = vec_plus_vec(bitangent[vs + i2], b)
+		triangles = np.concatenate(triangles) if len(triangles) > 0 else np.zeros((0, 3), dtype=np.int64)
+		tangents, bitangents = dat1lib.types.sections.model.geo.calculate_tangents(positions, uvs.astype(np.float64), triangles, self.current_vertex_index)
 
-		for i in range(self.current_vertex_index):
-			self.vertexes_section.vertexes[i].tangent = tangent[i]
-			self.vertexes_section.vertexes[i].bitangent = bitangent[i]
+		vertexes = self.vertexes_section.vertexes
+		for i, (t, b) in enumerate(zip(tangents.tolist(), bitangents.tolist())):
+			vertexes[i].tangent = tuple(t)
+			vertexes[i].bitangent = tuple(b)
 
 	#
 
@@ -6,19 +6,25 @@
 import sys
 
 import info
+import census
 import extract_assets
 import extract_section
 import change_soundbank
 import model_to_ascii
+import models_to_gltf
 import ascii_to_model
+import search
 
 def main(argv):
 	scripts = {
 		"info": info.main,
+		"census": census.main,
 		"extract_assets": extract_assets.main,
 		"extract_section": extract_section.main,
+		"search": search.main,
 		"change_soundbank": change_soundbank.main,
 		"model_to_ascii": model_to_ascii.main,
+		"models_to_gltf": models_to_gltf.main,
 		"ascii_to_model": ascii_to_model.main
 	}
 
@@ -28,10 +34,13 @@ def main(argv):
 		print("")
 		print("Scripts:")
 		print("  info                Print as much info about a file as possible")
-		print("  extract_assets      Interactive assets extractor")
+		print("  census              Write per-type and per-section statistics of all assets in toc")
+		print("  extract_assets      Extract assets (interactively or in bulk)")
 		print("  extract_section     Save a single section as file")
+		print("  search              Search bytes, strings or config values in all assets")
 		print("  change_soundbank    Inject .bnk into .soundbank")
 		print("  model_to_ascii      Write .ascii by .model")
+		print("  models_to_gltf      Convert many models to glTF in parallel")
 		print("  ascii_to_model      Inject data from .ascii into .model")
 		return
 
@@ -123,7 +123,7 @@ class AsciiWriter(object):
 		self.init(f, model)
 
 		meshes_indexes = self.get_meshes_indexes_by_looks_and_lod(looks, lod)
-		skin, rcra_skin = self.get_skin()
+		skin, rcra_skin = dat1lib.types.sections.model.skin.get_model_skin(self.model.dat1)
 
 		self.write_bones()
 		self.write_meshes(meshes_indexes, skin, rcra_skin)
@@ -161,115 +161,8 @@ class AsciiWriter(object):
 
 	#
 
-	def get_skin(self):
-		skin_section = self.model.dat1.get_section(SECTION_SKIN_DATA)
-		skin_batch_section = self.model.dat1.get_section(SECTION_SKIN_BATCH)
-
-		has_skin = (skin_section is not None and skin_batch_section is not None)
-		skin = None
-		rcra_skin = None
-
-		if has_skin:
-			skin = []
-
-			has_to_be_len = 0
-			for i, l in enumerate(skin_batch_section.batches):
-				offset = l.offset
-				count = l.vertex_count
-
-				for j in range(0, count, 16):
-					groups = skin_section._raw[offset] + 1
-					offset += 1
-
-					for z in range(16):
-						if j + z >= count:
-							break
-
-						vertex = []
-
-						if groups == 1:
-							bone = skin_section._raw[offset]
-							offset += 1
-							vertex += [(bone, 1.0)]
-						else:
-							for k in range(groups):
-								bone, weight = struct.unpack("<BB", skin_section._raw[offset:offset+2])
-								offset += 2
-								vertex += [(bone, weight/256.0)]
-
-						skin += [vertex]
-
-			def fix_weights(v):
-				mp = {}
-				order = []
-				for b, w in v:
-					mp[b] = mp.get(b, 0) + w
-					if b not in order:
-						order += [b]
-				return [(b, mp[b]) for b in order]
-
-			skin = [fix_weights(v) for v in skin]
-
-		#
-
-		rcra_skin_section = self.model.dat1.get_section(SECTION_RCRA_SKIN)
-		if rcra_skin_section is not None:
-			rcra_skin = []
-			for v in rcra_skin_section.entries:
-				b1, b2, b3, b4, w1, w2, w3, w4 = v
-				
-				temp = {}
-				temp[b1] = w1
-				temp[b2] = temp.get(b2, 0) + w2
-				temp[b3] = temp.get(b3, 0) + w3
-				temp[b4] = temp.get(b4, 0) + w4
-
-				sm = w1 + w2 + w3 + w4
-				if sm > 0 and sm != 1:
-					for k in temp:
-						temp[k] = temp[k] / sm
-
-				weights = [(k, temp[k]) for k in temp]
-				weights = sorted(weights, key=lambda x: -x[1])
-				weights = [w for w in weights if w[1] > 0]
-
-				rcra_skin += [weights]
-
-			if has_skin:
-				def diff_skins(skin, rcra_skin):
-					def same_weights(v1, v2):
-						if len(v1) != len(v2):
-							return False
-
-						for a, b in zip(v1, v2):
-							b1, w1 = a
-							b2, w2 = b
-							if b1 != b2 or abs(w1 - w2) >= 0.01:
-								return False
-
-						return True
-
-					print(len(skin), len(rcra_skin))
-					same = True
-					for v1, v2 in zip(skin, rcra_skin):
-						if not same_weights(v1, v2):
-							print(v1, v2)
-							same = False
-							# break
-					if same:
-						print("same skin")
-
-				# diff_skins(skin, rcra_skin)
-
-			# skin = rcra_skin
-			# has_skin = True
-
-		#
-
-		return skin, rcra_skin
-
 	def get_weights(self, i, skin, weights_count):
-		vertex = skin[i]
+		vertex = skin.get_vertex(i)
 		fmt = pretty_format
 
 		groups = ""
@@ -374,8 +267,7 @@ class AsciiWriter(object):
 
 		groups_count = 4
 		if skin is not None:
-			for vi in range(mesh.vertexStart, mesh.vertexStart + mesh.vertexCount):
-				groups_count = max(len(skin[vi]), groups_count)
+			groups_count = max(skin.get_width(mesh.vertexStart, mesh.vertexStart + mesh.vertexCount), groups_count)
 
 		uv_layers = 1
 		self.f.write("{}\n".format(uv_layers))
@@ -4,6 +4,7 @@
 # A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
 
 import dat1lib
+import dat1lib.crc32 as crc32
 import dat1lib.types.model
 import dat1lib.types.sections.model.geo
 import dat1lib.types.sections.model.look
@@ -13,8 +14,8 @@ import dat1lib.types.sections.model.unknowns
 import struct
 
 import base64
-import io
 import math
+import numpy as np
 import pygltflib
 
 ADD_SHAPEKEYS = True
@@ -30,10 +31,20 @@ SECTION_RCRA_SKIN   = dat1lib.types.sections.model.skin.xCCBAFF15_Section.TAG
 SECTION_BUILT       = dat1lib.types.sections.model.unknowns.ModelBuiltSection.TAG
 SECTION_MATERIALS   = dat1lib.types.sections.model.unknowns.ModelMaterialSection.TAG
 
+GLB_ALIGNMENT = 4
+
+###
+
+def minmax_positions(positions): # (N, K) array => ([min per component], [max per component])
+	if len(positions) == 0:
+		return ([None] * positions.shape[1], [None] * positions.shape[1])
+	return (positions.min(axis=0).tolist(), positions.max(axis=0).tolist())
+
 ###
 
 class GltfWriter(object):
-	def __init__(self):
+	def __init__(self, glb=False):
+		self.glb = glb # all buffers go into single BIN chunk instead of base64 uris
 		self.init(None)
 
 	def init(self, model):
@@ -46,7 +57,7 @@ class GltfWriter(object):
 		self.current_buffer_view_index = 0
 		self.current_buffer_index = 0
 		self.current_accessor_index = 0
-		self.binary_blob = b""
+		self.binary_blob = bytearray()
 
 		#
 
@@ -57,10 +68,10 @@ class GltfWriter(object):
 		if not isinstance(self.model, dat1lib.types.model.ModelRcra):
 			self.mode = dat1lib.VERSION_MSMR
 
-		self.vertexes = []
+		self.positions, self.normals, self.uvs = None, None, None
 		if model is not None:
 			s = model.dat1.get_section(SECTION_VERTEXES)
-			self.vertexes = s.vertexes
+			self.positions, self.normals, self.uvs = s.get_arrays()
 
 		self.meshes = []
 		if model is not None:
@@ -84,12 +95,30 @@ class GltfWriter(object):
 		self.init(model)
 
 		meshes_indexes = self.get_meshes_indexes_by_looks_and_lod(looks, lod)
-		skin, rcra_skin = self.get_skin()
+		skin, rcra_skin = dat1lib.types.sections.model.skin.get_model_skin(self.model.dat1)
 
 		self.add_skeleton(model) # first, so created nodes' indexes == bones indexes
+		self.add_materials()
 		self.add_meshes(meshes_indexes, skin, rcra_skin)
 
-		self.gltf.save(filename)
+		if self.glb:
+			self.save_glb(filename)
+		else:
+			self.gltf.save(filename)
+
+	def save_glb(self, filename):
+		json_data = self.gltf.gltf_to_json(separators=(',', ':'), indent=None).encode("utf-8")
+		json_data += b" " * (-len(json_data) % GLB_ALIGNMENT)
+
+		chunks = [(b"JSON", json_data)]
+		if len(self.binary_blob) > 0:
+			chunks += [(b"BIN\0", self.binary_blob)] # already aligned
+
+		with open(filename, "wb") as f:
+			f.write(struct.pack("<4sII", b"glTF", 2, 12 + sum([8 + len(data) for _, data in chunks])))
+			for tag, data in chunks:
+				f.write(struct.pack("<I4s", len(data), tag))
+				f.write(data)
 
 	#
 
@@ -121,7 +150,7 @@ class GltfWriter(object):
 
 		#
 
-		matrixes_buffer_data = self.make_buffer_func(matrixes, lambda x: struct.pack("<16f", x[0], x[1], x[2], x[3], x[4], x[5], x[6], x[7], x[8], x[9], x[10], x[11], x[12], x[13], x[14], x[15]))
+		matrixes_buffer_data = np.array(matrixes, dtype=np.float64).reshape(-1, 16).astype("<f4").tobytes()
 		matrixes_buffer_view, matrixes_buffer_view_index = self.create_buffer_view(matrixes_buffer_data, None)
 
 		matrixes_accessor, matrixes_accessor_index = self.create_accessor()
@@ -136,6 +165,14 @@ class GltfWriter(object):
 		gltf_skin.inverseBindMatrices = matrixes_accessor_index
 		self.gltf.skins.append(gltf_skin)		
 
+	def add_materials(self): # one per model's material slot, so slots' indexes == materials indexes
+		for i, (mat_aid, matfile, matname) in enumerate(self.get_materials()):
+			gltf_material = pygltflib.Material()
+			gltf_material.name = matname if matname is not None else "material{:02}".format(i)
+			if matfile is not None:
+				gltf_material.extras["file"] = matfile
+			self.gltf.materials.append(gltf_material)
+
 	def add_meshes(self, meshes_indexes, skin, rcra_skin):
 		morph_section = self.model.dat1.get_section(0x380A5744)
 		shapekeys = []
@@ -146,78 +183,43 @@ class GltfWriter(object):
 		for mi in meshes_indexes:
 			self.add_mesh(self.make_intermediate(self.meshes[mi]), self.meshes[mi], skin, rcra_skin, mi, shapekeys)
 
-	def make_intermediate(self, mesh):
-		points = []
-		normals = []
-		uvs = []
-		triangles = []
-
+	def make_intermediate(self, mesh): # => (points, normals, uvs, triangles) arrays
 		# vertexes
 
-		for vi in range(mesh.vertexStart, mesh.vertexStart + mesh.vertexCount):
-			v = self.vertexes[vi]
-			points += [[v.x, v.y, v.z]]
-			normals += [[v.nx, v.ny, v.nz]]
-			uvs += [[v.u * self.uv_scale, v.v * self.uv_scale, 0]]
+		start, end = mesh.vertexStart, mesh.vertexStart + mesh.vertexCount
+		points = self.positions[start:end]
+		normals = self.normals[start:end]
+		uvs = self.uvs[start:end] * self.uv_scale
 
 		# indexes
 
 		s = self.model.dat1.get_section(SECTION_INDEXES)
-		indexes = s.values
+		indexes = s.get_indexes()
 		
 		vc = mesh.vertexStart
 		if (mesh.get_flags() & 0x10) > 0:
 			vc = 0 # indexes are relative already
 
 		faces_count = mesh.indexCount // 3
-		for j in range(faces_count):
-			index_index = mesh.indexStart + j*3
-			#triangles += [[indexes[index_index+2]-vc, indexes[index_index+1]-vc, indexes[index_index]-vc]] # .ascii
-			triangles += [[indexes[index_index]-vc, indexes[index_index+1]-vc, indexes[index_index+2]-vc]] # .gltf
+		triangles = indexes[mesh.indexStart:mesh.indexStart + faces_count*3].astype(np.int64).reshape(-1, 3) - vc # .gltf order (.ascii has them reversed)
 
 		return (points, normals, uvs, triangles)
 
 	def add_mesh(self, mesh, ig_mesh, skin, rcra_skin, orig_mesh_index, shapekeys):
 		points, normals, uvs, triangles = mesh
 
-		vertexes_buffer_data = self.make_buffer_func(points, lambda x: struct.pack("<3f", x[0], x[1], x[2]))
-		indexes_buffer_data = self.make_buffer_func(triangles, lambda x: struct.pack("<3H", x[0], x[1], x[2]))
-		normals_buffer_data = self.make_buffer_func(normals, lambda x: struct.pack("<3f", x[0], x[1], x[2]))
-		uvs_buffer_data = self.make_buffer_func(uvs, lambda x: struct.pack("<2f", x[0], x[1]))
+		vertexes_buffer_data = points.astype("<f4").tobytes()
+		index_dtype, index_component_type = ("<u2", pygltflib.UNSIGNED_SHORT) if len(triangles) == 0 or triangles.max() <= 0xFFFF else ("<u4", pygltflib.UNSIGNED_INT)
+		indexes_buffer_data = triangles.astype(index_dtype).tobytes()
+		normals_buffer_data = normals.astype("<f4").tobytes()
+		uvs_buffer_data = uvs.astype("<f4").tobytes()
 
 		vertexes_buffer_view, vertexes_buffer_view_index = self.create_buffer_view(vertexes_buffer_data, pygltflib.ARRAY_BUFFER)
 		indexes_buffer_view, indexes_buffer_view_index = self.create_buffer_view(indexes_buffer_data, pygltflib.ELEMENT_ARRAY_BUFFER)
 		normals_buffer_view, normals_buffer_view_index = self.create_buffer_view(normals_buffer_data, pygltflib.ARRAY_BUFFER)
 		uvs_buffer_view, uvs_buffer_view_index = self.create_buffer_view(uvs_buffer_data, pygltflib.ARRAY_BUFFER)
 
-		def minmax_positions(positions):
-			min_x, min_y, min_z = None, None, None
-			max_x, max_y, max_z = None, None, None
-			for p in positions:
-				x, y, z = p[0], p[1], p[2]
-				if min_x is None or min_x > x:
-					min_x = x
-				if min_y is None or min_y > y:
-					min_y = y
-				if min_z is None or min_z > z:
-					min_z = z
-				if max_x is None or max_x < x:
-					max_x = x
-				if max_y is None or max_y < y:
-					max_y = y
-				if max_z is None or max_z < z:
-					max_z = z
-
-			return ([min_x, min_y, min_z], [max_x, max_y, max_z])
-
-		min_ndx, max_ndx = None, None
-		for t in triangles:
-			for ndx in t:
-				if min_ndx is None or min_ndx > ndx:
-					min_ndx = ndx
-				if max_ndx is None or max_ndx < ndx:
-					max_ndx = ndx
-
+		(min_ndx,), (max_ndx,) = minmax_positions(triangles.reshape(-1, 1))
 		v_min, v_max = minmax_positions(points)
 
 		vertexes_accessor, vertexes_accessor_index = self.create_accessor()
@@ -232,7 +234,7 @@ class GltfWriter(object):
 		indexes_accessor, indexes_accessor_index = self.create_accessor()
 		indexes_accessor.bufferView = indexes_buffer_view_index
 		indexes_accessor.byteOffset = 0
-		indexes_accessor.componentType = pygltflib.UNSIGNED_SHORT
+		indexes_accessor.componentType = index_component_type
 		indexes_accessor.count = 3 * len(triangles)
 		indexes_accessor.type = pygltflib.SCALAR
 		indexes_accessor.min = [min_ndx]
@@ -258,40 +260,23 @@ class GltfWriter(object):
 		primitive.attributes.NORMAL = normals_accessor_index
 		primitive.attributes.TEXCOORD_0 = uvs_accessor_index
 		primitive.indices = indexes_accessor_index
+		if ig_mesh.get_material() < len(self.gltf.materials):
+			primitive.material = ig_mesh.get_material()
 
 		#
 
 		if skin is not None:
-			groups_count = 4
-			for vi in range(ig_mesh.vertexStart, ig_mesh.vertexStart + ig_mesh.vertexCount):
-				groups_count = max(len(skin[vi]), groups_count)
+			start, end = ig_mesh.vertexStart, ig_mesh.vertexStart + ig_mesh.vertexCount
+			groups_count = max(skin.get_width(start, end), 4)
+			joints_slots, weights_slots = skin.get_slots(start, end, (groups_count + 3) // 4 * 4)
 
 			for wi in range(0, groups_count, 4):
 				bufndx = wi//4
-				joints_buffer = []
-				weights_buffer = []
+				joints_buffer = joints_slots[:, wi:wi+4]
+				weights_buffer = weights_slots[:, wi:wi+4]
 
-				for vi in range(ig_mesh.vertexStart, ig_mesh.vertexStart + ig_mesh.vertexCount):
-					vertex = skin[vi]
-					joints = []
-					weights = []
-
-					for j in range(0, 4):
-						g = 0
-						w = 0
-						if wi + j < len(vertex):
-							g, w = vertex[wi + j]
-							if w == 0:
-								g = 0
-
-						joints += [g]
-						weights += [w]
-
-					joints_buffer += [joints]
-					weights_buffer += [weights]
-
-				joints_buffer_data = self.make_buffer_func(joints_buffer, lambda x: struct.pack("<4H", x[0], x[1], x[2], x[3]))
-				weights_buffer_data = self.make_buffer_func(weights_buffer, lambda x: struct.pack("<4f", x[0], x[1], x[2], x[3]))
+				joints_buffer_data = joints_buffer.astype("<u2").tobytes()
+				weights_buffer_data = weights_buffer.astype("<f4").tobytes()
 
 				joints_buffer_view, joints_buffer_view_index = self.create_buffer_view(joints_buffer_data, pygltflib.ARRAY_BUFFER)
 				weights_buffer_view, weights_buffer_view_index = self.create_buffer_view(weights_buffer_data, pygltflib.ARRAY_BUFFER)
@@ -455,43 +440,21 @@ class GltfWriter(object):
 				print(f"-- sm{subset_id:02}, {mi.packing_count}, {len(mi.subset_data_tables[i])}, {sorted(indexes) == list(range(len(indexes)))}, ranges: {joined_ranges(indexes)}")
 			print(f"shapekey '{sk_name}': {len(positions)}/{len(indexes)} vertexes into {orig_vertexes_count}, min={min(indexes)}, max={max(indexes)}")
 
-		positions_buffer = [(0,0,0) for i in range(orig_vertexes_count)]
-		for i, ndx in enumerate(indexes):
-			positions_buffer[ndx] = positions[i]
+		positions_buffer = np.zeros((orig_vertexes_count, 3), dtype=np.float64)
+		positions_buffer[indexes] = np.array(positions, dtype=np.float64).reshape(-1, 3)[:len(indexes)]
 
-		normals_buffer = [(0,0,0) for i in range(orig_vertexes_count)]
+		normals_buffer = np.zeros((orig_vertexes_count, 3), dtype=np.float64)
 		if len(normals) > 0:
-			for i, ndx in enumerate(indexes):
-				normals_buffer[ndx] = normals[i]
+			normals_buffer[indexes] = np.array(normals, dtype=np.float64).reshape(-1, 3)[:len(indexes)]
 
-		skpos_buffer_data = self.make_buffer_func(positions_buffer, lambda x: struct.pack("<3f", x[0], x[1], x[2]))
+		skpos_buffer_data = positions_buffer.astype("<f4").tobytes()
 		skpos_buffer_view, skpos_buffer_view_index = self.create_buffer_view(skpos_buffer_data, pygltflib.ARRAY_BUFFER)
 
 		sknorm_buffer_data, sknorm_buffer_view, sknorm_buffer_view_index = None, None, None
 		if len(normals) > 0:
-			sknorm_buffer_data = self.make_buffer_func(normals_buffer, lambda x: struct.pack("<3f", x[0], x[1], x[2]))
+			sknorm_buffer_data = normals_buffer.astype("<f4").tobytes()
 			sknorm_buffer_view, sknorm_buffer_view_index = self.create_buffer_view(sknorm_buffer_data, pygltflib.ARRAY_BUFFER)
 
-		def minmax_positions(positions):
-			min_x, min_y, min_z = None, None, None
-			max_x, max_y, max_z = None, None, None
-			for p in positions:
-				x, y, z = p[0], p[1], p[2]
-				if min_x is None or min_x > x:
-					min_x = x
-				if min_y is None or min_y > y:
-					min_y = y
-				if min_z is None or min_z > z:
-					min_z = z
-				if max_x is None or max_x < x:
-					max_x = x
-				if max_y is None or max_y < y:
-					max_y = y
-				if max_z is None or max_z < z:
-					max_z = z
-
-			return ([min_x, min_y, min_z], [max_x, max_y, max_z])
-
 		v_min, v_max = minmax_positions(positions_buffer)
 
 		skpos_accessor, skpos_accessor_index = self.create_accessor()
@@ -527,20 +490,6 @@ class GltfWriter(object):
 
 	#	
 
-	def make_buffer(self, values, struct_format):
-		of = io.BytesIO(bytes())
-		for v in values:
-			of.write(struct.pack(struct_format, v))
-		of.seek(0)
-		return of.read()
-
-	def make_buffer_func(self, values, func):
-		of = io.BytesIO(bytes())
-		for v in values:
-			of.write(func(v))
-		of.seek(0)
-		return of.read()
-
 	def create_mesh(self):
 		gltf_mesh = pygltflib.Mesh()
 		gltf_mesh_index = self.current_mesh_index
@@ -562,6 +511,9 @@ class GltfWriter(object):
 		return (gltf_node, gltf_node_index)
 
 	def create_buffer_view(self, data, buffer_view_target):
+		if self.glb:
+			return self.create_buffer_view2(data, buffer_view_target)
+
 		buffer = pygltflib.Buffer()
 		buffer_index = self.current_buffer_index
 		self.current_buffer_index += 1
@@ -580,12 +532,11 @@ class GltfWriter(object):
 		if buffer_view_target is not None:
 			buffer_view.target = buffer_view_target
 
-		# self.binary_blob += data
 		buffer.uri = "data:application/octet-stream;base64," + base64.b64encode(data).decode("ascii")
 
 		return (buffer_view, buffer_view_index)
 
-	def create_buffer_view2(self, data, buffer_view_target):
+	def create_buffer_view2(self, data, buffer_view_target): # appends to the single buffer, saved as GLB's BIN chunk
 		if self.current_buffer_index == 0:
 			buffer = pygltflib.Buffer()
 			buffer.byteLength = 0
@@ -601,15 +552,16 @@ class GltfWriter(object):
 		self.current_buffer_view_index += 1
 		self.gltf.bufferViews.append(buffer_view)
 
-		offset = buffer.byteLength
-		buffer.byteLength += len(data)
+		offset = len(self.binary_blob)
+		self.binary_blob += data
+		self.binary_blob += b"\0" * (-len(data) % GLB_ALIGNMENT) # so next view (and BIN chunk end) is aligned
+		buffer.byteLength = len(self.binary_blob)
 
 		buffer_view.buffer = buffer_index
 		buffer_view.byteOffset = offset
 		buffer_view.byteLength = len(data)
-		buffer_view.target = buffer_view_target
-
-		self.binary_blob += data
+		if buffer_view_target is not None:
+			buffer_view.target = buffer_view_target
 
 		return (buffer_view, buffer_view_index)
 
@@ -623,115 +575,8 @@ class GltfWriter(object):
 
 	#
 
-	def get_skin(self):
-		skin_section = self.model.dat1.get_section(SECTION_SKIN_DATA)
-		skin_batch_section = self.model.dat1.get_section(SECTION_SKIN_BATCH)
-
-		has_skin = (skin_section is not None and skin_batch_section is not None)
-		skin = None
-		rcra_skin = None
-
-		if has_skin:
-			skin = []
-
-			has_to_be_len = 0
-			for i, l in enumerate(skin_batch_section.batches):
-				offset = l.offset
-				count = l.vertex_count
-
-				for j in range(0, count, 16):
-					groups = skin_section._raw[offset] + 1
-					offset += 1
-
-					for z in range(16):
-						if j + z >= count:
-							break
-
-						vertex = []
-
-						if groups == 1:
-							bone = skin_section._raw[offset]
-							offset += 1
-							vertex += [(bone, 1.0)]
-						else:
-							for k in range(groups):
-								bone, weight = struct.unpack("<BB", skin_section._raw[offset:offset+2])
-								offset += 2
-								vertex += [(bone, weight/256.0)]
-
-						skin += [vertex]
-
-			def fix_weights(v):
-				mp = {}
-				order = []
-				for b, w in v:
-					mp[b] = mp.get(b, 0) + w
-					if b not in order:
-						order += [b]
-				return [(b, mp[b]) for b in order]
-
-			skin = [fix_weights(v) for v in skin]
-
-		#
-
-		rcra_skin_section = self.model.dat1.get_section(SECTION_RCRA_SKIN)
-		if rcra_skin_section is not None:
-			rcra_skin = []
-			for v in rcra_skin_section.entries:
-				b1, b2, b3, b4, w1, w2, w3, w4 = v
-				
-				temp = {}
-				temp[b1] = w1
-				temp[b2] = temp.get(b2, 0) + w2
-				temp[b3] = temp.get(b3, 0) + w3
-				temp[b4] = temp.get(b4, 0) + w4
-
-				sm = w1 + w2 + w3 + w4
-				if sm > 0 and sm != 1:
-					for k in temp:
-						temp[k] = temp[k] / sm
-
-				weights = [(k, temp[k]) for k in temp]
-				weights = sorted(weights, key=lambda x: -x[1])
-				weights = [w for w in weights if w[1] > 0]
-
-				rcra_skin += [weights]
-
-			if has_skin:
-				def diff_skins(skin, rcra_skin):
-					def same_weights(v1, v2):
-						if len(v1) != len(v2):
-							return False
-
-						for a, b in zip(v1, v2):
-							b1, w1 = a
-							b2, w2 = b
-							if b1 != b2 or abs(w1 - w2) >= 0.01:
-								return False
-
-						return True
-
-					print(len(skin), len(rcra_skin))
-					same = True
-					for v1, v2 in zip(skin, rcra_skin):
-						if not same_weights(v1, v2):
-							print(v1, v2)
-							same = False
-							# break
-					if same:
-						print("same skin")
-
-				# diff_skins(skin, rcra_skin)
-
-			# skin = rcra_skin
-			# has_skin = True
-
-		#
-
-		return skin, rcra_skin
-
 	def get_weights(self, i, skin, weights_count):
-		vertex = skin[i]
+		vertex = skin.get_vertex(i)
 		fmt = pretty_format
 
 		groups = ""
@@ -777,6 +622,24 @@ class GltfWriter(object):
 
 	#
 
+	def get_materials(self): # => [(material aid or None, file, name)] for every material slot
+		if self.materials_section is None:
+			return []
+
+		result = []
+		for i, q in enumerate(self.materials_section.string_offsets):
+			matfile = self.model.dat1.get_string(q[0])
+			matname = self.model.dat1.get_string(q[1])
+
+			mat_aid = None
+			if self.materials_section.version != dat1lib.VERSION_SO:
+				mat_aid = self.materials_section.triples[i][0]
+			elif matfile is not None:
+				mat_aid = crc32.hash(matfile)
+
+			result += [(mat_aid, matfile, matname)]
+		return result
+
 	def get_material_path(self, mat_index):
 		matpath = self.model.dat1.get_string(self.materials_section.string_offsets[mat_index][0])
 		if matpath is None:
@@ -794,9 +657,14 @@ import dat1lib.types.model
 ###
 
 def main(argv):
+	glb = ("--glb" in argv)
+	argv = [a for a in argv if a != "--glb"]
+
 	if len(argv) < 2:
 		print("Usage:")
-		print("$ {} <.model filename> [output .gltf filename]".format(argv[0]))
+		print("$ {} <.model filename> [output .gltf filename] [--glb]".format(argv[0]))
+		print("")
+		print("  --glb  write binary .glb (single buffer in BIN chunk) instead of .gltf with base64 buffers")
 		return
 
 	#
@@ -823,14 +691,14 @@ def main(argv):
 
 	#
 
-	output_fn = fn + ".gltf"
+	output_fn = fn + (".glb" if glb else ".gltf")
 	if len(argv) > 2:
 		output_fn = argv[2]
 
 	looks = [0]
 	looks = None # all looks
 	lod = 0
-	helper = GltfWriter()
+	helper = GltfWriter(glb)
 	helper.write_model(output_fn, model, looks, lod)
 
 if __name__ == "__main__":
@@ -0,0 +1,348 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import dat1lib
+import dat1lib.extraction
+import dat1lib.types.model
+import dat1lib.types.toc
+import dat1lib.types.toc2
+import concurrent.futures
+import io
+import json
+import multiprocessing
+import os
+import os.path
+import struct
+import sys
+import time
+import traceback
+
+from extract_assets import load_hashes, select_entries
+from model_to_gltf import GltfWriter
+
+CHUNK_SIZE = 16 # models per task; task's models are neighbours in the same archive
+MODEL_TYPES = (dat1lib.types.model.Model, dat1lib.types.model.Model2, dat1lib.types.model.ModelRcra)
+MODEL_MAGICS = set([t.MAGIC for t in MODEL_TYPES])
+
+###
+
+def _make_result(key, output_fn, error=None, skipped=False, seconds=0, materials=None):
+	return {"key": key, "output": output_fn, "error": error, "skipped": skipped, "seconds": seconds, "materials": materials if materials is not None else []}
+
+def _convert(key, data, output_fn, glb): # => result
+	start = time.time()
+	try:
+		model = dat1lib.read(io.BytesIO(data), try_unknown=False)
+		if not isinstance(model, MODEL_TYPES):
+			return _make_result(key, output_fn, skipped=True) # path is unknown, and it's not a model
+
+		os.makedirs(os.path.dirname(output_fn), exist_ok=True)
+		tmp_fn = output_fn + ".part" # so interrupted writes aren't mistaken for converted files
+		writer = GltfWriter(glb)
+		writer.write_model(tmp_fn, model, None, 0)
+		os.replace(tmp_fn, output_fn)
+
+		materials = [(mat_aid, matfile) for mat_aid, matfile, _ in writer.get_materials()]
+		return _make_result(key, output_fn, seconds=round(time.time() - start, 3), materials=materials)
+	except Exception as e:
+		return _make_result(key, output_fn, error="{}".format(e), seconds=round(time.time() - start, 3))
+
+def _convert_archive_chunk(rcra, archive_fn, tasks, glb): # runs in a worker process; tasks are [(AssetEntry, key, output_fn)] sorted by offset => [result]
+	toc_module = dat1lib.types.toc2 if rcra else dat1lib.types.toc
+	keys = {entry.index: (key, output_fn) for entry, key, output_fn in tasks}
+
+	results = []
+	try:
+		for entry, data in dat1lib.extraction.read_archive(toc_module, archive_fn, [entry for entry, _, _ in tasks]):
+			key, output_fn = keys[entry.index]
+			results += [_convert(key, data, output_fn, glb)]
+	except Exception as e:
+		results += [_make_result(key, output_fn, error="{}".format(e)) for _, key, output_fn in tasks[len(results):]]
+
+	return results
+
+def _convert_files_chunk(tasks, glb): # runs in a worker process; tasks are [(key, filename, output_fn)] => [result]
+	results = []
+	for key, fn, output_fn in tasks:
+		try:
+			with open(fn, "rb") as f:
+				data = f.read()
+		except Exception as e:
+			results += [_make_result(key, output_fn, error="{}".format(e))]
+			continue
+
+		results += [_convert(key, data, output_fn, glb)]
+
+	return results
+
+###
+
+def _get_magic(data):
+	if len(data) < 4:
+		return None
+	return struct.unpack("<I", data[:4])[0]
+
+def _get_unknown_models(toc, entries): # entries are [(span index, AssetEntry)] sorted by (archive, offset) => set of entries' indexes which are models
+	rcra = isinstance(toc, dat1lib.types.toc2.TOC2)
+	toc_module = dat1lib.types.toc2 if rcra else dat1lib.types.toc
+
+	result = set()
+	to_sniff = {}
+	for _, entry in entries:
+		header = getattr(entry, "header", None)
+		if header is not None: # RCRA toc has assets' headers, which start with magic
+			if _get_magic(header) in MODEL_MAGICS:
+				result.add(entry.index)
+			continue
+
+		if entry.archive not in to_sniff:
+			to_sniff[entry.archive] = []
+		to_sniff[entry.archive] += [entry]
+
+	for archive_index in to_sniff:
+		try:
+			archive_fn = toc.get_archive_path(archive_index)
+			for entry, data in dat1lib.extraction.read_archive(toc_module, archive_fn, to_sniff[archive_index], limit=4):
+				if _get_magic(data) in MODEL_MAGICS:
+					result.add(entry.index)
+		except:
+			print(traceback.format_exc())
+
+	return result
+
+def get_archived_tasks(toc, entries, output_dir, paths, glb): # => [(worker function, args, models count)]
+	rcra = isinstance(toc, dat1lib.types.toc2.TOC2)
+	ext = ".glb" if glb else ".gltf"
+
+	# sorting by (archive, offset) makes every worker read its archive sequentially
+	entries = sorted(entries, key=lambda e: (e[1].archive, e[1].offset))
+
+	# assets with unknown paths are only scheduled if their magic says they're models
+	unknown_models = _get_unknown_models(toc, [(span_index, entry) for span_index, entry in entries if entry.asset_id not in paths])
+
+	by_archive = {}
+	for span_index, entry in entries:
+		path = paths.get(entry.asset_id)
+		if path is not None and not path.endswith(".model"):
+			continue
+
+		if path is None:
+			if entry.index not in unknown_models:
+				continue
+			path = "{:016X}".format(entry.asset_id)
+
+		key = "{}/{}".format(span_index, path)
+		if entry.archive not in by_archive:
+			by_archive[entry.archive] = []
+		by_archive[entry.archive] += [(entry, key, os.path.join(output_dir, key + ext))]
+
+	tasks = []
+	for archive_index in by_archive:
+		archive_fn = toc.get_archive_path(archive_index)
+		archive_tasks = by_archive[archive_index]
+		for i in range(0, len(archive_tasks), CHUNK_SIZE):
+			chunk = archive_tasks[i:i+CHUNK_SIZE]
+			tasks += [(_convert_archive_chunk, (rcra, archive_fn, chunk, glb), len(chunk))]
+
+	return tasks
+
+def get_staged_tasks(stage_dir, path_prefix, output_dir, glb): # => [(worker function, args, models count)]
+	ext = ".glb" if glb else ".gltf"
+
+	if path_prefix is not None:
+		path_prefix = path_prefix.lower().replace('\\', '/').strip().strip("/")
+
+	files = []
+	for root, _, fns in os.walk(stage_dir):
+		for fn in fns:
+			if not fn.lower().endswith(".model"):
+				continue
+
+			full_fn = os.path.join(root, fn)
+			key = os.path.relpath(full_fn, stage_dir).replace('\\', '/')
+			if path_prefix is not None and not key.lower().startswith(path_prefix + "/"):
+				continue
+
+			files += [(key, full_fn, os.path.join(output_dir, key + ext))]
+
+	files = sorted(files)
+	return [(_convert_files_chunk, (files[i:i+CHUNK_SIZE], glb), len(files[i:i+CHUNK_SIZE])) for i in range(0, len(files), CHUNK_SIZE)]
+
+def convert_models(tasks, jobs=None): # => yields results as tasks get done
+	total = sum([count for _, _, count in tasks])
+	done, failed = 0, 0
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+		futures = {}
+		for fn, args, count in tasks:
+			futures[pool.submit(fn, *args)] = count
+
+		for future in concurrent.futures.as_completed(futures):
+			done += futures[future]
+			try:
+				for result in future.result():
+					if result["error"] is not None:
+						failed += 1
+					yield result
+			except:
+				failed += futures[future]
+				print("")
+				print(traceback.format_exc())
+
+			print("\r{}/{} models done, {} failed".format(done, total, failed), end="")
+
+	print("")
+
+def make_manifest(results, paths, glb, seconds):
+	manifest = {"glb": glb, "seconds": round(seconds, 3), "models": {}, "failed": {}, "materials": {}}
+
+	for r in sorted(results, key=lambda r: r["key"]):
+		if r["skipped"]:
+			continue
+
+		if r["error"] is not None:
+			manifest["failed"][r["key"]] = r["error"]
+			continue
+
+		manifest["models"][r["key"]] = {"output": r["output"], "seconds": r["seconds"], "materials": []}
+
+		for mat_aid, matfile in r["materials"]:
+			if mat_aid is None:
+				continue
+
+			# models share materials, so every material is resolved once
+			aid = "{:016X}".format(mat_aid)
+			if aid not in manifest["materials"]:
+				manifest["materials"][aid] = {"path": matfile if matfile is not None else paths.get(mat_aid), "models": 0}
+			manifest["materials"][aid]["models"] += 1
+			manifest["models"][r["key"]]["materials"] += [aid]
+
+	return manifest
+
+###
+
+def print_usage(argv):
+	print("Usage:")
+	print("$ {} <asset_archive path> (--all | --span N | --path-prefix P) [--glb] [--jobs N] [-o DIR]".format(argv[0]))
+	print("$ {} --stage DIR [--path-prefix P] [--glb] [--jobs N] [-o DIR]".format(argv[0]))
+	print("")
+	print("Convert many models to glTF at once, in parallel, and write DIR/manifest.json")
+	print("with converted models (and time it took), failures and materials used.")
+	print("")
+	print("  --all            all models in toc")
+	print("  --span N         only models from span N")
+	print("  --path-prefix P  only models with paths (from hashes.txt, or relative to stage DIR) starting with P")
+	print("  --stage DIR      convert .model files from DIR (e.g. a stage) instead of toc")
+	print("  --glb            write binary .glb instead of .gltf")
+	print("  --jobs N         number of worker processes (all cores by default)")
+	print("  -o DIR           output directory ('gltf' by default)")
+	print("")
+	print("Models are written into DIR/<span>/<path>.gltf (or DIR/<path in stage>.gltf).")
+
+def main(argv):
+	if len(argv) < 2:
+		print_usage(argv)
+		return
+
+	#
+
+	asset_archive_path = None
+	i = 1
+	if not argv[1].startswith("-"):
+		asset_archive_path = argv[1]
+		i = 2
+
+	options = {}
+	flags = {"--all": False, "--glb": False, "--span": True, "--path-prefix": True, "--stage": True, "--jobs": True, "-o": True}
+	while i < len(argv):
+		k = argv[i]
+		if k not in flags or (flags[k] and i+1 >= len(argv)):
+			print("[!] Bad argument '{}'".format(k))
+			print("")
+			print_usage(argv)
+			return
+
+		if flags[k]:
+			options[k] = argv[i+1]
+			i += 2
+		else:
+			options[k] = True
+			i += 1
+
+	if (asset_archive_path is None) == ("--stage" not in options):
+		print("[!] Specify either <asset_archive path> or --stage DIR")
+		print("")
+		print_usage(argv)
+		return
+
+	span, jobs = None, None
+	try:
+		if "--span" in options:
+			span = int(options["--span"])
+		if "--jobs" in options:
+			jobs = max(1, int(options["--jobs"]))
+	except Exception as e:
+		print("[!] Bad arguments")
+		print(e)
+		return
+
+	glb = options.get("--glb", False)
+	output_dir = options.get("-o", "gltf")
+	paths = load_hashes()
+
+	#
+
+	if asset_archive_path is not None:
+		filters = ["--all", "--span", "--path-prefix"]
+		if not any([k in options for k in filters]):
+			print("[!] No models selected: specify one of {}".format(", ".join(filters)))
+			return
+
+		toc_fn = os.path.join(asset_archive_path, "toc")
+		toc = None
+		try:
+			with open(toc_fn, "rb") as f:
+				toc = dat1lib.read(f)
+		except Exception as e:
+			print("[!] Couldn't open '{}'".format(toc_fn))
+			print(e)
+			return
+
+		if toc is None:
+			print("[!] Couldn't comprehend '{}'".format(toc_fn))
+			return
+
+		if not isinstance(toc, (dat1lib.types.toc.TOC, dat1lib.types.toc2.TOC2)):
+			print("[!] Not a toc")
+			return
+
+		toc.set_archives_dir(asset_archive_path)
+
+		entries = select_entries(toc, span, None, options.get("--path-prefix"), paths)
+		tasks = get_archived_tasks(toc, entries, output_dir, paths, glb)
+	else:
+		tasks = get_staged_tasks(options["--stage"], options.get("--path-prefix"), output_dir, glb)
+
+	#
+
+	print("{} models to convert".format(sum([count for _, _, count in tasks])))
+	if len(tasks) == 0:
+		return
+
+	start = time.time()
+	results = list(convert_models(tasks, jobs))
+	manifest = make_manifest(results, paths, glb, time.time() - start)
+
+	os.makedirs(output_dir, exist_ok=True)
+	manifest_fn = os.path.join(output_dir, "manifest.json")
+	with open(manifest_fn, "w") as f:
+		json.dump(manifest, f, indent=4)
+
+	print("{} converted, {} failed, {} materials; manifest written to '{}'".format(len(manifest["models"]), len(manifest["failed"]), len(manifest["materials"]), manifest_fn))
+	for key in manifest["failed"]:
+		print("[!] {}: {}".format(key, manifest["failed"][key]))
+
+if __name__ == "__main__":
+	main(sys.argv)
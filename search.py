@@ -0,0 +1,149 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import dat1lib
+import dat1lib.search
+import dat1lib.types.toc
+import dat1lib.types.toc2
+import concurrent.futures
+import multiprocessing
+import os
+import os.path
+import sys
+import traceback
+
+from extract_assets import load_hashes, select_entries
+
+CHUNK_SIZE = 256 # assets per task
+
+def format_match(aid, path, tag, offset, where):
+	return "{:016X}\t{}\t{}\t{}\t{}".format(
+		aid,
+		path if path is not None else "",
+		"{:08X}".format(tag) if tag is not None else "-",
+		offset if offset is not None else "-",
+		where if where is not None else ""
+	)
+
+def search_entries(toc, entries, query, jobs=None): # => yields (aid, tag, offset, where) as chunks get done
+	rcra = isinstance(toc, dat1lib.types.toc2.TOC2)
+
+	# every asset is searched once, even if it's present in several spans
+	by_archive = {}
+	seen = set()
+	for _, entry in entries:
+		if entry.asset_id in seen:
+			continue
+		seen.add(entry.asset_id)
+
+		if entry.archive not in by_archive:
+			by_archive[entry.archive] = []
+		by_archive[entry.archive] += [entry]
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+		futures = []
+		for archive_index in by_archive:
+			archive_fn = toc.get_archive_path(archive_index)
+			archive_entries = sorted(by_archive[archive_index], key=lambda e: e.offset)
+			for i in range(0, len(archive_entries), CHUNK_SIZE):
+				futures += [pool.submit(dat1lib.search.search_archive_chunk, rcra, archive_fn, archive_entries[i:i+CHUNK_SIZE], query)]
+
+		for future in concurrent.futures.as_completed(futures):
+			try:
+				for match in future.result():
+					yield match
+			except:
+				print(traceback.format_exc(), file=sys.stderr)
+
+def print_usage(argv):
+	print("Usage:")
+	print("$ {} <asset_archive path> (--bytes HEX | --string TEXT | --config TEXT) [--span N] [--path-prefix P] [--jobs N]".format(argv[0]))
+	print("")
+	print("Search all (or filtered) assets in parallel and print matches as they're found:")
+	print("<asset id> <path> <section tag> <offset> <matched string or config value>")
+	print("")
+	print("  --bytes HEX      byte pattern anywhere in asset (e.g. a hash: --bytes \"10 32 54 76\")")
+	print("  --string TEXT    strings block strings containing TEXT")
+	print("  --config TEXT    serialized config keys and values containing TEXT")
+	print("  --span N         only assets from span N")
+	print("  --path-prefix P  only assets with paths (from hashes.txt) starting with P")
+	print("  --jobs N         number of worker processes (all cores by default)")
+
+def main(argv):
+	if len(argv) < 2:
+		print_usage(argv)
+		return
+
+	#
+
+	asset_archive_path = argv[1]
+	options = {}
+	i = 2
+	while i < len(argv):
+		k = argv[i]
+		if k not in ["--bytes", "--string", "--config", "--span", "--path-prefix", "--jobs"] or i+1 >= len(argv):
+			print("[!] Bad argument '{}'".format(k))
+			print("")
+			print_usage(argv)
+			return
+		options[k] = argv[i+1]
+		i += 2
+
+	query, span, jobs = None, None, None
+	try:
+		for mode in dat1lib.search.MODES:
+			if "--" + mode in options:
+				query = dat1lib.search.Query(mode, options["--" + mode], dat1lib.VERSION_OVERRIDE)
+		if "--span" in options:
+			span = int(options["--span"])
+		if "--jobs" in options:
+			jobs = max(1, int(options["--jobs"]))
+	except Exception as e:
+		print("[!] Bad arguments")
+		print(e)
+		return
+
+	if query is None:
+		print("[!] Nothing to search: specify one of --bytes, --string or --config")
+		return
+
+	#
+
+	toc_fn = os.path.join(asset_archive_path, "toc")
+	toc = None
+	try:
+		with open(toc_fn, "rb") as f:
+			toc = dat1lib.read(f)
+	except Exception as e:
+		print("[!] Couldn't open '{}'".format(toc_fn))
+		print(e)
+		return
+
+	#
+
+	if toc is None:
+		print("[!] Couldn't comprehend '{}'".format(toc_fn))
+		return
+
+	if not isinstance(toc, (dat1lib.types.toc.TOC, dat1lib.types.toc2.TOC2)):
+		print("[!] Not a toc")
+		return
+
+	toc.set_archives_dir(asset_archive_path)
+
+	#
+
+	paths = load_hashes()
+	entries = select_entries(toc, span, None, options.get("--path-prefix"), paths)
+
+	count = 0
+	for aid, tag, offset, where in search_entries(toc, entries, query, jobs):
+		print(format_match(aid, paths.get(aid), tag, offset, where), flush=True)
+		count += 1
+
+	print("{} matches".format(count), file=sys.stderr)
+
+if __name__ == "__main__":
+	main(sys.argv)
@@ -6,6 +6,9 @@
 from flask import request, Response
 import json
 import traceback
+import zlib
+
+GZIP_LEVEL = 1 # responses are generated on the fly, so fast compression is preferred over smaller one
 
 def _errmsg(e):
 	msg = ""
@@ -43,6 +46,23 @@ def json_api(f, successful_response_is_json=True):
 	json_response = json.dumps(ret)
 	return Response(json_response, 200, {'Content-Type': 'application/json'})
 
+def _gzip_chunks(chunks):
+	compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # gzip container
+	for chunk in chunks:
+		data = compressor.compress(chunk)
+		if len(data) > 0:
+			yield data
+	yield compressor.flush()
+
+def streamed_response(chunks, mimetype): # chunks are sent as they're generated, gzipped if client accepts that
+	headers = {}
+	if "gzip" in request.accept_encodings:
+		chunks = _gzip_chunks(chunks)
+		headers["Content-Encoding"] = "gzip"
+		headers["Vary"] = "Accept-Encoding"
+
+	return Response(chunks, 200, headers, mimetype=mimetype)
+
 def make_get_route(app, route, f):
 	decorated = lambda *args, **kwargs: f()
 	decorated.__name__ = '_flask_handler_'+route.replace("/", "_")
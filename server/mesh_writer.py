@@ -0,0 +1,146 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import dat1lib.types.sections.model.skin
+import json
+import numpy as np
+import server.mtl_writer
+import struct
+
+from server.obj_writer import SECTION_INDEXES, SECTION_VERTEXES, SECTION_LOOK, SECTION_MESHES, SECTION_MATERIALS
+
+MAGIC = b"MESH"
+VERSION = 2
+ALIGNMENT = 4 # so every buffer can be viewed as typed array in place
+SKIN_WIDTH = 4 # joints per vertex, as viewer's skinning supports
+
+# binary mesh for models viewer:
+#
+#   "MESH", version: u32, header size: u32, header (JSON, padded with spaces), buffers
+#
+# header has "buffers": {name: [offset from buffers start, elements count, type]} and
+# "submeshes": [{name, mesh, material, start, count}] (ranges of "indexes" buffer);
+# only vertexes of meshes in selected looks and LOD are included, indexes point into these
+#
+# buffers: "positions" (float32 xyz), "normals" (float32 xyz), "uvs" (float32 uv, same as in .obj),
+# "indexes" (uint16 if vertexes fit, uint32 otherwise) and, if skin was asked for and model has one,
+# "joints" (uint16 x4) and "weights" (float32 x4, 4 largest weights renormalized);
+# meshes flagged with 0x100 take weights from RCRA skin at their first_weight_index, others from vertexStart
+
+def _top_slots(joints, weights, width): # => (joints, weights) with `width` largest weights per vertex, summing to 1
+	order = np.argsort(-weights, axis=1, kind="stable")[:, :width]
+	joints = np.take_along_axis(joints, order, axis=1)
+	weights = np.take_along_axis(weights, order, axis=1)
+
+	if weights.shape[1] < width:
+		pad = ((0, 0), (0, width - weights.shape[1]))
+		joints, weights = np.pad(joints, pad), np.pad(weights, pad)
+
+	totals = weights.sum(axis=1, keepdims=True)
+	weights = np.divide(weights, totals, out=np.zeros_like(weights), where=(totals > 0))
+	joints[weights == 0] = 0
+	return (joints, weights)
+
+def write(model, looks, lod, with_skin): # => bytes
+	uv_scale = 1.0/16384.0 # same as .obj has
+
+	s = model.dat1.get_section(SECTION_MESHES)
+	meshes = s.meshes
+
+	s = model.dat1.get_section(SECTION_VERTEXES)
+	positions, normals, uvs = s.get_arrays()
+
+	s = model.dat1.get_section(SECTION_INDEXES)
+	indexes = s.get_indexes()
+
+	so_uvs = model.dat1.get_section(0x16F3BA18) # SO UVs
+
+	materials_section = model.dat1.get_section(SECTION_MATERIALS)
+
+	looks_section = model.dat1.get_section(SECTION_LOOK)
+
+	skin, rcra_skin = None, None
+	if with_skin:
+		skin, rcra_skin = dat1lib.types.sections.model.skin.get_model_skin(model.dat1)
+
+	#
+
+	meshes_to_display = set()
+	for look in looks:
+		look_lod = looks_section.looks[look].lods[lod]
+		meshes_to_display |= set(range(look_lod.start, look_lod.start + look_lod.count))
+
+	submeshes = []
+	vertexes, triangles, weights_ranges = [], [], []
+	vertexes_count, indexes_count = 0, 0
+	for i, mesh in enumerate(meshes):
+		if i not in meshes_to_display:
+			continue
+
+		matname = server.mtl_writer.get_material_name(mesh.get_material(), model.dat1, materials_section)
+
+		start, end = mesh.vertexStart, mesh.vertexStart + mesh.vertexCount
+		faces_count = mesh.indexCount // 3
+		mesh_indexes = indexes[mesh.indexStart:mesh.indexStart + faces_count*3].astype(np.int64)
+		if (mesh.get_flags() & 0x10) == 0:
+			mesh_indexes -= mesh.vertexStart # make relative
+
+		submeshes += [{"name": "{:02}_mesh{:02}_{}".format(len(submeshes), i, matname), "mesh": i, "material": matname, "start": indexes_count, "count": len(mesh_indexes)}]
+		vertexes += [(start, end)]
+
+		skin_to_use, weight_offset = skin, mesh.vertexStart # same as model_to_ascii does
+		if (mesh.get_flags() & 0x100) > 0:
+			skin_to_use, weight_offset = rcra_skin, mesh.first_weight_index
+		weights_ranges += [(skin_to_use, weight_offset, weight_offset + mesh.vertexCount)]
+
+		triangles += [mesh_indexes + vertexes_count]
+		vertexes_count += end - start
+		indexes_count += len(mesh_indexes)
+
+	def gather(arr, width):
+		if len(vertexes) == 0:
+			return np.zeros((0, width))
+		return np.concatenate([arr[start:end] for start, end in vertexes])
+
+	mesh_uvs = gather(uvs, 2).astype(np.float64)
+	if so_uvs is not None:
+		mesh_uvs = np.array([so_uvs.get_uv(vi) for start, end in vertexes for vi in range(start, end)], dtype=np.float64).reshape(-1, 2)
+	mesh_uvs = np.column_stack([mesh_uvs[:, 0] * uv_scale, 1.0 - mesh_uvs[:, 1] * uv_scale])
+
+	index_type, index_dtype = ("uint16", "<u2") if vertexes_count <= 0x10000 else ("uint32", "<u4")
+	all_indexes = np.concatenate(triangles) if len(triangles) > 0 else np.zeros(0, dtype=np.int64)
+
+	buffers = [
+		("positions", gather(positions, 3).astype("<f4"), "float32"),
+		("normals", gather(normals, 3).astype("<f4"), "float32"),
+		("uvs", mesh_uvs.astype("<f4"), "float32"),
+		("indexes", all_indexes.astype(index_dtype), index_type)
+	]
+
+	if any([skin_to_use is not None for skin_to_use, _, _ in weights_ranges]):
+		slots = []
+		for skin_to_use, start, end in weights_ranges:
+			if skin_to_use is None: # mesh has no weights of its own kind, so it stays unskinned
+				slots += [(np.zeros((end - start, SKIN_WIDTH), dtype=np.uint16), np.zeros((end - start, SKIN_WIDTH)))]
+				continue
+			width = max(skin_to_use.get_width(start, end), SKIN_WIDTH)
+			slots += [_top_slots(*skin_to_use.get_slots(start, end, width), SKIN_WIDTH)]
+		joints = np.concatenate([j for j, _ in slots]) if len(slots) > 0 else np.zeros((0, SKIN_WIDTH))
+		weights = np.concatenate([w for _, w in slots]) if len(slots) > 0 else np.zeros((0, SKIN_WIDTH))
+		buffers += [("joints", joints.astype("<u2"), "uint16"), ("weights", weights.astype("<f4"), "float32")]
+
+	#
+
+	header = {"vertexes": vertexes_count, "buffers": {}, "submeshes": submeshes}
+	blob = bytearray()
+	for name, arr, type_name in buffers:
+		header["buffers"][name] = [len(blob), arr.size, type_name]
+		blob += arr.tobytes()
+		blob += b"\0" * (-len(blob) % ALIGNMENT)
+
+	header_data = json.dumps(header, separators=(',', ':')).encode("utf-8")
+	header_data += b" " * (-(12 + len(header_data)) % ALIGNMENT)
+
+	return struct.pack("<4sII", MAGIC, VERSION, len(header_data)) + header_data + bytes(blob)
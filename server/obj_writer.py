@@ -10,7 +10,7 @@ import dat1lib.types.sections.model.look
 import dat1lib.types.sections.model.meshes
 import dat1lib.types.sections.model.unknowns
 import dat1lib.utils as utils
-import io
+import numpy as np
 import server.mtl_writer
 
 SECTION_INDEXES   = dat1lib.types.sections.model.geo.IndexesSection.TAG
@@ -20,67 +20,46 @@ SECTION_MESHES    = dat1lib.types.sections.model.meshes.MeshesSection.TAG
 SECTION_BUILT     = dat1lib.types.sections.model.unknowns.ModelBuiltSection.TAG
 SECTION_MATERIALS = dat1lib.types.sections.model.unknowns.ModelMaterialSection.TAG
 
+CHUNK_SIZE = 0x4000 # vertexes or faces formatted at once, so text of the whole model is never kept in memory
+
+def _format_rows(fmt, rows): # (N, K) array => yields bytes, `fmt` with K fields per row
+	for i in range(0, len(rows), CHUNK_SIZE):
+		chunk = rows[i:i+CHUNK_SIZE]
+		yield ((fmt * len(chunk)) % tuple(chunk.ravel().tolist())).encode('ascii') # single % over a chunk formats it in C
+
 class ObjHelper(object):
 	def __init__(self):
 		self.cur_vertex_offset = 1
 		self.current_material = None
-		self.mesh_vertexes = 0
-		self.remembered_vertexes = []
-
 		self.meshes_count = 0
-
-		self.f = io.BytesIO(bytes())
 		self.uv_scale = 1.0/16384.0
 
 	#
 
-	def write(self, s):
-		self.f.write(s.encode('ascii'))
-
 	def start_mesh(self, mesh_name):
-		self.mesh_vertexes = 0
-		self.write("o {:02}_{}\n".format(self.meshes_count, mesh_name))
 		self.meshes_count += 1
+		return "o {:02}_{}\n".format(self.meshes_count - 1, mesh_name).encode('ascii')
 
-	def end_mesh(self):
-		self.cur_vertex_offset += self.mesh_vertexes
+	def end_mesh(self, vertexes_count):
+		self.cur_vertex_offset += vertexes_count
 
-	def write_vertex(self, v, uv):
-		def transform(x, y, z):
-			return (x, y, z)
-
-		x, y, z = v.x, v.y, v.z
-		x, y, z = transform(x, y, z)
-		self.write("v {} {} {}\n".format(x, y, z))
-		self.mesh_vertexes += 1
-
-		uu, vv = v.u * self.uv_scale, 1.0 - v.v * self.uv_scale
-		if uv is not None:
-			uu, vv = uv
-			uu = uu * self.uv_scale
-			vv = 1.0 - vv * self.uv_scale
-
-		self.write("vt {} {}\n".format(uu, vv))
+	def write_vertexes(self, positions, uvs): # uvs are unscaled
+		uu = uvs[:, 0] * self.uv_scale
+		vv = 1.0 - uvs[:, 1] * self.uv_scale
+		return _format_rows("v %r %r %r\nvt %r %r\n", np.column_stack([positions, uu, vv]))
 
 	def usemtl(self, mat):
 		if mat != self.current_material:
-			self.write("usemtl {}\n".format(mat))
 			self.current_material = mat
+			return "usemtl {}\n".format(mat).encode('ascii')
+		return b""
 
-	def write_poly(self, vs):
-		self.write("f {}/{} {}/{} {}/{}\n".format(
-			vs[2] + self.cur_vertex_offset, vs[2] + self.cur_vertex_offset,
-			vs[1] + self.cur_vertex_offset, vs[1] + self.cur_vertex_offset,
-			vs[0] + self.cur_vertex_offset, vs[0] + self.cur_vertex_offset
-		))
-
-	def get_output(self):
-		self.f.seek(0)
-		return self.f
+	def write_polys(self, triangles):
+		return _format_rows("f %d/%d %d/%d %d/%d\n", np.repeat(triangles + self.cur_vertex_offset, 2, axis=1))
 
 	#
 
-	def write_model(self, model, looks, lod):
+	def write_model(self, model, looks, lod): # => generator of OBJ text chunks; sections are looked up right away, so errors are raised before anything is sent
 		mode = dat1lib.VERSION_RCRA
 		if not isinstance(model, dat1lib.types.model.ModelRcra):
 			mode = dat1lib.VERSION_MSMR
@@ -96,12 +75,12 @@ class ObjHelper(object):
 		meshes = s.meshes
 
 		s = model.dat1.get_section(SECTION_VERTEXES)
-		vertexes = s.vertexes
+		positions, _, uvs = s.get_arrays()
 
 		s = model.dat1.get_section(SECTION_INDEXES)
-		indexes = s.values
+		indexes = s.get_indexes()
 
-		uvs = model.dat1.get_section(0x16F3BA18) # SO UVs
+		so_uvs = model.dat1.get_section(0x16F3BA18) # SO UVs
 
 		materials_section = model.dat1.get_section(SECTION_MATERIALS)
 
@@ -121,40 +100,35 @@ class ObjHelper(object):
 			look_lod = looks_section.looks[look].lods[lod]
 			meshes_to_display |= set(range(look_lod.start, look_lod.start + look_lod.count))
 
-		for i, mesh in enumerate(meshes):
-			if i not in meshes_to_display:
-				continue
+		to_write = [(i, mesh, get_material_name(mesh)) for i, mesh in enumerate(meshes) if i in meshes_to_display]
+
+		def generate():
+			for i, mesh, matname in to_write:
+				yield self.start_mesh("mesh{:02}_{}".format(i, matname))
+				yield self.usemtl(matname)
 
-			matname = get_material_name(mesh)
-			self.start_mesh("mesh{:02}_{}".format(i, matname))
-			self.usemtl(matname)
+				start, end = mesh.vertexStart, mesh.vertexStart + mesh.vertexCount
+				mesh_uvs = uvs[start:end]
+				if so_uvs is not None:
+					mesh_uvs = np.array([so_uvs.get_uv(vi) for vi in range(start, end)], dtype=np.float64).reshape(-1, 2)
 
-			for vi in range(mesh.vertexStart, mesh.vertexStart + mesh.vertexCount):
-				v = vertexes[vi]
-				uv = None if uvs is None else uvs.get_uv(vi)
-				self.write_vertex(v, uv)
+				yield from self.write_vertexes(positions[start:end], mesh_uvs)
 
-			#
+				#
 
-			relative_indexes = ((mesh.get_flags() & 0x10) == 0)
+				faces_count = mesh.indexCount // 3
+				triangles = indexes[mesh.indexStart:mesh.indexStart + faces_count*3].astype(np.int64).reshape(-1, 3)
+				if (mesh.get_flags() & 0x10) == 0:
+					triangles -= mesh.vertexStart # make relative
 
-			faces_count = mesh.indexCount // 3
-			for j in range(faces_count):
-				index_index = mesh.indexStart + j*3
-				
-				a, b, c = indexes[index_index+2], indexes[index_index+1], indexes[index_index]
-				if relative_indexes:
-					a -= mesh.vertexStart
-					b -= mesh.vertexStart
-					c -= mesh.vertexStart
+				yield from self.write_polys(triangles)
 
-				self.write_poly([a, b, c])
+				self.end_mesh(mesh.vertexCount)
 
-			self.end_mesh()
+		return generate()
 
 ###
 
-def write(model, looks, lod):
+def write(model, looks, lod): # => generator of OBJ text chunks
 	helper = ObjHelper()
-	helper.write_model(model, looks, lod)
-	return helper.get_output()
+	return helper.write_model(model, looks, lod)
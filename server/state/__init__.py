@@ -10,6 +10,7 @@ import flask
 import io
 import os.path
 
+import server.state.asset_types
 import server.state.assets
 import server.state.caches
 import server.state.configs_editor
@@ -17,6 +18,7 @@ import server.state.diff_tool
 import server.state.models_viewer
 import server.state.nodegraph
 import server.state.references
+import server.state.search
 import server.state.sections_editor
 import server.state.sections_viewer
 import server.state.stages
@@ -33,12 +35,14 @@ class State(object):
 		self.stages = server.state.stages.Stages(self)
 		self.caches = server.state.caches.Caches(self)
 
+		self.asset_types = server.state.asset_types.AssetTypes(self)
 		self.assets = server.state.assets.Assets(self)
 		self.configs_editor = server.state.configs_editor.ConfigsEditor(self)
 		self.diff_tool = server.state.diff_tool.DiffTool(self)
 		self.models_viewer = server.state.models_viewer.ModelsViewer(self)
 		self.nodegraph = server.state.nodegraph.NodeGraph(self)
 		self.references = server.state.references.References(self)
+		self.search = server.state.search.Search(self)
 		self.sections_editor = server.state.sections_editor.SectionsEditor(self)
 		self.sections_viewer = server.state.sections_viewer.SectionsViewer(self)
 		self.suits_editor = server.state.suits_editor.SuitsEditor(self)
@@ -52,18 +56,22 @@ class State(object):
 		self.toc_loader.reboot()
 		self.stages.reboot()
 		self.caches.reboot()
+		self.asset_types.reboot()
+		self.references.reboot()
 
 	# API
 
 	def make_api_routes(self, app):
 		make_post_json_route(app, "/api/boot", self.boot)
 
+		self.asset_types.make_api_routes(app)
 		self.assets.make_api_routes(app)
 		self.configs_editor.make_api_routes(app)
 		self.diff_tool.make_api_routes(app)
 		self.models_viewer.make_api_routes(app)
 		self.nodegraph.make_api_routes(app)
 		self.references.make_api_routes(app)
+		self.search.make_api_routes(app)
 		self.sections_editor.make_api_routes(app)
 		self.sections_viewer.make_api_routes(app)
 		self.stages.make_api_routes(app)
@@ -0,0 +1,244 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import flask
+from server.api_utils import get_field, make_post_json_route
+
+import bisect
+import concurrent.futures
+import dat1lib
+import dat1lib.crc64 as crc64
+import dat1lib.types.toc
+import dat1lib.types.toc2
+import json
+import multiprocessing
+import os
+import os.path
+import struct
+import threading
+import traceback
+
+INDEX_VERSION = 1
+INDEXES_DIR = ".cache/asset_types/"
+
+# TODO: make these configurable
+SNIFF_PROCESSES = max(1, (os.cpu_count() or 2) - 1)
+SNIFF_CHUNK = 4096 # entries per task, so big archives are split between processes too
+
+def _unpack_magic(data):
+	if len(data) < 4:
+		return None
+	return struct.unpack("<I", data[:4])[0]
+
+def _sniff_archive(rcra, archive_path, entries): # runs in a worker process; entries are [(aid, offset)] sorted by offset => [(aid, magic)]
+	toc_module = dat1lib.types.toc2 if rcra else dat1lib.types.toc
+
+	results = []
+	f, compressed = toc_module.open_archive_file(archive_path)
+	try:
+		if not compressed:
+			for aid, offset in entries:
+				f.seek(offset)
+				results += [(aid, _unpack_magic(f.read(4)))]
+			return results
+
+		blocks = toc_module.read_blocks(f)
+		starts = [b[0] for b in blocks]
+		decompressed = {} # block index -> data; entries are sorted, so only the last couple of blocks are ever needed
+
+		def get_block(i):
+			if i not in decompressed:
+				if len(decompressed) > 1:
+					del decompressed[min(decompressed)]
+				decompressed[i] = toc_module.decompress_block(f, blocks[i])
+			return decompressed[i]
+
+		for aid, offset in entries:
+			i = bisect.bisect_right(starts, offset) - 1
+			pos = offset
+			prefix = bytearray()
+			while len(prefix) < 4 and 0 <= i < len(blocks): # magic might be split between blocks
+				real_offset, real_size = blocks[i][0], blocks[i][2]
+				data = get_block(i)
+				prefix += data[pos - real_offset:pos - real_offset + 4 - len(prefix)]
+				pos = real_offset + real_size
+				i += 1
+			results += [(aid, _unpack_magic(prefix))]
+	finally:
+		f.close()
+
+	return results
+
+# persistent aid -> type (magic) index of loaded toc
+#
+# RCRA toc has most of assets' headers (which start with magic) in it,
+# and the rest is "sniffed" from archives once, in a processes pool:
+# first 4 bytes of every asset, with every archive block decompressed at most once
+#
+# stages' types are maintained by their indexers (see StageIndexer)
+
+class AssetTypes(object):
+	def __init__(self, state):
+		self.state = state
+		self.lock = threading.Lock()
+		self.reboot()
+
+	def reboot(self):
+		self.archived = None # aid -> magic
+
+	# API
+
+	def make_api_routes(self, app):
+		make_post_json_route(app, "/api/asset_types/find", self.find)
+
+	def find(self):
+		rq = flask.request
+		stage = get_field(rq.form, "stage")
+		path = get_field(rq.form, "path")
+		magics = [int(m, 16) for m in get_field(rq.form, "magics").split(",") if m.strip() != ""]
+		recursive = (rq.form.get("recursive", "true") == "true")
+		return {"locators": self.find_assets(stage, path, magics, recursive)}
+
+	# internal
+
+	def find_assets(self, stage, path, magics, recursive=True): # => [locator]
+		magics = set(magics)
+
+		if stage is not None and stage != "":
+			stage_object, _ = self.state.stages.get_stage(stage, create_if_needed=False)
+			if stage_object is None:
+				raise Exception("Bad stage")
+			return stage_object.find_assets_by_magic(stage, magics, path, recursive)
+
+		return self._find_archived_assets(magics, path, recursive)
+
+	def get_archived_type(self, aid):
+		return self._get_archived_types().get(aid)
+
+	#
+
+	def _find_archived_assets(self, magics, path, recursive):
+		types = self._get_archived_types()
+		toc_loader = self.state.toc_loader
+
+		node = toc_loader.tree
+		for p in path.split("/"):
+			if p == "":
+				continue
+			if p not in node or not isinstance(node[p], dict):
+				return []
+			node = node[p]
+
+		aids = []
+		def walk(node):
+			for k in node:
+				if isinstance(node[k], list):
+					aids.append(node[k][0])
+				elif recursive:
+					walk(node[k])
+		walk(node)
+
+		if recursive and path.strip("/") == "":
+			aids += list(toc_loader.hashes.keys()) # assets with unknown paths aren't in the tree
+
+		result = []
+		for aid in aids:
+			if types.get(aid) in magics:
+				result += self.state.get_asset_variants_locators("", aid)
+		return result
+
+	def _get_archived_types(self):
+		with self.lock:
+			if self.archived is None:
+				toc_fn = self.state.toc_loader.toc_path
+				if toc_fn is None:
+					raise Exception("No toc loaded")
+
+				index_fn, key = self._get_index_path(toc_fn)
+				self.archived = self._load_index(index_fn, key)
+				if self.archived is None:
+					self.archived = self._build_archived_types()
+					self._save_index(index_fn, key, self.archived)
+
+			return self.archived
+
+	def _get_index_path(self, toc_fn): # => (index_fn, key)
+		toc_fn = os.path.abspath(toc_fn)
+		st = os.stat(toc_fn)
+		key = [toc_fn, st.st_size, st.st_mtime_ns]
+		return (os.path.join(INDEXES_DIR, "{:016X}.json".format(crc64.hash(toc_fn))), key)
+
+	def _load_index(self, index_fn, key):
+		try:
+			with open(index_fn, "r") as f:
+				index = json.load(f)
+			if index.get("version") == INDEX_VERSION and index.get("key") == key:
+				return index["types"]
+		except:
+			pass
+
+		return None
+
+	def _save_index(self, index_fn, key, types):
+		try:
+			os.makedirs(INDEXES_DIR, exist_ok=True)
+			tmp_fn = index_fn + ".tmp"
+			with open(tmp_fn, "w") as f:
+				json.dump({"version": INDEX_VERSION, "key": key, "types": types}, f)
+			os.replace(tmp_fn, index_fn)
+		except:
+			print(traceback.format_exc())
+
+	def _build_archived_types(self):
+		toc = self.state.toc_loader.toc
+		rcra = isinstance(toc, dat1lib.types.toc2.TOC2)
+
+		types = {}
+		to_sniff = {} # archive index -> [(aid, offset)]
+		queued = set()
+
+		ids = toc.get_assets_section().ids
+		for i in range(len(ids)):
+			entry = toc.get_asset_entry_by_index(i)
+			if entry is None:
+				continue
+
+			aid = "{:016X}".format(entry.asset_id)
+			if aid in types or aid in queued:
+				continue
+
+			header = getattr(entry, "header", None)
+			if header is not None:
+				types[aid] = _unpack_magic(header)
+				continue
+
+			if entry.size < 4:
+				continue
+
+			if entry.archive not in to_sniff:
+				to_sniff[entry.archive] = []
+			to_sniff[entry.archive] += [(aid, entry.offset)]
+			queued.add(aid)
+
+		if len(to_sniff) == 0:
+			return types
+
+		with concurrent.futures.ProcessPoolExecutor(max_workers=SNIFF_PROCESSES, mp_context=multiprocessing.get_context("spawn")) as pool:
+			futures = []
+			for archive_index in to_sniff:
+				entries = sorted(to_sniff[archive_index], key=lambda e: e[1])
+				archive_fn = toc.get_archive_path(archive_index)
+				for i in range(0, len(entries), SNIFF_CHUNK):
+					futures += [pool.submit(_sniff_archive, rcra, archive_fn, entries[i:i+SNIFF_CHUNK])]
+
+			for future in concurrent.futures.as_completed(futures):
+				try:
+					for aid, magic in future.result():
+						if magic is not None:
+							types[aid] = magic
+				except:
+					print(traceback.format_exc())
+
+		return types
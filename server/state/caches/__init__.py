@@ -5,6 +5,7 @@
 
 from server.state.caches.assets import AssetsCache
 from server.state.caches.data import DataCache
+from server.state.caches.meshes import MeshesCache
 from server.state.caches.textures import TexturesCache
 
 class Caches(object):
@@ -12,6 +13,7 @@ class Caches(object):
 		self.state = state
 		self.assets_cache = AssetsCache(self)
 		self.data_cache = DataCache(self)
+		self.meshes_cache = MeshesCache(self)
 		self.textures_cache = TexturesCache(self)
 	
 	#
@@ -19,6 +21,7 @@ class Caches(object):
 	def reboot(self):
 		self.assets_cache.clear()
 		self.data_cache.clear()
+		self.meshes_cache.clear()
 		self.textures_cache.reboot()
 
 	def get_data(self, locator):
@@ -27,9 +30,21 @@ class Caches(object):
 	def get_asset(self, locator):
 		return self.assets_cache.get(locator)
 
+	def get_asset_with_crc(self, locator): # -> (data, asset, data CRC)
+		return self.assets_cache.get_with_crc(locator)
+
+	def get_mesh(self, locator, looks, lod, with_skin): # -> (server.mesh_writer data, etag)
+		return self.meshes_cache.get(locator, looks, lod, with_skin)
+
+	def get_mesh_etag(self, locator, looks, lod, with_skin):
+		return self.meshes_cache.get_etag(locator, looks, lod, with_skin)
+
 	def get_texture_mipmap(self, locator, mipmap_index, use_hd_data):
 		return self.textures_cache.get(locator, mipmap_index, use_hd_data)
 
+	def get_texture_mipmap_entry(self, locator, mipmap_index, use_hd_data): # -> (cached_file_path, Image)
+		return self.textures_cache.get_entry(locator, mipmap_index, use_hd_data)
+
 	# internal
 
 	def boot(self):
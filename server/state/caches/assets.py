@@ -44,6 +44,10 @@ class AssetsCache(object):
 			self.cached = {}
 
 	def get(self, locator):
+		data, asset, _ = self.get_with_crc(locator)
+		return data, asset
+
+	def get_with_crc(self, locator): # data CRC tells whether things made from asset are still valid
 		with self.lock:
 			log("AssetsCache.get: {}".format(locator))
 			state = self.caches.state
@@ -51,7 +55,7 @@ class AssetsCache(object):
 
 			data = state.get_asset_data(locator)
 			if len(data) < 4:
-				return data, None
+				return data, None, self._get_data_crc(data)
 
 			# return asset if it is cached
 
@@ -60,7 +64,7 @@ class AssetsCache(object):
 			if key in self.cached:
 				if self.cached[key].crc == crc:
 					log("\tcache hit!")
-					return data, self.cached[key].get()
+					return data, self.cached[key].get(), crc
 				else:
 					log("\tcache miss, wrong data CRC (cached={:08X}, actual={:08X}) => reloading...".format(self.cached[key].crc, crc))
 			else:
@@ -75,7 +79,7 @@ class AssetsCache(object):
 				asset = HeadlessDAT1(asset)
 
 			self._cache(key, asset, crc)
-			return data, self.cached[key].get()
+			return data, self.cached[key].get(), crc
 
 	#
 
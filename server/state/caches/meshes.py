@@ -0,0 +1,111 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import server.mesh_writer
+import time
+import threading
+import zlib
+
+# TODO: make these configurable
+MAX_CACHED_DATA_SIZE = 256 * 1024 * 1024
+MAX_CACHED_ENTRIES = 32
+
+DEBUG = False
+def log(x):
+	if DEBUG:
+		print(x)
+
+class CacheEntry(object):
+	def __init__(self, data, etag):
+		self.data = data
+		self.etag = etag
+		self.timestamp = int(time.time())
+
+	def get(self):
+		self.timestamp = int(time.time())
+		return self.data
+
+# binary meshes made by server.mesh_writer, one per (locator, looks, lod, skin)
+#
+# entries are valid while asset data has the same CRC (same as AssetsCache checks),
+# and that CRC is also a part of ETag, so browser can revalidate without downloading
+
+class MeshesCache(object):
+	def __init__(self, caches):
+		self.caches = caches
+		self.cached = {}
+		self.cache_size = 0
+
+		self.lock = threading.Lock()
+
+	#
+
+	def clear(self):
+		with self.lock:
+			self.cached = {}
+			self.cache_size = 0
+
+	def get_etag(self, locator, looks, lod, with_skin):
+		_, _, crc = self.caches.get_asset_with_crc(locator)
+		return self._make_etag(crc, looks, lod, with_skin)
+
+	def get(self, locator, looks, lod, with_skin): # -> (data, etag)
+		_, model, crc = self.caches.get_asset_with_crc(locator)
+		etag = self._make_etag(crc, looks, lod, with_skin)
+
+		with self.lock:
+			log("MeshesCache.get: {}".format(locator))
+			key = self._get_cache_key(locator, looks, lod, with_skin)
+			if key in self.cached:
+				if self.cached[key].etag == etag:
+					log("\tcache hit!")
+					return (self.cached[key].get(), etag)
+				log("\tcache miss, asset changed => remaking...")
+			else:
+				log("\tcache miss, making...")
+
+		data = server.mesh_writer.write(model, looks, lod, with_skin) # without lock, so other meshes can be served meanwhile
+
+		with self.lock:
+			self._cache(key, data, etag)
+
+		return (data, etag)
+
+	#
+
+	def _make_etag(self, crc, looks, lod, with_skin):
+		params = "{}|{}|{}|{}".format(",".join(["{}".format(look) for look in looks]), lod, with_skin, server.mesh_writer.VERSION)
+		return "{:08X}{:08X}".format(crc, zlib.crc32(params.encode('utf-8')))
+
+	def _get_cache_key(self, locator, looks, lod, with_skin):
+		return "{}|{}|{}|{}".format(locator, ",".join(["{}".format(look) for look in looks]), lod, with_skin)
+
+	def _cache_limits_exceeded(self):
+		return (len(self.cached) > MAX_CACHED_ENTRIES or self.cache_size > MAX_CACHED_DATA_SIZE)
+
+	def _cache(self, key, data, etag):
+		if key in self.cached:
+			self.cache_size -= len(self.cached[key].data)
+
+		self.cached[key] = CacheEntry(data, etag)
+		self.cache_size += len(data)
+		log("\t-- added {}, now {} entries of {} size".format(key, len(self.cached), self.cache_size))
+
+		if self._cache_limits_exceeded():
+			log("\t-- limits exceeded: {}/{} entries of {}/{} size".format(len(self.cached), MAX_CACHED_ENTRIES, self.cache_size, MAX_CACHED_DATA_SIZE))
+			keys = sorted([(self.cached[k].timestamp, k) for k in self.cached]) # first key is the earliest used (least needed right now)
+
+			for ts, k in keys:
+				if k == key: # can't uncache an entry we just created, even if limits are exceeded
+					continue
+
+				if not self._cache_limits_exceeded():
+					break
+
+				if k in self.cached:
+					entry = self.cached[k]
+					self.cache_size -= len(entry.data)
+					del self.cached[k]
+					log("\t-- removed {}, now {} entries of {} size".format(k, len(self.cached), self.cache_size))
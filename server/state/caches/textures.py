@@ -9,10 +9,13 @@ import os.path
 import time
 import threading
 from PIL import Image
+from server.worker_pool import WorkerPool, PRIORITY_LOW
 
 # TODO: make these configurable
 MAX_CACHED_DATA_SIZE = 256 * 1024 * 1024
 MAX_CACHED_ENTRIES = 1000
+PNG_COMPRESS_LEVEL = 1 # cache is local, so it's better to spend less CPU time than disk space
+WORKERS_COUNT = max(2, (os.cpu_count() or 1) // 2)
 
 DEBUG = False
 def log(x):
@@ -27,6 +30,7 @@ class TexturesCache(object):
 		self.access_timestamps = {}
 
 		self.lock = threading.Lock()
+		self.pool = WorkerPool("TexturesCache", WORKERS_COUNT)
 
 	#
 
@@ -36,60 +40,104 @@ class TexturesCache(object):
 			self._update_cache_stats(init_access_timestamps=True)
 
 	def reboot(self):
+		self.pool.clear()
 		self.boot()
 
 	def clear(self):
+		self.pool.clear()
 		with self.lock:
 			self._delete_all_cached_mipmaps()
 			self._update_cache_stats(init_access_timestamps=True)
 
 	def get(self, locator, mipmap_index, use_hd_data):
+		_, image = self.get_entry(locator, mipmap_index, use_hd_data)
+		return image
+
+	def get_entry(self, locator, mipmap_index, use_hd_data): # -> (cached_file_path, Image)
+		log("TexturesCache.get: {}".format(locator))
+		state = self.caches.state
+		locator = state.locator(locator)
+
+		if not locator.is_valid:
+			raise Exception("Invalid Locator passed: {}".format(locator))
+
+		#
+
+		data, asset = state.get_asset(locator)
+		info = asset.dat1.get_section(dat1lib.types.sections.texture.header.TextureHeaderSection.TAG)
+
+		# "real" index counts HD mipmaps first, then SD ones
+
+		real_mipmap_index = mipmap_index
+		if not use_hd_data:
+			real_mipmap_index += info.hd_mipmaps
+
+		# return cached, if any
+
+		key = self._get_cache_key(locator, real_mipmap_index)
 		with self.lock:
-			log("TexturesCache.get: {}".format(locator))
-			state = self.caches.state
-			locator = state.locator(locator)
+			if os.path.exists(key) and not self.pool.is_pending(key):
+				log("\tcache hit!")
+				return (key, self._get_cached(key))
 
-			if not locator.is_valid:
-				raise Exception("Invalid Locator passed: {}".format(locator))
+		# if not, convert .dds to .png in the pool (and speculatively convert the neighbours too)
 
-			#
+		log("\tcache miss, loading...")
 
-			data, asset = state.get_asset(locator)
-			info = asset.dat1.get_section(dat1lib.types.sections.texture.header.TextureHeaderSection.TAG)
+		job = self.pool.submit(key, lambda: self._convert(locator, asset, info, real_mipmap_index, key))
+		self._prefetch(locator, asset, info, real_mipmap_index, use_hd_data)
+		image = job.wait()
 
-			hd_data = None
-			real_mipmap_index = mipmap_index
-			if use_hd_data:
-				if mipmap_index < info.hd_mipmaps:
-					hd_locator = state._make_hd_locator(locator)
-					hd_data = state.get_asset_data(hd_locator)
-				else:
-					mipmap_index -= info.hd_mipmaps
-			else:
-				real_mipmap_index += info.hd_mipmaps
+		if image is None: # failure to load
+			return (None, None)
 
-			# return cached, if any
+		with self.lock:
+			return (key, self._get_cached(key, image))
 
-			key = self._get_cache_key(locator, real_mipmap_index)
+	def _prefetch(self, locator, asset, info, real_mipmap_index, use_hd_data):
+		first = 0 if use_hd_data else info.hd_mipmaps
+		end = info.hd_mipmaps + info.sd_mipmaps
+
+		indexes = [real_mipmap_index - 1, real_mipmap_index + 1, info.hd_mipmaps] # neighbours and the one used for thumbnails
+		for i in indexes:
+			if i < first or i >= end or i == real_mipmap_index:
+				continue
+
+			key = self._get_cache_key(locator, i)
 			if os.path.exists(key):
-				log("\tcache hit!")
+				continue
+
+			self.pool.submit(key, lambda i=i, key=key: self._convert(locator, asset, info, i, key), PRIORITY_LOW)
+
+	def _convert(self, locator, asset, info, real_mipmap_index, key):
+		if os.path.exists(key):
+			with self.lock:
 				return self._get_cached(key)
 
-			# if not, convert .dds to .png and cache it
+		state = self.caches.state
 
-			log("\tcache miss, loading...")
+		hd_data = None
+		mipmap_index = real_mipmap_index
+		if real_mipmap_index < info.hd_mipmaps:
+			hd_locator = state._make_hd_locator(locator)
+			hd_data = state.get_asset_data(hd_locator)
+		else:
+			mipmap_index -= info.hd_mipmaps
 
-			saved_already, image = state.textures.dds_to_png(asset, hd_data, mipmap_index, save_as=key)
+		saved_already, image = state.textures.dds_to_png(asset, hd_data, mipmap_index, save_as=key)
 
-			if image is None: # failure to load
-				return None
+		if image is None: # failure to load
+			return None
 
-			if saved_already:
-				self._cache(key, None) 
-				return self._get_cached(key, image)
+		image.load() # so it doesn't depend on file that could be uncached by another thread
 
-			self._cache(key, image)
-			return self._get_cached(key)
+		if not saved_already:
+			self._write_image(key, image) # outside of the lock, so workers can encode concurrently
+
+		with self.lock:
+			self._cache(key, None)
+
+		return image
 
 	#
 
@@ -106,11 +154,14 @@ class TexturesCache(object):
 	def _cache_limits_exceeded(self):
 		return (self.cached_entries_count > MAX_CACHED_ENTRIES or self.cache_size > MAX_CACHED_DATA_SIZE)
 
+	def _write_image(self, key, image):
+		f = open(key, "wb")
+		image.save(f, format="png", compress_level=PNG_COMPRESS_LEVEL)
+		f.close()
+
 	def _cache(self, key, image):
 		if image is not None:
-			f = open(key, "wb")
-			image.save(f, format="png")
-			f.close()
+			self._write_image(key, image)
 
 		self._update_cache_stats()
 		log("\t-- added {}, now {} entries of {} size".format(key, self.cached_entries_count, self.cache_size))
@@ -4,10 +4,11 @@
 # A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
 
 import flask
-from server.api_utils import get_field, get_int, make_get_json_route, make_post_json_route
+from server.api_utils import get_field, get_int, make_get_json_route, make_post_json_route, streamed_response
 
 import dat1lib.crc32 as crc32
 import dat1lib.types.sections.model.look
+import dat1lib.types.sections.model.skin
 import dat1lib.types.sections.model.unknowns
 import io
 import server.mtl_writer
@@ -23,6 +24,7 @@ class ModelsViewer(object):
 		make_post_json_route(app, "/api/models_viewer/make", self.make_viewer)
 		make_get_json_route(app, "/api/models_viewer/mtl", self.get_mtl, False)
 		make_get_json_route(app, "/api/models_viewer/obj", self.get_obj, False)
+		make_get_json_route(app, "/api/models_viewer/mesh", self.get_mesh, False)
 
 	def make_viewer(self):
 		locator = get_field(flask.request.form, "locator")
@@ -41,7 +43,28 @@ class ModelsViewer(object):
 		lod = get_int(flask.request.args, "lod")
 
 		data, asset = self.state.get_asset(locator)
-		return (server.obj_writer.write(asset, looks, lod), 200)
+		return streamed_response(server.obj_writer.write(asset, looks, lod), "text/plain")
+
+	def get_mesh(self):
+		locator = get_field(flask.request.args, "locator")
+		looks = get_field(flask.request.args, "looks")
+		looks = [int(x) for x in looks.split(",")]
+		lod = get_int(flask.request.args, "lod")
+		with_skin = (flask.request.args.get("skin", "false") == "true")
+
+		locator = self.state.locator(locator)
+		caches = self.state.caches
+
+		etag = caches.get_mesh_etag(locator, looks, lod, with_skin)
+		if etag in flask.request.if_none_match:
+			r = flask.Response(status=304)
+		else:
+			data, etag = caches.get_mesh(locator, looks, lod, with_skin)
+			r = flask.Response(data, 200, mimetype="application/octet-stream")
+
+		r.set_etag(etag)
+		r.headers["Cache-Control"] = "private, no-cache" # revalidate with ETag instead of downloading again
+		return r
 
 	#
 
@@ -50,7 +73,8 @@ class ModelsViewer(object):
 		result = {
 			"materials": [],
 			"looks": [],
-			"lods": []
+			"lods": [],
+			"skin": []
 		}
 
 		SECTION_LOOK       = dat1lib.types.sections.model.look.ModelLookSection.TAG
@@ -131,4 +155,15 @@ class ModelsViewer(object):
 					"lods": lods
 				}]
 
+		#
+
+		skin, rcra_skin = dat1lib.types.sections.model.skin.get_model_skin(model.dat1)
+		for name, weights in [("Skin", skin), ("RCRA weights", rcra_skin)]:
+			if weights is not None:
+				result["skin"] += [{
+					"name": name,
+					"vertexes": len(weights),
+					"influences": weights.get_width()
+				}]
+
 		return result
@@ -6,14 +6,28 @@
 import flask
 from server.api_utils import get_int, get_field, make_get_json_route, make_post_json_route
 
+import dat1lib
 import dat1lib.crc32 as crc32
 import dat1lib.crc64 as crc64
+import dat1lib.extraction
 import dat1lib.types.autogen
 import dat1lib.types.config
+import dat1lib.types.dat1
 import dat1lib.types.model
 import dat1lib.types.sections
 import dat1lib.types.sections.model.unknowns
 import dat1lib.utils as utils
+import io
+import os
+import os.path
+import threading
+
+from server.state.references_index import ReferencesIndex
+from server.state.types.headless_dat1 import HeadlessDAT1
+from server.worker_pool import WorkerPool, PRIORITY_LOW
+
+# TODO: make this configurable
+WORKERS_COUNT = max(2, (os.cpu_count() or 1) // 2)
 
 class Reference(object):
 	def __init__(self, aid, filename):
@@ -37,11 +51,22 @@ class Reference(object):
 class References(object):
 	def __init__(self, state):
 		self.state = state
+		self.index = ReferencesIndex(state)
+
+		self.pool = WorkerPool("References", WORKERS_COUNT)
+		self.memo_lock = threading.Lock()
+		self._clear_memos()
+
+	def reboot(self):
+		self.index.reboot()
+		self.pool.clear()
+		self._clear_memos()
 
 	# API
 
 	def make_api_routes(self, app):
 		make_post_json_route(app, "/api/references_viewer/make", self.make_viewer)
+		make_post_json_route(app, "/api/references_viewer/used_by", self.make_used_by)
 
 	def make_viewer(self):
 		locator = get_field(flask.request.form, "locator")
@@ -49,6 +74,11 @@ class References(object):
 
 		return {"viewer": self.get_references_viewer(locator, depth)}
 
+	def make_used_by(self):
+		locator = get_field(flask.request.form, "locator")
+
+		return {"viewer": self.get_used_by_viewer(locator)}
+
 	# internal
 
 	def get_references_viewer(self, locator, depth):
@@ -82,6 +112,67 @@ class References(object):
 
 		return {"references": references}
 
+	def get_used_by_viewer(self, locator):
+		locator = self.state.locator(locator)
+		default_stage = locator.stage
+
+		archived, staged, index_status = self.index.get_used_by(locator.asset_id)
+		if archived is None: # index is being built, only staged sources are known yet
+			archived = []
+
+		refmap = {} # source aid:string => :Reference
+		order = []
+		def add(aid, filename, section, locators):
+			if aid not in refmap:
+				refmap[aid] = Reference(aid, filename)
+				order.append(aid)
+			ref = refmap[aid]
+			if ref.filename is None:
+				ref.filename = filename
+			ref.add_reference_source(section)
+			for l in locators:
+				if l not in ref.locators:
+					ref.add_locator(l)
+
+		known_paths = self.state.toc_loader._known_paths
+		for aid, section in archived:
+			add(aid, known_paths.get(aid), section, self.state.get_asset_variants_locators("", aid))
+
+		for stage in staged:
+			for key, section in staged[stage]:
+				source_aid = self.index.get_staged_source_aid(stage, key)
+				if source_aid is None: # stage changed meanwhile
+					continue
+
+				_, path = key.split("/", 1)
+				add(source_aid, path, section, ["{}/{}".format(stage, key)])
+
+		references = []
+		for aid in order:
+			ref = refmap[aid]
+			ref_in = []
+			for r in ref.referenced_in:
+				if r not in ref_in:
+					ref_in += [r]
+
+			if len(ref_in) > 1 and "Strings Block" in ref_in:
+				ref_in.remove("Strings Block")
+
+			best_locator = self._get_best_locator(ref.locators, default_stage)
+			if best_locator is not None:
+				best_locator = str(best_locator)
+
+			references += [{
+				"depth": 0,
+				"asset_id": ref.aid,
+				"filename": ref.filename,
+				"referenced_in": ref_in,
+				"locator": best_locator,
+				"comment": self._make_comment(ref)
+			}]
+
+		return {"references": references, "index": index_status}
+
 	def _make_comment(self, ref):
 		if len(ref.locators) == 0:
 			return "Not found"
@@ -117,54 +208,132 @@ class References(object):
 	#
 
 	def get_references(self, locator, depth=0):
-		were_queued = set()
 		order = [] # (depth:int, :Reference)
 
 		locator = self.state.locator(locator)
 		default_stage = locator.stage
+		self._check_memos()
+
+		try:
+			# depth-first, so every reference is directly followed by the references it has itself
+			stack = self._expand(locator, 0, depth, [locator.asset_id], default_stage)
+			while len(stack) > 0:
+				current_depth, ref, ref_locator, parent_assets = stack.pop()
+				order += [(current_depth, ref)]
 
-		q = [(0, 0, locator, [locator.asset_id])]
-		while len(q) > 0:
-			append_after, current_depth, locator, parent_assets = q[0]
-			q = q[1:]
+				if ref_locator is not None:
+					stack += self._expand(ref_locator, current_depth+1, depth, parent_assets + [ref.aid], default_stage)
+		finally:
+			self.pool.clear() # prefetched assets that weren't visited aren't needed anymore
 
-			orig_append_after = append_after
-			refmap = {} # aid:string => :Reference
-			_, asset = self.state.get_asset(locator)
-			refs = self._get_references(asset)
+		return order
 
-			for aid, filename, section in refs:
-				if aid not in refmap:
-					refmap[aid] = Reference(aid, filename)
-					refmap[aid].add_locators(self._get_locators(aid))
+	def _expand(self, locator, current_depth, depth, parent_assets, default_stage): # => stack entries (depth, :Reference, locator to expand or None, parent_assets) in reverse order
+		refmap = {} # aid:string => :Reference
+		refs = self._get_memoized_references(locator)
 
-				refmap[aid].add_reference_source(section)
+		for aid, filename, section in refs:
+			if aid not in refmap:
+				refmap[aid] = Reference(aid, filename)
+				refmap[aid].add_locators(self._get_memoized_locators(aid))
 
-			already_added = set()
-			append_to_q = []
-			for aid, _, _ in refs:
-				if aid in already_added:
-					continue
+			refmap[aid].add_reference_source(section)
 
-				order = order[:append_after] + [(current_depth, refmap[aid])] + order[append_after:]
-				append_after += 1
-				already_added.add(aid)
+		entries = []
+		already_added = set()
+		for aid, _, _ in refs:
+			if aid in already_added:
+				continue
+			already_added.add(aid)
+
+			ref_locator = None
+			if current_depth < depth and aid not in parent_assets:
+				ref_locator = self._get_best_locator(refmap[aid].locators, default_stage)
+				if ref_locator is not None:
+					ref_locator = self.state.locator(ref_locator)
+					self._prefetch(ref_locator) # while the ones before it are being expanded
+
+			entries += [(current_depth, refmap[aid], ref_locator, parent_assets)]
+
+		entries.reverse()
+		return entries
+
+	# memos: asset's references are only extracted once per session (staged ones -- until the file changes)
+
+	def _clear_memos(self):
+		with self.memo_lock:
+			self.references_memo = {} # str(locator) -> (stamp, [(aid, filename, section)])
+			self.locators_memo = {} # aid -> [locator]
+			self.memo_key = None
+
+	def _check_memos(self):
+		# archived assets and their locators change only when another toc is loaded or stages are refreshed
+		stages = self.state.stages.stages
+		key = (self.state.toc_loader.toc, tuple([(name, stages[name].generation) for name in stages]))
+		if key != self.memo_key:
+			self._clear_memos()
+			self.memo_key = key
+
+	def _get_memo_stamp(self, locator):
+		if locator.is_archived:
+			return None
+
+		path = os.path.join("stages/", locator.path)
+		if not os.path.exists(path):
+			path = os.path.join("stages/", locator.stage, locator.span, locator.asset_id)
+
+		st = os.stat(path)
+		return (st.st_size, st.st_mtime_ns)
+
+	def _get_memoized_references(self, locator):
+		key = str(locator)
+		stamp = self._get_memo_stamp(locator)
+		with self.memo_lock:
+			memo = self.references_memo.get(key)
+		if memo is not None and memo[0] == stamp:
+			return memo[1]
+
+		return self.pool.submit(key, lambda: self._load_references(locator, key, stamp)).wait()
+
+	def _prefetch(self, locator):
+		key = str(locator)
+		with self.memo_lock:
+			if key in self.references_memo:
+				return
+
+		self.pool.submit(key, lambda: self._load_references(locator, key, self._get_memo_stamp(locator)), PRIORITY_LOW)
+
+	def _load_references(self, locator, key, stamp): # runs in the pool
+		refs = self._read_references(self._read_asset_data(locator))
+		with self.memo_lock:
+			self.references_memo[key] = (stamp, refs)
+		return refs
+
+	def _read_asset_data(self, locator):
+		if not locator.is_archived:
+			return self.state.get_asset_data(locator)
+
+		# not using DataCache, which extracts one asset at a time; read_archive opens the archive by itself, so it can run in parallel
+		toc = self.state.toc_loader.toc
+		entry = toc.get_asset_entry_by_index(self.state._get_archived_asset_index(locator))
+		for _, data in dat1lib.extraction.read_archive(dat1lib.extraction.get_toc_module(toc), toc.get_archive_path(entry.archive), [entry]):
+			return data
+
+	def _read_references(self, data, version=None): # => [(aid, filename, section)]
+		if len(data) < 4:
+			return []
 
-				if current_depth < depth and aid not in parent_assets:
-					best_locator = self._get_best_locator(refmap[aid].locators, default_stage)
-					if best_locator is not None:
-						append_to_q += [(append_after, current_depth+1, best_locator, parent_assets + [aid])]
+		asset = dat1lib.read(io.BytesIO(data), try_unknown=False, version=version)
+		if isinstance(asset, dat1lib.types.dat1.DAT1):
+			asset = HeadlessDAT1(asset)
 
-			new_q = []
-			for aa, b, c, d in q:
-				new_aa = aa
-				if aa >= orig_append_after:
-					new_aa += append_after - orig_append_after
-				new_q += [(new_aa, b, c, d)]
-			q = new_q
-			q = append_to_q + q
+		return self._get_references(asset)
 
-		return order
+	def _get_memoized_locators(self, aid):
+		with self.memo_lock:
+			if aid not in self.locators_memo:
+				self.locators_memo[aid] = self._get_locators(aid)
+			return self.locators_memo[aid]
 
 	def _get_best_locator(self, locators, default_stage):
 		for l in locators:
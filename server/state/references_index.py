@@ -0,0 +1,311 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import concurrent.futures
+import dat1lib
+import dat1lib.crc64 as crc64
+import dat1lib.extraction
+import dat1lib.types.toc
+import dat1lib.types.toc2
+import json
+import multiprocessing
+import os
+import os.path
+import threading
+import traceback
+
+INDEX_VERSION = 2
+INDEXES_DIR = ".cache/references/"
+
+# TODO: make these configurable
+INDEX_PROCESSES = max(1, (os.cpu_count() or 2) - 1)
+INDEX_CHUNK = 256 # assets per task
+
+def _make_extractor():
+	import server.state.references
+	return server.state.references.References(None) # extractors don't use state
+
+def _index_archive_chunk(rcra, archive_fn, entries, version): # runs in a worker process; entries are sorted by offset => [(aid, refs)]
+	toc_module = dat1lib.types.toc2 if rcra else dat1lib.types.toc
+	extractor = _make_extractor()
+
+	results = []
+	for entry, data in dat1lib.extraction.read_archive(toc_module, archive_fn, entries):
+		try:
+			results += [("{:016X}".format(entry.asset_id), [list(r) for r in extractor._read_references(data, version)])]
+		except:
+			results += [("{:016X}".format(entry.asset_id), [])]
+
+	return results
+
+def _index_files_chunk(files, version): # runs in a worker process; files are [(key, filename)] => [(key, refs)]
+	extractor = _make_extractor()
+
+	results = []
+	for key, fn in files:
+		try:
+			with open(fn, "rb") as f:
+				data = f.read()
+			results += [(key, [list(r) for r in extractor._read_references(data, version)])]
+		except:
+			results += [(key, [])]
+
+	return results
+
+def _run_chunks(fn, chunks): # => yields results of all chunks
+	if len(chunks) == 1: # not worth starting processes
+		for r in fn(*chunks[0]):
+			yield r
+		return
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=INDEX_PROCESSES, mp_context=multiprocessing.get_context("spawn")) as pool:
+		futures = [pool.submit(fn, *args) for args in chunks]
+		for future in concurrent.futures.as_completed(futures):
+			try:
+				for r in future.result():
+					yield r
+			except:
+				print(traceback.format_exc())
+
+def _add_reverse(reverse, source, refs):
+	for aid, _, section in refs:
+		if aid not in reverse:
+			reverse[aid] = []
+		reverse[aid] += [(source, section)]
+
+class IndexJob(object):
+	def __init__(self):
+		self.running = True
+		self.cancelled = False
+		self.total = 0
+		self.done = 0
+		self.error = None
+
+	def get_status(self):
+		return {
+			"running": self.running,
+			"total": self.total,
+			"done": self.done,
+			"error": self.error
+		}
+
+# persistent reverse references index: aid -> assets that reference it
+#
+# forward references (same as References viewer shows) of every asset in
+# toc are extracted once, in a processes pool, with archives read sequentially;
+# the index is stored per toc and reused until toc file changes
+#
+# archived index is loaded or built by a background job (started with first
+# query), queries made meanwhile only get staged results and job's status
+#
+# stages have separate indexes, keyed by files' size and mtime (taken from
+# StageIndexer), so only new and modified staged files are parsed again
+
+class ReferencesIndex(object):
+	def __init__(self, state):
+		self.state = state
+		self.lock = threading.Lock()
+		self.archived_job = None
+		self.reboot()
+
+	def reboot(self):
+		with self.lock:
+			if self.archived_job is not None:
+				self.archived_job.cancelled = True # its result won't be used even if it finishes
+
+			self.archived = None # target aid -> [(source aid, section)]
+			self.archived_job = None
+			self.staged = {} # stage -> {"files": {key: [size, mtime_ns, source aid, refs]}, "reverse": {target aid -> [(key, section)]}, "spans": indexer's spans these are made of}
+
+	def get_used_by(self, aid): # => ([(source aid, section)] or None while archived index is being made, {stage: [(key, section)]}, archived index status), key is "span/path"
+		with self.lock:
+			archived = None
+			if self.archived is not None:
+				archived = self.archived.get(aid, [])
+			else:
+				self._start_archived_job()
+
+			staged = {}
+			for stage in self._update_staged():
+				sources = self.staged[stage]["reverse"].get(aid, [])
+				if len(sources) > 0:
+					staged[stage] = sources
+
+			return (archived, staged, self.get_archived_status())
+
+	def get_archived_status(self):
+		if self.archived is not None:
+			return {"ready": True}
+
+		status = {"ready": False}
+		if self.archived_job is not None:
+			status.update(self.archived_job.get_status())
+		return status
+
+	def get_staged_source_aid(self, stage, key): # => aid or None, if stage was changed since query
+		with self.lock:
+			entry = self.staged.get(stage)
+			if entry is None or key not in entry["files"]:
+				return None
+			return entry["files"][key][2]
+
+	#
+
+	def _start_archived_job(self): # under lock
+		if self.archived_job is not None and (self.archived_job.running or self.archived_job.error is None):
+			return
+
+		toc_fn = self.state.toc_loader.toc_path
+		if toc_fn is None:
+			raise Exception("No toc loaded")
+
+		job = IndexJob()
+		self.archived_job = job
+
+		t = threading.Thread(target=self._make_archived, args=(job, toc_fn), daemon=True)
+		t.start()
+
+	def _make_archived(self, job, toc_fn):
+		try:
+			index_fn, key = self._get_index_path(toc_fn)
+			index = self._load_index(index_fn, key)
+			if index is not None:
+				references = index["references"]
+			else:
+				references = self._build_archived(job)
+				if job.cancelled:
+					return
+				self._save_index(index_fn, {"version": INDEX_VERSION, "key": key, "references": references})
+
+			archived = {}
+			for source in references:
+				_add_reverse(archived, source, references[source])
+
+			with self.lock:
+				if self.archived_job is job:
+					self.archived = archived
+		except Exception as e:
+			print(traceback.format_exc())
+			job.error = "{}".format(e) # next query will start another job
+		finally:
+			job.running = False
+
+	def _build_archived(self, job): # => {source aid: refs}
+		toc = self.state.toc_loader.toc
+		rcra = isinstance(toc, dat1lib.types.toc2.TOC2)
+
+		# every asset is parsed once, even if it's present in several spans
+		by_archive = {}
+		seen = set()
+		ids = toc.get_assets_section().ids
+		for i in range(len(ids)):
+			if ids[i] in seen:
+				continue
+			seen.add(ids[i])
+
+			entry = toc.get_asset_entry_by_index(i)
+			if entry is None:
+				continue
+			if entry.archive not in by_archive:
+				by_archive[entry.archive] = []
+			by_archive[entry.archive] += [entry]
+
+		chunks = []
+		for archive_index in by_archive:
+			archive_fn = toc.get_archive_path(archive_index)
+			entries = sorted(by_archive[archive_index], key=lambda e: e.offset)
+			for i in range(0, len(entries), INDEX_CHUNK):
+				chunks += [(rcra, archive_fn, entries[i:i+INDEX_CHUNK], dat1lib.VERSION_OVERRIDE)]
+
+		job.total = len(seen)
+
+		references = {}
+		for source, refs in _run_chunks(_index_archive_chunk, chunks):
+			if job.cancelled:
+				break
+
+			job.done += 1
+			if len(refs) > 0:
+				references[source] = refs
+		return references
+
+	def _update_staged(self): # => stages names
+		stages = self.state.stages.stages
+
+		for stage in list(self.staged.keys()):
+			if stage not in stages:
+				del self.staged[stage]
+
+		for stage in stages:
+			if stage not in self.staged:
+				index = self._load_index(self._get_stage_index_path(stage), None)
+				self.staged[stage] = {"files": {} if index is None else index["files"], "reverse": None, "spans": None}
+
+			entry = self.staged[stage]
+			spans = stages[stage].indexer.spans
+			if entry["spans"] is spans and entry["reverse"] is not None:
+				continue # indexer replaces spans on every rescan, so files weren't changed since last query
+			old_files = entry["files"]
+			new_files = {}
+			to_parse = []
+			for span_name, aid_fn, aid, full_fn, size, mtime in stages[stage].indexer.iterate_file_paths():
+				key = "{}/{}".format(span_name, aid_fn)
+				old = old_files.get(key)
+				if old is not None and old[0] == size and old[1] == mtime:
+					new_files[key] = old
+				else:
+					new_files[key] = [size, mtime, aid, []]
+					to_parse += [(key, full_fn)]
+
+			if len(to_parse) > 0:
+				chunks = [(to_parse[i:i+INDEX_CHUNK], dat1lib.VERSION_OVERRIDE) for i in range(0, len(to_parse), INDEX_CHUNK)]
+				for key, refs in _run_chunks(_index_files_chunk, chunks):
+					new_files[key][3] = refs
+
+			if len(to_parse) > 0 or len(new_files) != len(old_files):
+				entry["files"] = new_files
+				entry["reverse"] = None
+				self._save_index(self._get_stage_index_path(stage), {"version": INDEX_VERSION, "files": new_files})
+
+			if entry["reverse"] is None:
+				entry["reverse"] = {}
+				for key in entry["files"]:
+					_add_reverse(entry["reverse"], key, entry["files"][key][3])
+
+			entry["spans"] = spans
+
+		return list(stages.keys())
+
+	#
+
+	def _get_index_path(self, toc_fn): # => (index_fn, key)
+		toc_fn = os.path.abspath(toc_fn)
+		st = os.stat(toc_fn)
+		key = [toc_fn, st.st_size, st.st_mtime_ns]
+		return (os.path.join(INDEXES_DIR, "{:016X}.json".format(crc64.hash(toc_fn))), key)
+
+	def _get_stage_index_path(self, stage):
+		return os.path.join(INDEXES_DIR, "stages", stage + ".json")
+
+	def _load_index(self, index_fn, key): # stages' indexes have no key
+		try:
+			with open(index_fn, "r") as f:
+				index = json.load(f)
+			if index.get("version") == INDEX_VERSION and index.get("key") == key:
+				return index
+		except:
+			pass
+
+		return None
+
+	def _save_index(self, index_fn, index):
+		try:
+			os.makedirs(os.path.dirname(index_fn), exist_ok=True)
+			tmp_fn = index_fn + ".tmp"
+			with open(tmp_fn, "w") as f:
+				json.dump(index, f)
+			os.replace(tmp_fn, index_fn)
+		except:
+			print(traceback.format_exc())
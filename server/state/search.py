@@ -0,0 +1,246 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import flask
+from server.api_utils import get_field, make_post_json_route
+
+import concurrent.futures
+import dat1lib
+import dat1lib.search
+import dat1lib.types.toc2
+import multiprocessing
+import os
+import threading
+import traceback
+
+# TODO: make these configurable
+SEARCH_PROCESSES = max(1, (os.cpu_count() or 2) - 1)
+SEARCH_CHUNK = 256 # assets per task
+SEARCH_MAX_RESULTS = 10000 # so a too common pattern doesn't eat all memory
+
+class SearchJob(object):
+	def __init__(self, mode, pattern, stage, path, recursive):
+		self.mode = mode
+		self.pattern = pattern
+		self.stage = stage
+		self.path = path
+		self.recursive = recursive
+		self.running = True
+		self.cancelled = False
+		self.total = 0
+		self.done = 0
+		self.results = [] # appended by search thread only, so readers can take slices without locking
+		self.truncated = False
+		self.error = None
+
+	def get_status(self, since=0):
+		return {
+			"mode": self.mode,
+			"pattern": self.pattern,
+			"stage": self.stage,
+			"path": self.path,
+			"recursive": self.recursive,
+			"running": self.running,
+			"total": self.total,
+			"done": self.done,
+			"found": len(self.results),
+			"truncated": self.truncated,
+			"error": self.error,
+			"results": self.results[since:]
+		}
+
+# content search over archived or staged assets
+#
+# assets are split into chunks (neighbours in the same archive, so every
+# worker reads its part sequentially) and searched in a processes pool;
+# results are collected as chunks complete, and UI polls for new ones
+
+class Search(object):
+	def __init__(self, state):
+		self.state = state
+		self.job = None
+		self.lock = threading.Lock()
+
+	# API
+
+	def make_api_routes(self, app):
+		make_post_json_route(app, "/api/search", self.search)
+		make_post_json_route(app, "/api/search/status", self.get_status)
+		make_post_json_route(app, "/api/search/cancel", self.cancel)
+
+	def search(self):
+		rq = flask.request
+		mode = get_field(rq.form, "mode")
+		pattern = get_field(rq.form, "pattern")
+		stage = get_field(rq.form, "stage")
+		path = get_field(rq.form, "path")
+		recursive = (rq.form.get("recursive", "true") == "true")
+		return {"job": self.start_search(mode, pattern, stage, path, recursive)}
+
+	def get_status(self):
+		since = int(flask.request.form.get("since", "0")) # results UI already has
+		job = self.job
+		return {"job": None if job is None else job.get_status(since)}
+
+	def cancel(self):
+		job = self.job
+		if job is not None:
+			job.cancelled = True
+		return {"job": None if job is None else job.get_status(len(job.results))}
+
+	# internal
+
+	def start_search(self, mode, pattern, stage, path, recursive):
+		query = dat1lib.search.Query(mode, pattern, dat1lib.VERSION_OVERRIDE)
+
+		with self.lock:
+			if self.job is not None and self.job.running:
+				self.job.cancelled = True
+
+			job = SearchJob(mode, pattern, stage, path, recursive)
+			self.job = job
+
+		t = threading.Thread(target=self._search, args=(job, query), daemon=True)
+		t.start()
+		return job.get_status()
+
+	def _search(self, job, query):
+		try:
+			if job.stage != "":
+				tasks = self._get_staged_tasks(job, query)
+			else:
+				tasks = self._get_archived_tasks(job, query)
+
+			with concurrent.futures.ProcessPoolExecutor(max_workers=SEARCH_PROCESSES, mp_context=multiprocessing.get_context("spawn")) as pool:
+				futures = {}
+				for fn, args, keys in tasks:
+					futures[pool.submit(fn, *args)] = keys
+
+				for future in concurrent.futures.as_completed(futures):
+					keys = futures[future]
+					job.done += len(keys)
+
+					if job.cancelled:
+						for f in futures:
+							f.cancel()
+						break
+
+					try:
+						for key, tag, offset, where in future.result():
+							if len(job.results) >= SEARCH_MAX_RESULTS:
+								job.truncated = True
+								break
+
+							locator, path = keys[key]
+							job.results.append({
+								"locator": locator,
+								"path": path,
+								"tag": None if tag is None else "{:08X}".format(tag),
+								"offset": offset,
+								"where": where
+							})
+					except:
+						print(traceback.format_exc())
+
+					if job.truncated:
+						job.cancelled = True
+		except Exception as e:
+			print(traceback.format_exc())
+			job.error = "{}".format(e)
+
+		job.running = False
+
+	def _get_archived_tasks(self, job, query): # => [(worker function, args, {key: (locator, path)})]
+		toc_loader = self.state.toc_loader
+		toc = toc_loader.toc
+		if toc is None:
+			raise Exception("No toc loaded")
+
+		rcra = isinstance(toc, dat1lib.types.toc2.TOC2)
+
+		aids = self._get_archived_aids(job.path, job.recursive)
+
+		keys = {}
+		by_archive = {}
+		for aid in aids:
+			locators = self.state.get_asset_variants_locators("", aid)
+			if len(locators) == 0:
+				continue
+
+			try:
+				locator = self.state.locator(locators[0])
+				entry = toc.get_asset_entry_by_index(self.state._get_archived_asset_index(locator))
+			except:
+				continue
+
+			keys[entry.asset_id] = (locators[0], toc_loader._known_paths.get(aid))
+			if entry.archive not in by_archive:
+				by_archive[entry.archive] = []
+			by_archive[entry.archive] += [entry]
+
+		tasks = []
+		for archive_index in by_archive:
+			archive_fn = toc.get_archive_path(archive_index)
+			entries = sorted(by_archive[archive_index], key=lambda e: e.offset)
+			for i in range(0, len(entries), SEARCH_CHUNK):
+				chunk = entries[i:i+SEARCH_CHUNK]
+				tasks += [(dat1lib.search.search_archive_chunk, (rcra, archive_fn, chunk, query), {e.asset_id: keys[e.asset_id] for e in chunk})]
+
+		job.total = len(keys)
+		return tasks
+
+	def _get_archived_aids(self, path, recursive):
+		toc_loader = self.state.toc_loader
+		node = toc_loader.tree
+		for p in path.split("/"):
+			if p == "":
+				continue
+			if p not in node or not isinstance(node[p], dict):
+				return []
+			node = node[p]
+
+		aids = []
+		nodes = [node]
+		while len(nodes) > 0:
+			node = nodes.pop()
+			for k in node:
+				if isinstance(node[k], list):
+					aids += [node[k][0]]
+				elif recursive:
+					nodes += [node[k]]
+
+		if recursive and path.strip("/") == "":
+			aids += list(toc_loader.hashes.keys()) # assets with unknown paths aren't in the tree
+
+		return aids
+
+	def _get_staged_tasks(self, job, query): # => [(worker function, args, {key: (locator, path)})]
+		stage, _ = self.state.stages.get_stage(job.stage, create_if_needed=False)
+		if stage is None:
+			raise Exception("Bad stage")
+
+		prefix = job.path.strip("/")
+		if prefix != "":
+			prefix += "/"
+
+		keys = {}
+		files = []
+		for span_name, aid_fn, _, full_fn, _, _ in stage.indexer.iterate_file_paths():
+			if not aid_fn.startswith(prefix):
+				continue
+			if not job.recursive and "/" in aid_fn[len(prefix):]:
+				continue
+
+			key = len(files)
+			keys[key] = ("{}/{}/{}".format(job.stage, span_name, aid_fn), aid_fn)
+			files += [(key, full_fn)]
+
+		tasks = []
+		for i in range(0, len(files), SEARCH_CHUNK):
+			chunk = files[i:i+SEARCH_CHUNK]
+			tasks += [(dat1lib.search.search_files_chunk, (chunk, query), {k: keys[k] for k, _ in chunk})]
+
+		job.total = len(files)
+		return tasks
@@ -6,6 +6,7 @@
 import flask
 from server.api_utils import get_field, make_get_json_route, make_post_json_route
 
+import dat1lib.extraction
 import io
 import os
 import os.path
@@ -43,9 +44,10 @@ class Stages(object):
 		make_get_json_route(app, "/api/stages/exported_suit", self.get_exported_suit, False)
 
 	def refresh_stages(self):
-		self.reboot()
-		self.boot()
-		return self.get_boot_info()
+		changes = self.refresh()
+		result = self.get_boot_info()
+		result["changes"] = changes
+		return result
 
 	def open_explorer(self):
 		stage = get_field(flask.request.form, "stage")
@@ -103,6 +105,30 @@ class Stages(object):
 
 		self.suit_exporter.boot()
 
+	def refresh(self): # => {stage: {"added": [locator], "removed": [locator], "modified": [locator]}}
+		os.makedirs("stages/", exist_ok=True)
+
+		changes = {}
+		present = set()
+		for fn in os.listdir("stages/"):
+			full_fn = os.path.join("stages/", fn)
+			if not os.path.isdir(full_fn):
+				continue
+
+			present.add(fn)
+			if fn in self.stages:
+				changes[fn] = self.stages[fn].reload()
+			else:
+				self.stages[fn] = Stage(full_fn)
+				changes[fn] = self.stages[fn].last_changes
+
+		for fn in list(self.stages.keys()):
+			if fn not in present:
+				changes[fn] = self.stages[fn].indexer.get_all_changes_as_removed()
+				del self.stages[fn]
+
+		return changes
+
 	def get_asset_variants_locators(self, stage, aid):
 		if stage not in self.stages:
 			raise Exception("Bad stage")
@@ -237,14 +263,40 @@ class Stages(object):
 
 		results = {}
 		if node is not None:
+			toc = self.state.toc_loader.toc
+			dst_stage_object, _ = self.get_stage(dst_stage)
+
+			targets = {} # asset index -> (aid, path, span)
+			entries = []
 			for k in node:
 				if isinstance(node[k], list):
 					aid = node[k][0]
+					path = self.state.toc_loader._known_paths.get(aid, aid)
+					results[aid] = True
 					try:
-						results[aid] = self._stage_asset(dst_stage, "/0/" + aid, True)
+						for l in self.state.get_asset_variants_locators("", aid):
+							locator = self.state.locator(l)
+							i = self.state._get_archived_asset_index(locator)
+							entry = toc.get_asset_entry_by_index(i)
+							if entry is None:
+								print("[!] No toc entry #{} for {}, not staging it".format(i, aid))
+								results[aid] = False
+								continue
+							entries += [entry]
+							targets[i] = (aid, path, locator.span)
 					except:
 						results[aid] = False
 
+			# assets are extracted in archives order rather than tree order, so reading is sequential
+			for entry, data in dat1lib.extraction.ExtractionScheduler(toc).extract(entries):
+				aid, path, span = targets[entry.index]
+				try:
+					if data is None:
+						raise Exception("Couldn't extract {}".format(aid))
+					dst_stage_object.stage_asset_data(path, span, data)
+				except:
+					results[aid] = False
+
 		return {"success": True, "assets": results}
 
 	#
@@ -0,0 +1,198 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import dat1lib.crc64 as crc64
+import collections
+import json
+import os
+import os.path
+import re
+import struct
+import traceback
+
+INDEX_VERSION = 2
+INDEXES_DIR = ".cache/stages/"
+
+HEX_NAME_RE = re.compile("^[A-Fa-f0-9]{16}$")
+
+def normalize_path(path):
+	return path.lower().replace('\\', '/').strip()
+
+def get_asset_path(current_dir, fn): # => (aid_fn, aid)
+	if current_dir == "" and len(fn) == 16 and HEX_NAME_RE.match(fn):
+		aid_fn = fn.upper() # TODO: reassess; this makes it uppercase to be displayed in UI, but on a case-sensitive FS we won't find this file if it happens to be not in uppercase
+		return (aid_fn, aid_fn)
+
+	aid_fn = normalize_path(os.path.join(current_dir, fn))
+	return (aid_fn, "{:016X}".format(crc64.hash(aid_fn)))
+
+def read_file_magic(fn):
+	try:
+		with open(fn, "rb") as f:
+			return struct.unpack("<I", f.read(4))[0]
+	except:
+		return None
+
+# keeps a persistent listing of stage's files
+#
+# index format:
+#   spans: {span_name: {dir_rel_path: {"mtime": ns, "dirs": [name], "files": {name: [aid_fn, aid, size, mtime_ns, magic]}}}}
+#
+# directory mtime changes only when entries are added, removed or renamed,
+# so unchanged directories reuse cached names and hashes, and their files
+# are only stat'ed to see whether their contents were modified
+#
+# magic (first 4 bytes of the file, asset's type) is read again only for
+# new or modified files, so filtering assets by type is an index query
+
+class StageIndexer(object):
+	def __init__(self, stage_path):
+		self.stage_path = stage_path
+		self.index_path = os.path.join(INDEXES_DIR, os.path.basename(os.path.normpath(stage_path)) + ".json")
+		self.spans = {}
+		self._load()
+
+	def scan(self): # => changes
+		old_spans = self.spans
+		new_spans = {}
+
+		for span_name in os.listdir(self.stage_path):
+			full_fn = os.path.join(self.stage_path, span_name)
+			if os.path.isdir(full_fn):
+				new_spans[span_name] = self._scan_span(full_fn, old_spans.get(span_name, {}))
+
+		changes = self._get_changes(old_spans, new_spans)
+		self.spans = new_spans
+		if old_spans != new_spans:
+			self._save()
+		return changes
+
+	def iterate_files(self): # => (span_name, aid_fn, aid, size, magic)
+		for span_name in self.spans:
+			for current_dir, entry in self.spans[span_name].items():
+				for fn, (aid_fn, aid, size, mtime, magic) in entry["files"].items():
+					yield (span_name, aid_fn, aid, size, magic)
+
+	def iterate_file_paths(self): # => (span_name, aid_fn, aid, full_fn, size, mtime_ns)
+		for span_name in self.spans:
+			for current_dir, entry in self.spans[span_name].items():
+				for fn, (aid_fn, aid, size, mtime, magic) in entry["files"].items():
+					yield (span_name, aid_fn, aid, os.path.join(self.stage_path, span_name, current_dir, fn), size, mtime)
+
+	def get_all_changes_as_removed(self):
+		return self._get_changes(self.spans, {})
+
+	#
+
+	def _scan_span(self, path, old_dirs):
+		new_dirs = {}
+
+		queue = collections.deque([""])
+		while len(queue) > 0:
+			current_dir = queue.popleft()
+			full_dir = os.path.join(path, current_dir)
+
+			try:
+				mtime = os.stat(full_dir).st_mtime_ns
+			except OSError:
+				continue
+
+			cached = old_dirs.get(current_dir)
+			if cached is not None and cached["mtime"] == mtime:
+				entry = self._restat_dir(full_dir, cached)
+			else:
+				entry = self._scan_dir(full_dir, current_dir, mtime, cached)
+
+			new_dirs[current_dir] = entry
+			for d in entry["dirs"]:
+				queue.append(os.path.join(current_dir, d))
+
+		return new_dirs
+
+	def _restat_dir(self, full_dir, cached):
+		files = {}
+		for fn, (aid_fn, aid, size, mtime, magic) in cached["files"].items():
+			full_fn = os.path.join(full_dir, fn)
+			try:
+				st = os.stat(full_fn)
+			except OSError:
+				continue
+			if st.st_size != size or st.st_mtime_ns != mtime:
+				magic = read_file_magic(full_fn)
+			files[fn] = [aid_fn, aid, st.st_size, st.st_mtime_ns, magic]
+
+		return {"mtime": cached["mtime"], "dirs": cached["dirs"], "files": files}
+
+	def _scan_dir(self, full_dir, current_dir, mtime, cached):
+		old_files = cached["files"] if cached is not None else {}
+
+		dirs = []
+		files = {}
+		with os.scandir(full_dir) as it:
+			for e in it:
+				if e.is_dir():
+					dirs += [e.name]
+					continue
+
+				st = e.stat()
+				old = old_files.get(e.name)
+				if old is not None:
+					aid_fn, aid, size, mtime, magic = old
+					if st.st_size != size or st.st_mtime_ns != mtime:
+						magic = read_file_magic(e.path)
+				else:
+					aid_fn, aid = get_asset_path(current_dir, e.name)
+					magic = read_file_magic(e.path)
+				files[e.name] = [aid_fn, aid, st.st_size, st.st_mtime_ns, magic]
+
+		return {"mtime": mtime, "dirs": dirs, "files": files}
+
+	def _get_changes(self, old_spans, new_spans):
+		def flatten(spans):
+			result = {}
+			for span_name in spans:
+				for current_dir, entry in spans[span_name].items():
+					for fn, (aid_fn, aid, size, mtime, magic) in entry["files"].items():
+						result[(span_name, aid_fn)] = (size, mtime)
+			return result
+
+		old_files = flatten(old_spans)
+		new_files = flatten(new_spans)
+
+		added, removed, modified = [], [], []
+		for k in new_files:
+			if k not in old_files:
+				added += [k]
+			elif old_files[k] != new_files[k]:
+				modified += [k]
+		for k in old_files:
+			if k not in new_files:
+				removed += [k]
+
+		def to_locators(keys):
+			return ["{}/{}".format(span_name, aid_fn) for span_name, aid_fn in sorted(keys)]
+
+		return {"added": to_locators(added), "removed": to_locators(removed), "modified": to_locators(modified)}
+
+	#
+
+	def _load(self):
+		try:
+			with open(self.index_path, "r") as f:
+				index = json.load(f)
+			if index.get("version") == INDEX_VERSION and index.get("path") == self.stage_path:
+				self.spans = index["spans"]
+		except:
+			self.spans = {}
+
+	def _save(self):
+		try:
+			os.makedirs(INDEXES_DIR, exist_ok=True)
+			tmp_path = self.index_path + ".tmp"
+			with open(tmp_path, "w") as f:
+				json.dump({"version": INDEX_VERSION, "path": self.stage_path, "spans": self.spans}, f)
+			os.replace(tmp_path, self.index_path)
+		except:
+			print(traceback.format_exc())
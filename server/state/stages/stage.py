@@ -3,55 +3,34 @@
 # For more details, terms and conditions, see GNU General Public License.
 # A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
 
-import dat1lib.crc64 as crc64
 import os
 import os.path
-import re
 
-def normalize_path(path):
-	return path.lower().replace('\\', '/').strip()
+from server.state.stages.indexer import StageIndexer
 
 class Stage(object):
 	def __init__(self, path):
 		self.path = path
-		self.reload()
+		self.indexer = StageIndexer(path)
+		self.generation = 0
+		self.last_changes = self.reload()
+
+	def reload(self): # => changes
+		changes = self.indexer.scan()
+		self.generation += 1 # lets other parts know their stage-dependent caches are outdated
 
-	def reload(self):
 		self.tree = {}
 		self.aid_to_path = {}
-		self.spans = []
+		self.spans = list(self.indexer.spans.keys())
 
-		for fn in os.listdir(self.path):
-			full_fn = os.path.join(self.path, fn)
-			if os.path.isdir(full_fn):
-				self.add_span(fn, full_fn)
+		for span_name, aid_fn, aid, size, magic in self.indexer.iterate_files():
+			self._insert_path(aid_fn, aid)
+			asset_info = [span_name, 0, size]
+			self._add_index_to_tree(aid, asset_info)
 
-	#
+		return changes
 
-	def add_span(self, span_name, path):
-		self.spans += [span_name]
-
-		dirs = [""]
-		while len(dirs) > 0:
-			current_dir = dirs[0]
-			dirs = dirs[1:]
-
-			full_dir = os.path.join(path, current_dir)
-			for fn in os.listdir(full_dir):
-				full_fn = os.path.join(full_dir, fn)
-				aid_fn = os.path.join(current_dir, fn)
-				if os.path.isdir(full_fn):
-					dirs += [aid_fn]
-				else:
-					if current_dir == "" and len(fn) == 16 and re.match("^[A-Fa-f0-9]{16}$", fn):
-						aid_fn = fn.upper() # TODO: reassess; this makes it uppercase to be displayed in UI, but on a case-sensitive FS we won't find this file if it happens to be not in uppercase
-						aid = aid_fn
-					else:
-						aid_fn = normalize_path(aid_fn)
-						aid = "{:016X}".format(crc64.hash(aid_fn))
-					self._insert_path(aid_fn, aid)
-					asset_info = [span_name, 0, os.path.getsize(full_fn)]
-					self._add_index_to_tree(aid, asset_info)
+	#
 
 	def _insert_path(self, path, aid):
 		if aid in self.aid_to_path:
@@ -120,6 +99,20 @@ class Stage(object):
 				results += ["{}/{}/{}".format(stage_name, s, path)]
 		return results
 
+	def find_assets_by_magic(self, stage_name, magics, path="", recursive=True): # => [locator]
+		prefix = path.strip("/")
+		if prefix != "":
+			prefix += "/"
+
+		results = []
+		for span_name, aid_fn, aid, size, magic in self.indexer.iterate_files():
+			if magic not in magics or not aid_fn.startswith(prefix):
+				continue
+			if not recursive and "/" in aid_fn[len(prefix):]:
+				continue
+			results += ["{}/{}/{}".format(stage_name, span_name, aid_fn)]
+		return results
+
 	def get_assets_under_path(self, state, stage_name, path):
 		parts = path.split("/")
 
@@ -77,31 +77,16 @@ class StagesSuitExporter(object):
 
 	def scan_for_assets(self, stage_object, stage_name, needles):
 		results = {}
-		needle_magics = set()
 		for k in needles:
 			results[k] = []
-			for m in needles[k]:
-				needle_magics.add(m)
-
-		for aid in stage_object.aid_to_path:
-			path = stage_object.aid_to_path[aid]
-			for s in stage_object.spans:
-				full_fn = os.path.join(stage_object.path, s, path)
-				if not os.path.isfile(full_fn):
-					continue
-
-				magic = self.get_file_magic(full_fn)
-				if magic is None or magic not in needle_magics:
-					continue
 
-				locator = "{}/{}/{}".format(stage_name, s, path)
+			# stage's index knows every file's magic, so only matching assets get read
+			for locator in stage_object.find_assets_by_magic(stage_name, set(needles[k])):
 				_, asset = self.stages.state.get_asset(locator)
 				if asset is None:
 					continue
 
-				for k in needles:
-					if magic in needles[k]:
-						results[k] += [(locator, asset)]
+				results[k] += [(locator, asset)]
 
 		return results
 
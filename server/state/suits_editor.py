@@ -30,116 +30,42 @@ VANITYMASTERLISTLAUNCH_CONFIG_AID = 0x939887A999564798 # configs/vanitymasterlis
 
 #
 
+import dat1lib.deflate
 import dat1lib.types.toc
-import dat1lib.types.sections.toc.archives
-import dat1lib.types.sections.toc.asset_ids
-import dat1lib.types.sections.toc.mod0
-import dat1lib.types.sections.toc.offsets
-import dat1lib.types.sections.toc.sizes
-import dat1lib.types.sections.toc.spans
-
-SECTION_ARCHIVES_MAP = dat1lib.types.sections.toc.archives.ArchivesSection.TAG
-SECTION_ASSET_IDS = dat1lib.types.sections.toc.asset_ids.AssetIdsSection.TAG
-SECTION_OFFSET_ENTRIES = dat1lib.types.sections.toc.offsets.OffsetsSection.TAG
-SECTION_SIZE_ENTRIES = dat1lib.types.sections.toc.sizes.SizesSection.TAG
-SECTION_SPAN_ENTRIES = dat1lib.types.sections.toc.spans.SpansSection.TAG
+
+# suits get reinstalled a lot while being made, so 'toc' is saved faster
+# (on all cores, at cost of slightly bigger file); use LEVEL_MAX for release
+TOC_COMPRESSION_LEVEL = dat1lib.deflate.LEVEL_FAST
+TOC_COMPRESSION_THREADS = None
 
 _install_suit_log = None
 
-def new_archive(toc, fn):
+def new_archive(transaction, fn):
 	global _install_suit_log
 
-	s = toc.dat1.get_section(SECTION_ARCHIVES_MAP)
-	for i, a in enumerate(s.archives):
-		ndx = len(a.filename)
-		for j in range(len(a.filename)):
-			if a.filename[j] == 0:
-				ndx = j
-				break
-
-		arch_fn = a.filename[:ndx].decode('ascii')
-		if arch_fn == fn:
-			return i
+	i = transaction.find_archive(fn)
+	if i != -1:
+		return i
 
 	# _install_suit_log += "- added new archive entry '{}'\n".format(fn)
 	_install_suit_log += "- '{}' archive entry added\n".format(fn)
-	s.archives += [dat1lib.types.sections.toc.archives.ArchiveFileEntry.make(0, 10000 + len(s.archives), fn)]
-	toc.dat1.refresh_section_data(SECTION_ARCHIVES_MAP)
-	return len(s.archives)-1
+	return transaction.add_archive(fn)
 
-def add_or_reroute_asset(toc, asset_id, archive_offset, asset_size, archive_index, span_to_append_to, fail_if_not_found=False):
+def add_or_reroute_asset(transaction, asset_id, archive_offset, asset_size, archive_index, span_to_append_to, fail_if_not_found=False):
 	global _install_suit_log
 
-	assets = toc.dat1.get_section(SECTION_ASSET_IDS)
-	sizes = toc.dat1.get_section(SECTION_SIZE_ENTRIES)
-	offsets = toc.dat1.get_section(SECTION_OFFSET_ENTRIES)
-
-	def find_asset_index(needle): # linear search =\
-		for i, aid in enumerate(assets.ids):
-			if aid == needle:
-				return i
-		return -1
-
-	asset_index = find_asset_index(asset_id) # TODO: search within specified span?
-	if asset_index == -1:
-		if fail_if_not_found:
-			raise Exception("Asset {:016X} not found".format(asset_id))
-
-		spans = toc.dat1.get_section(SECTION_SPAN_ENTRIES)
-		span = spans.entries[span_to_append_to]
-		asset_index = span.asset_index + span.count
-
-		spans.entries[span_to_append_to].count += 1
-		for i in range(span_to_append_to+1, len(spans.entries)):
-			spans.entries[i].asset_index += 1
-
-		assets.ids = assets.ids[:asset_index] + [asset_id] + assets.ids[asset_index:]
-		sizes.entries = sizes.entries[:asset_index] + [dat1lib.types.sections.toc.sizes.SizeEntry(struct.pack("<III", 1, 0, asset_index))] + sizes.entries[asset_index:] # updated lower
-		offsets.entries = offsets.entries[:asset_index] + [dat1lib.types.sections.toc.offsets.OffsetEntry(struct.pack("<II", 0, 0))] + offsets.entries[asset_index:] # updated lower
-
-		toc.dat1.refresh_section_data(SECTION_SPAN_ENTRIES)
-		toc.dat1.refresh_section_data(SECTION_ASSET_IDS)
+	if fail_if_not_found and not transaction.has_asset(asset_id): # TODO: search within specified span?
+		raise Exception("Asset {:016X} not found".format(asset_id))
 
+	if transaction.add_or_reroute(asset_id, archive_index, archive_offset, asset_size, span_to_append_to):
 		# _install_suit_log += "- added asset '{:016X}'\n".format(asset_id)
 		_install_suit_log += "- '{:016X}' asset added\n".format(asset_id)
 	else:
 		# _install_suit_log += "- updated asset '{:016X}'\n".format(asset_id)
 		_install_suit_log += "- '{:016X}' asset updated\n".format(asset_id)
 
-	sizes.entries[asset_index].value = asset_size
-	offsets.entries[asset_index].archive_index = archive_index
-	offsets.entries[asset_index].offset = archive_offset
-
-	toc.dat1.refresh_section_data(SECTION_SIZE_ENTRIES)
-	toc.dat1.refresh_section_data(SECTION_OFFSET_ENTRIES)
-
-def reroute_asset(toc, asset_id, archive_offset, asset_size, archive_index):
-	add_or_reroute_asset(toc, asset_id, archive_offset, asset_size, archive_index, 0, True)
-
-def sort_assets(toc):
-	assets = toc.dat1.get_section(SECTION_ASSET_IDS)
-	sizes = toc.dat1.get_section(SECTION_SIZE_ENTRIES)
-	offsets = toc.dat1.get_section(SECTION_OFFSET_ENTRIES)
-	spans = toc.dat1.get_section(SECTION_SPAN_ENTRIES)
-
-	for span in spans.entries:
-		span_range = range(span.asset_index, span.asset_index + span.count)
-
-		vals = [(assets.ids[i], sizes.entries[i], offsets.entries[i]) for i in span_range]
-		vals = sorted(vals, key=lambda x: x[0])
-
-		for i in span_range:
-			v = vals[i - span.asset_index]
-			assets.ids[i] = v[0]
-			sizes.entries[i] = v[1]
-			offsets.entries[i] = v[2]
-
-	for i in range(len(assets.ids)):
-		sizes.entries[i].index = i
-
-	toc.dat1.refresh_section_data(SECTION_SIZE_ENTRIES)
-	toc.dat1.refresh_section_data(SECTION_OFFSET_ENTRIES)
-	toc.dat1.refresh_section_data(SECTION_ASSET_IDS)
+def reroute_asset(transaction, asset_id, archive_offset, asset_size, archive_index):
+	add_or_reroute_asset(transaction, asset_id, archive_offset, asset_size, archive_index, 0, True)
 
 #
 
@@ -311,11 +237,14 @@ class SuitsEditor(object):
 
 		_install_suit_log += "'toc':\n"
 
+		toc = self.state.toc_loader.toc
+		transaction = dat1lib.types.toc.TocTransaction(toc) # all changes are applied at once, before saving
+
 		os.makedirs(os.path.join(self.state.toc_loader.toc._archives_dir, "Suits"), exist_ok=True)
-		self._reroute_asset_via_new_archive(SYSTEM_PROGRESSION_CONFIG_AID, progression, "Suits\\base1")
-		self._reroute_asset_via_new_archive(MASTERITEMLOADOUTLIST_CONFIG_AID, loadout_list, "Suits\\base2")
-		self._reroute_asset_via_new_archive(VANITYMASTERLIST_CONFIG_AID, vanity_list, "Suits\\base3")
-		self._reroute_asset_via_new_archive(VANITYMASTERLISTLAUNCH_CONFIG_AID, vanity_list_launch, "Suits\\base4")
+		self._reroute_asset_via_new_archive(transaction, SYSTEM_PROGRESSION_CONFIG_AID, progression, "Suits\\base1")
+		self._reroute_asset_via_new_archive(transaction, MASTERITEMLOADOUTLIST_CONFIG_AID, loadout_list, "Suits\\base2")
+		self._reroute_asset_via_new_archive(transaction, VANITYMASTERLIST_CONFIG_AID, vanity_list, "Suits\\base3")
+		self._reroute_asset_via_new_archive(transaction, VANITYMASTERLISTLAUNCH_CONFIG_AID, vanity_list_launch, "Suits\\base4")
 
 		#
 
@@ -326,8 +255,7 @@ class SuitsEditor(object):
 
 		#
 
-		toc = self.state.toc_loader.toc
-		archive_index = new_archive(toc, suit_archive)
+		archive_index = new_archive(transaction, suit_archive)
 
 		SIZE = 21
 		count = len(info) // SIZE
@@ -335,10 +263,10 @@ class SuitsEditor(object):
 
 		for e in entries:
 			off, _, sz, aid, span_to_append_to = e
-			add_or_reroute_asset(toc, aid, off, sz, archive_index, span_to_append_to)
+			add_or_reroute_asset(transaction, aid, off, sz, archive_index, span_to_append_to)
 			# TODO: update toc_loader's internals as well
 
-		sort_assets(toc)
+		transaction.commit()
 
 		#
 
@@ -351,7 +279,7 @@ class SuitsEditor(object):
 		#
 
 		with open(self.state.toc_loader.toc_path, "wb") as f:
-			toc.save(f)
+			toc.save(f, TOC_COMPRESSION_LEVEL, TOC_COMPRESSION_THREADS)
 
 		self.state.toc_loader.reboot() # TODO: update toc_loader's internals instead of requiring reload
 		_install_suit_log += "\nDone. Reload required to see changes in 'toc'.\n"
@@ -502,7 +430,7 @@ class SuitsEditor(object):
 			# _install_suit_log += "- reference to '{:016X}' ('{}') already present\n".format(aid, path)
 			_install_suit_log += "- '{:016X}' already in references\n".format(aid)
 
-	def _reroute_asset_via_new_archive(self, aid, asset, archive_name):
+	def _reroute_asset_via_new_archive(self, transaction, aid, asset, archive_name):
 		# save file
 
 		asset_size = None
@@ -513,9 +441,8 @@ class SuitsEditor(object):
 
 		# add (or update) toc's archive entry & asset entry
 
-		toc = self.state.toc_loader.toc
-		archive_index = new_archive(toc, archive_name)
+		archive_index = new_archive(transaction, archive_name)
 		
-		reroute_asset(toc, aid, 0, asset_size, archive_index)
+		reroute_asset(transaction, aid, 0, asset_size, archive_index)
 
 		# TODO: update toc_loader's internals as well
@@ -5,10 +5,12 @@
 
 import flask
 from server.api_utils import get_int, get_field, make_get_json_route, make_post_json_route
+from server.state.caches.textures import PNG_COMPRESS_LEVEL
 
 import dat1lib.types.autogen
 import dat1lib.types.so
 import dat1lib.types.sections.texture.header
+import dat1lib.bcn as bcn
 import dat1lib.decompression as decompression
 import io
 import os
@@ -18,15 +20,23 @@ import struct
 import subprocess
 import threading
 import traceback
+import zlib
 from PIL import Image
 
 DEBUG_DDS = False
+MAX_TEXCONV_PROCESSES = max(2, (os.cpu_count() or 1) // 2)
+
+MIPMAP_FORMATS = {
+	"png": "image/png", # cached file as is
+	"webp": "image/webp", # lossless
+	"rgba": "application/octet-stream" # b"RGBA", <II width and height, then raw 8-bit RGBA pixels
+}
 
 class Textures(object):
 	def __init__(self, state):
 		self.state = state
 		self.has_texconv = False
-		self.texconv_lock = threading.Lock()
+		self.texconv_semaphore = threading.BoundedSemaphore(MAX_TEXCONV_PROCESSES)
 
 	# API
 
@@ -42,7 +52,8 @@ class Textures(object):
 		rq = flask.request
 		locator = get_field(rq.args, "locator")
 		mmi = get_int(rq.args, "mipmap_index")
-		return self.get_texture_mipmap(locator, mmi)
+		fmt = rq.args.get("format", "png")
+		return self.get_texture_mipmap(locator, mmi, fmt)
 
 	# internal
 
@@ -70,14 +81,58 @@ class Textures(object):
 
 		return {"mipmaps": mipmaps}
 
-	def get_texture_mipmap(self, locator, mipmap_index):
-		img = self.load_mipmap_image(locator, mipmap_index)
+	def get_texture_mipmap(self, locator, mipmap_index, fmt="png"):
+		if fmt not in MIPMAP_FORMATS:
+			raise Exception("Unknown format '{}'".format(fmt))
+
+		path, img = self.state.caches.get_texture_mipmap_entry(locator, mipmap_index, True)
+		if img is None:
+			raise Exception("Couldn't load mipmap #{}".format(mipmap_index))
+
+		# file could've been uncached already, so open it right away and fall back to encoding image if it's gone
+
+		f = None
+		etag = None
+		try:
+			f = open(path, "rb")
+			st = os.fstat(f.fileno())
+			etag = "{:08X}{:08X}".format(zlib.crc32("{}|{}|{}".format(path, st.st_mtime_ns, st.st_size).encode('utf-8')), zlib.crc32(fmt.encode('utf-8')))
+		except:
+			pass
+
+		if etag is not None and etag in flask.request.if_none_match:
+			f.close()
+			r = flask.Response(status=304)
+		else:
+			if fmt != "png" or f is None:
+				if f is not None:
+					f.close()
+				f = io.BytesIO(self._encode_mipmap(img, fmt))
+
+			r = flask.send_file(f, mimetype=MIPMAP_FORMATS[fmt])
+
+		if etag is not None:
+			r.set_etag(etag)
+			r.headers["Cache-Control"] = "private, no-cache" # revalidate with ETag instead of downloading again
+
+		return r
 
+	def _encode_mipmap(self, img, fmt):
 		f = io.BytesIO()
-		img.save(f, format="png")
+
+		if fmt == "png":
+			img.save(f, format="png", compress_level=PNG_COMPRESS_LEVEL)
+		elif fmt == "webp":
+			img.save(f, format="webp", lossless=True, method=0)
+		elif fmt == "rgba":
+			if img.mode != "RGBA":
+				img = img.convert("RGBA")
+			w, h = img.size
+			f.write(struct.pack("<4sII", b"RGBA", w, h))
+			f.write(img.tobytes())
+
 		f.seek(0)
-			
-		return (flask.send_file(f, mimetype='image/png'), 200)
+		return f.read()
 
 	def load_mipmap_image(self, locator, mipmap_index, use_hd_data=True):
 		return self.state.caches.get_texture_mipmap(locator, mipmap_index, use_hd_data)
@@ -97,6 +152,11 @@ class Textures(object):
 			return new.join(fn.rsplit(old, 1))
 
 		try:
+			if not self.has_texconv:
+				image = self._decode_to_image(texture_asset, hd_data, mipmap_index)
+				if image is not None:
+					return (False, image)
+
 			dds_data = self._make_dds_data(texture_asset, hd_data, mipmap_index)
 			if dds_data is None:
 				return (False, None)
@@ -105,11 +165,11 @@ class Textures(object):
 				image = Image.open(io.BytesIO(dds_data))
 				return (False, image)
 
-			with self.texconv_lock:
+			with self.texconv_semaphore:
 				save_png = True
 				if save_as is None:
 					save_png = False
-					save_as = ".cache/mipmap.png"
+					save_as = ".cache/mipmap_{}.png".format(threading.get_ident()) # several conversions can run at once
 
 				dds_fn = _extension_replace(save_as, ".png", ".dds")
 				wd = os.path.dirname(dds_fn)
@@ -146,7 +206,62 @@ class Textures(object):
 			
 		return (False, None)
 
+	def decode_mipmap(self, texture_asset, hd_data, mipmap_index): # -> (h, w, 4) RGBA ndarray
+		mipmap = self._get_mipmap_data(texture_asset, hd_data, mipmap_index)
+		if mipmap is None:
+			return None
+
+		w, h, fmt, pixels = mipmap
+		return bcn.decode(pixels, w, h, fmt)
+
+	def _decode_to_image(self, texture_asset, hd_data, mipmap_index):
+		# built-in decoder, so texconv.exe is not needed; None if format is not supported, so PIL could try instead
+		mipmap = self._get_mipmap_data(texture_asset, hd_data, mipmap_index)
+		if mipmap is None:
+			return None
+
+		w, h, fmt, pixels = mipmap
+		if not bcn.is_supported(fmt):
+			return None
+
+		return Image.fromarray(bcn.decode(pixels, w, h, fmt), "RGBA")
+
 	def _make_dds_data(self, texture_asset, hd_data, mipmap_index):
+		mipmap = self._get_mipmap_data(texture_asset, hd_data, mipmap_index)
+		if mipmap is None:
+			return None
+
+		w, h, fmt, pixels = mipmap
+
+		dds_data = b"\x44\x44\x53\x20\x7C\x00\x00\x00\x07\x10\x0A\x00"
+		dds_data += struct.pack("<II", h, w)
+
+		# pitch / depth / mipmaps
+		# pitch value is "unreliable", as specified in https://learn.microsoft.com/en-us/windows/win32/direct3ddds/dx-graphics-dds-pguide, so I'm computing it badly
+		pitch = (w * 32 + 7) // 8
+		dds_data += struct.pack("<III", pitch, 0, 0)
+
+		# reserved: 11 uint32s
+		dds_data += b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+		# pixelformat: size / flags / fourcc / bitcount / rgba masks / dwcaps[4] / reserved
+		"""
+		DDSCAPS_COMPLEX = 0x8
+		DDSCAPS_TEXTURE = 0x1000
+		DDSCAPS_MIPMAP = 0x400000
+		"""
+		DWCAPS0 = b"\x00\x10\x00\x00" # b"\x08\x10\x40\x00"
+		dds_data += b"\x20\x00\x00\x00\x04\x00\x00\x00\x44\x58\x31\x30\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+		dds_data += DWCAPS0
+		dds_data += b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+		# dxt10: format / dimension / misc / arraysize / misc flags
+		dds_data += struct.pack("<5I", fmt, 3 if h > 1 else 2, 0, 1, 0)
+
+		dds_data += pixels
+		return dds_data
+
+	def _get_mipmap_data(self, texture_asset, hd_data, mipmap_index): # -> (w, h, fmt, pixels), pixels might contain next mipmaps as well
 		try:
 			if not isinstance(texture_asset, (dat1lib.types.autogen.Texture, dat1lib.types.so.Texture_I16, dat1lib.types.autogen.Texture3)):
 				return None
@@ -181,32 +296,6 @@ class Textures(object):
 
 			w, h = mipmaps[mipmap_index]
 
-			dds_data = b"\x44\x44\x53\x20\x7C\x00\x00\x00\x07\x10\x0A\x00"
-			dds_data += struct.pack("<II", h, w)
-
-			# pitch / depth / mipmaps
-			# pitch value is "unreliable", as specified in https://learn.microsoft.com/en-us/windows/win32/direct3ddds/dx-graphics-dds-pguide, so I'm computing it badly
-			pitch = (w * 32 + 7) // 8
-			dds_data += struct.pack("<III", pitch, 0, 0)
-
-			# reserved: 11 uint32s
-			dds_data += b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
-
-			# pixelformat: size / flags / fourcc / bitcount / rgba masks / dwcaps[4] / reserved
-			"""
-			DDSCAPS_COMPLEX = 0x8
-			DDSCAPS_TEXTURE = 0x1000
-			DDSCAPS_MIPMAP = 0x400000
-			"""
-			DWCAPS0 = b"\x00\x10\x00\x00" # b"\x08\x10\x40\x00"
-			dds_data += b"\x20\x00\x00\x00\x04\x00\x00\x00\x44\x58\x31\x30\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
-			dds_data += DWCAPS0
-			dds_data += b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
-
-			# dxt10: format / dimension / misc / arraysize / misc flags
-			dds_data += struct.pack("<5I", info.fmt, 3 if h > 1 else 2, 0, 1, 0)
-
-			pixels_written = False
 			hd_mipmaps_count = 0
 			if hd_data is not None:
 				if texture_asset.version == dat1lib.VERSION_SO:
@@ -218,26 +307,22 @@ class Textures(object):
 					for i in range(mipmap_index):
 						mw, mh = mipmaps[i]
 						offset += int(hd_bpp * mw * mh)
-					dds_data += hd_data[offset:]
-					pixels_written = True
+					return (w, h, info.fmt, hd_data[offset:])
 				else:
 					mipmap_index -= info.hd_mipmaps
 
-			if not pixels_written:
-				offset = 0x80 - 36
-				if texture_asset.version == dat1lib.VERSION_SO:
-					offset = 0
-				for i in range(mipmap_index):
-					mw, mh = mipmaps[i + hd_mipmaps_count]
-					offset += int(sd_bpp * mw * mh)
+			offset = 0x80 - 36
+			if texture_asset.version == dat1lib.VERSION_SO:
+				offset = 0
+			for i in range(mipmap_index):
+				mw, mh = mipmaps[i + hd_mipmaps_count]
+				offset += int(sd_bpp * mw * mh)
 
-				if texture_asset.version == dat1lib.VERSION_SO:
-					sd_data = decompression.decompress(texture_asset._raw_dat1, texture_asset.size + struct.unpack("<I", texture_asset.unk[:4])[0])
-					dds_data += sd_data[texture_asset.size + offset:]
-				else:
-					dds_data += texture_asset._raw_dat1[offset:]
+			if texture_asset.version == dat1lib.VERSION_SO:
+				sd_data = decompression.decompress(texture_asset._raw_dat1, texture_asset.size + struct.unpack("<I", texture_asset.unk[:4])[0])
+				return (w, h, info.fmt, sd_data[texture_asset.size + offset:])
 
-			return dds_data
+			return (w, h, info.fmt, texture_asset._raw_dat1[offset:])
 		
 		except:
 			print(traceback.format_exc())
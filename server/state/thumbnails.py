@@ -6,44 +6,189 @@
 import flask
 from server.api_utils import get_field, make_get_json_route, make_post_json_route
 
+import base64
+import concurrent.futures
+import dat1lib
+import dat1lib.extraction
 import dat1lib.types.autogen
 import dat1lib.types.so
 import io
+import json
+import math
+import multiprocessing
 import os
 import os.path
 import platform
 import struct
 import subprocess
+import threading
 import traceback
 import zlib
 from PIL import Image
 
 DEBUG_DDS = False
+METAHASHES_PATH = ".cache/thumbnails/metahashes.json"
+THUMBNAIL_SIZE = 64
+
+# TODO: make these configurable
+PRERENDER_PROCESSES = max(1, (os.cpu_count() or 2) - 1)
+PRERENDER_MAX_QUEUED = PRERENDER_PROCESSES * 4 # don't keep too much extracted data in memory
+
+def _save_thumbnail(img, fn):
+	w, h = img.size
+	max_side = w
+	if h > max_side:
+		max_side = h
+	scale = THUMBNAIL_SIZE/max_side
+	new_width = max(int(w * scale), 1)
+	new_height = max(int(h * scale), 1)
+	img = img.resize((new_width, new_height), Image.LANCZOS)
+	img.save(fn)
+
+def _render_thumbnail(data, fn, version): # runs in a worker process
+	import server.state.textures
+
+	try:
+		asset = dat1lib.read(io.BytesIO(data), try_unknown=False, version=version)
+		if not isinstance(asset, (dat1lib.types.autogen.Texture, dat1lib.types.so.Texture_I16)):
+			return False
+
+		textures = server.state.textures.Textures(None) # no texconv here, uses built-in decoder
+		_, img = textures.dds_to_png(asset, None, 0)
+		if img is None:
+			return False
+
+		_save_thumbnail(img, fn)
+		return True
+	except:
+		print(traceback.format_exc())
+
+	return False
+
+class PrerenderJob(object):
+	def __init__(self, stage, path, recursive):
+		self.stage = stage
+		self.path = path
+		self.recursive = recursive
+		self.running = True
+		self.cancelled = False
+		self.total = 0
+		self.done = 0
+		self.made = 0
+
+	def get_status(self):
+		return {
+			"stage": self.stage,
+			"path": self.path,
+			"recursive": self.recursive,
+			"running": self.running,
+			"total": self.total,
+			"done": self.done,
+			"made": self.made
+		}
 
 class Thumbnails(object):
 	def __init__(self, state):
 		self.state = state
 
+		self.metahashes = {} # staged file path -> [size, mtime_ns, crc32]
+		self.metahashes_changed = False
+		self.metahashes_lock = threading.Lock()
+
+		self.prerender_job = None
+		self.prerender_lock = threading.Lock()
+
 	# API
 
 	def make_api_routes(self, app):
 		make_post_json_route(app, "/api/thumbnails/list", self.list_thumbnails)
+		make_post_json_route(app, "/api/thumbnails/batch", self.get_batch)
 		make_get_json_route(app, "/api/thumbnails/png", self.get_png, False)
+		make_post_json_route(app, "/api/thumbnails/prerender", self.prerender)
+		make_post_json_route(app, "/api/thumbnails/prerender_status", self.get_prerender_status)
 
 	def list_thumbnails(self):
 		stage = get_field(flask.request.form, "stage")
 		path = get_field(flask.request.form, "path")
-		return {"list": self.get_thumbnails_list(stage, path)}
+		result = self.get_thumbnails_list(stage, path)
+		self._save_metahashes()
+		return {"list": result}
+
+	def get_batch(self):
+		stage = get_field(flask.request.form, "stage")
+		path = get_field(flask.request.form, "path")
+		result = self.get_thumbnails_sprite(stage, path)
+		self._save_metahashes()
+		return result
 
 	def get_png(self):
 		stage = get_field(flask.request.args, "stage")
 		aid = get_field(flask.request.args, "aid")
 		return self._get_thumbnail(stage, aid)
 
+	def prerender(self):
+		stage = get_field(flask.request.form, "stage")
+		path = get_field(flask.request.form, "path")
+		recursive = (flask.request.form.get("recursive", "false") == "true")
+		return {"job": self.start_prerender(stage, path, recursive)}
+
+	def get_prerender_status(self):
+		job = self.prerender_job
+		return {"job": None if job is None else job.get_status()}
+
 	# internal
 
 	def boot(self):
 		os.makedirs(".cache/thumbnails/", exist_ok=True)
+		self._load_metahashes()
+
+	def _load_metahashes(self):
+		with self.metahashes_lock:
+			self.metahashes = {}
+			self.metahashes_changed = False
+			try:
+				with open(METAHASHES_PATH, "r") as f:
+					self.metahashes = json.load(f)
+			except:
+				pass
+
+	def _save_metahashes(self):
+		with self.metahashes_lock:
+			if not self.metahashes_changed:
+				return
+
+			try:
+				tmp_fn = METAHASHES_PATH + ".tmp"
+				with open(tmp_fn, "w") as f:
+					json.dump(self.metahashes, f)
+				os.replace(tmp_fn, METAHASHES_PATH)
+				self.metahashes_changed = False
+			except:
+				print(traceback.format_exc())
+
+	def _get_file_checksum(self, fn):
+		# staged file is only read again if its size or modification time changed since the last time
+		st = os.stat(fn)
+		key = os.path.normpath(fn)
+
+		with self.metahashes_lock:
+			entry = self.metahashes.get(key, None)
+			if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+				return entry[2]
+
+		checksum = 0
+		with open(fn, "rb") as f:
+			while True:
+				chunk = f.read(1024 * 1024)
+				if len(chunk) == 0:
+					break
+				checksum = zlib.crc32(chunk, checksum)
+
+		with self.metahashes_lock:
+			self.metahashes[key] = [st.st_size, st.st_mtime_ns, checksum]
+			self.metahashes_changed = True
+
+		return checksum
 
 	def _get_asset_metahash(self, locator):
 		locator = self.state.locator(locator)
@@ -55,9 +200,7 @@ class Thumbnails(object):
 				if not os.path.isfile(full_fn):
 					full_fn = os.path.join("stages/", locator.stage, locator.span, locator.asset_id)
 				if os.path.isfile(full_fn):
-					f = open(full_fn, "rb")
-					checksum = zlib.crc32(f.read(), checksum)
-					f.close()
+					checksum = self._get_file_checksum(full_fn)
 			except:
 				pass
 			return checksum
@@ -85,20 +228,58 @@ class Thumbnails(object):
 		return ".cache/thumbnails/{}{}.{:08X}.png".format(prefix, locator.asset_id, self._get_asset_metahash(locator))
 
 	def get_thumbnails_list(self, stage, path):
-		parts = path.split("/")
+		return [taid for taid, fn in self._get_thumbnails_files(stage, path)]
 
-		if stage != "":
-			result = []
-			locators = self.state.stages.get_assets_under_path(stage, path)
+	def get_thumbnails_sprite(self, stage, path):
+		# all thumbnails of the directory in one image, so browser doesn't have to request each one separately
+		files = {}
+		for taid, fn in self._get_thumbnails_files(stage, path):
+			if taid not in files:
+				files[taid] = fn
+
+		offsets = {}
+		if len(files) == 0:
+			return {"offsets": offsets, "sprite": None}
+
+		columns = max(1, int(math.ceil(math.sqrt(len(files)))))
+		rows = (len(files) + columns - 1) // columns
+		sprite = Image.new("RGBA", (columns * THUMBNAIL_SIZE, rows * THUMBNAIL_SIZE))
+
+		i = 0
+		for taid in files:
+			try:
+				with Image.open(files[taid]) as img:
+					x, y = (i % columns) * THUMBNAIL_SIZE, (i // columns) * THUMBNAIL_SIZE
+					w, h = img.size
+					sprite.paste(img.convert("RGBA"), (x, y))
+					offsets[taid] = [x, y, w, h]
+					i += 1
+			except:
+				pass
+
+		f = io.BytesIO()
+		sprite.save(f, format="png", compress_level=1)
+		return {"offsets": offsets, "sprite": base64.b64encode(f.getvalue()).decode('ascii')}
+
+	def _get_thumbnails_files(self, stage, path): # -> [(taid, thumbnail filename)]
+		result = []
+		for aid, locators in self._get_directory_assets(stage, path, False):
 			for l in locators:
-				l = self.state.locator(l)
 				fn = self._get_thumbnail_path(l)
 				if os.path.exists(fn):
-					result += [stage + "_" + l.asset_id]
+					result += [(stage + "_" + aid, fn)]
 
-			return result
-		
-		node = self.state.toc_loader.tree
+		return result
+
+	def _get_directory_assets(self, stage, path, recursive): # -> [(aid, variants locators)]
+		if stage != "":
+			if stage not in self.state.stages.stages:
+				raise Exception("Bad stage")
+			node = self.state.stages.stages[stage].tree
+		else:
+			node = self.state.toc_loader.tree
+
+		parts = path.split("/")
 		for p in parts:
 			if p == "":
 				continue
@@ -111,14 +292,15 @@ class Thumbnails(object):
 			return []
 
 		result = []
-		for k in node:
-			if isinstance(node[k], list):
-				aid = node[k][0]
-				locators = self.state.get_asset_variants_locators(stage, aid)
-				for l in locators:
-					fn = self._get_thumbnail_path(l)
-					if os.path.exists(fn):
-						result += [stage + "_" + aid]
+		nodes = [node]
+		while len(nodes) > 0:
+			node = nodes.pop()
+			for k in node:
+				if isinstance(node[k], list):
+					aid = node[k][0]
+					result += [(aid, self.state.get_asset_variants_locators(stage, aid))]
+				elif recursive:
+					nodes += [node[k]]
 
 		return result
 
@@ -147,17 +329,110 @@ class Thumbnails(object):
 				if DEBUG_DDS:
 					img.save(".cache/thumbnails/orig_{}.png".format(aid))
 
-				w, h = img.size
-				max_side = w
-				if h > max_side:
-					max_side = h
-				scale = 64/max_side
-				new_width = max(int(w * scale), 1)
-				new_height = max(int(h * scale), 1)
-				img = img.resize((new_width, new_height), Image.ANTIALIAS)
-				img.save(fn)
+				_save_thumbnail(img, fn)
+				self._save_metahashes()
 				return True
 		except:
 			print(traceback.format_exc())
 
 		return False
+
+	# background prerendering
+
+	def start_prerender(self, stage, path, recursive):
+		with self.prerender_lock:
+			if self.prerender_job is not None and self.prerender_job.running:
+				self.prerender_job.cancelled = True
+
+			job = PrerenderJob(stage, path, recursive)
+			self.prerender_job = job
+
+		t = threading.Thread(target=self._prerender, args=(job,), daemon=True)
+		t.start()
+		return job.get_status()
+
+	def _prerender(self, job):
+		try:
+			tasks = self._get_prerender_tasks(job)
+			job.total = len(tasks)
+
+			# data is extracted here, in a single thread (so archives are read sequentially), and decoded by the pool
+			with concurrent.futures.ProcessPoolExecutor(max_workers=PRERENDER_PROCESSES, mp_context=multiprocessing.get_context("spawn")) as pool:
+				pending = set()
+				for fn, data in self._read_prerender_data(job, tasks):
+					if job.cancelled:
+						break
+
+					if data is None:
+						job.done += 1
+					else:
+						pending.add(pool.submit(_render_thumbnail, data, fn, dat1lib.VERSION_OVERRIDE))
+
+					if len(pending) >= PRERENDER_MAX_QUEUED:
+						finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+						self._count_prerendered(job, finished)
+
+				finished, _ = concurrent.futures.wait(pending)
+				self._count_prerendered(job, finished)
+		except:
+			print(traceback.format_exc())
+
+		self._save_metahashes()
+		job.running = False
+
+	def _count_prerendered(self, job, futures):
+		for f in futures:
+			job.done += 1
+			try:
+				if f.result():
+					job.made += 1
+			except:
+				pass
+
+	def _get_prerender_tasks(self, job): # -> [(locator, thumbnail filename)]
+		tasks = []
+		for aid, locators in self._get_directory_assets(job.stage, job.path, job.recursive):
+			if job.cancelled:
+				break
+
+			if len(locators) == 0:
+				continue
+
+			locator = self.state.locator(locators[0])
+			name = self.state.get_asset_basename(locator)
+			if not (name.endswith(".texture") or name == aid): # only textures have thumbnails; unknown names are checked by the worker
+				continue
+
+			try:
+				fn = self._get_thumbnail_path(locator)
+				if not os.path.exists(fn):
+					tasks += [(locator, fn)]
+			except:
+				pass
+
+		return tasks
+
+	def _read_prerender_data(self, job, tasks): # => yields (thumbnail filename, data or None)
+		if job.stage != "":
+			for locator, fn in tasks:
+				try:
+					yield (fn, self.state.get_asset_data(locator))
+				except:
+					yield (fn, None)
+			return
+
+		# not using DataCache, so prerendering doesn't evict assets user is working with;
+		# scheduler reads archives sequentially and decompresses every block once
+		toc = self.state.toc_loader.toc
+		fns = {}
+		entries = []
+		for locator, fn in tasks:
+			try:
+				entry = toc.get_asset_entry_by_index(self.state._get_archived_asset_index(locator))
+				fns[entry.index] = fn
+				entries += [entry]
+			except:
+				yield (fn, None)
+
+		for entry, data in dat1lib.extraction.ExtractionScheduler(toc).extract(entries):
+			yield (fns[entry.index], data)
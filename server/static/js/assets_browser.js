@@ -579,6 +579,7 @@ assets_browser = {
 	_browser_made_for_entry: null,
 	_browser_thumbnails_path: null,
 	_browser_known_thumbnails: new Set(),
+	_browser_thumbnails_urls: {},
 
 	make_content_browser: function (entry) {
 		var remake_browser = true;
@@ -630,7 +631,7 @@ assets_browser = {
 
 				var self = this;
 				ajax.postAndParseJson(
-					"api/thumbnails/list", {
+					"api/thumbnails/batch", {
 						stage: stage,
 						path: full_path
 					},
@@ -641,15 +642,31 @@ assets_browser = {
 						}
 
 						// TODO: self.search.error = null;
-						for (var taid of r.list) {
-							self._browser_known_thumbnails.add(taid);
-						}
-						if (r.list.length > 0) {
+						function remake() {
 							if (self._browser_made_for_entry != null && self._browser_made_for_entry.basedir == entry.basedir && self._browser_made_for_entry.stage == entry.stage) {
 								self._browser_made_for_entry = null; // to trigger remake
 								self.make_content_browser(entry);
 							}
 						}
+
+						if (r.sprite == null) return;
+
+						var sprite = new Image();
+						sprite.onload = function () {
+							var canvas = document.createElement("canvas");
+							var ctx = canvas.getContext("2d");
+							for (var taid in r.offsets) {
+								var o = r.offsets[taid];
+								canvas.width = o[2];
+								canvas.height = o[3];
+								ctx.clearRect(0, 0, o[2], o[3]);
+								ctx.drawImage(sprite, o[0], o[1], o[2], o[3], 0, 0, o[2], o[3]);
+								self._browser_thumbnails_urls[taid] = canvas.toDataURL();
+								self._browser_known_thumbnails.add(taid);
+							}
+							remake();
+						};
+						sprite.src = "data:image/png;base64," + r.sprite;
 					},
 					function(e) {				
 						// TODO: self.search.error = e;
@@ -693,7 +710,11 @@ assets_browser = {
 				var taid = entry.stage + "_" + aid;
 				if (this._browser_known_thumbnails.has(taid)) {
 					var thumb = document.createElement("img");
-					thumb.src = "/api/thumbnails/png?stage=" + entry.stage + "&aid=" + aid + "#" + (+Date.now());
+					if (taid in this._browser_thumbnails_urls) {
+						thumb.src = this._browser_thumbnails_urls[taid];
+					} else {
+						thumb.src = "/api/thumbnails/png?stage=" + entry.stage + "&aid=" + aid + "#" + (+Date.now());
+					}
 					item.appendChild(thumb);
 					item.className += " with_thumbnail";
 				}
@@ -1237,6 +1258,7 @@ assets_browser = {
 
 				if (r.thumbnail != null) {
 					self._browser_known_thumbnails.add(r.thumbnail);
+					delete self._browser_thumbnails_urls[r.thumbnail]; // could be outdated, so it'd be requested separately
 
 					// refresh content browser now
 					var entry = self._browser_made_for_entry;
@@ -5,7 +5,6 @@
 
 import * as THREE from 'three';
 import { OrbitControls } from 'OrbitControls';
-import { OBJLoader } from 'OBJLoader';
 import { MTLLoader } from 'MTLLoader';
 
 models_viewer = {
@@ -29,6 +28,7 @@ models_viewer = {
 			details_looks_checkboxes: null,
 			details_use_materials_cb: null,
 			loading: false,
+			load_error: null,
 
 			container: null,
 			renderer: null,
@@ -283,6 +283,20 @@ models_viewer = {
 					section_container.appendChild(msg);
 				}
 
+				// skin
+
+				section_container = make_section(scrollbox, "Skin");
+
+				for (var sk of this.info.skin) {
+					section_container.appendChild(createElementWithTextNode("div", sk.name + ": " + sk.vertexes + " vertexes, up to " + sk.influences + " influences"));
+				}
+
+				if (this.info.skin.length == 0) {
+					var msg = createElementWithTextNode("span", "No skin");
+					msg.className = "empty_message";
+					section_container.appendChild(msg);
+				}
+
 				// meshes list
 
 				section_container = make_section(scrollbox, "Meshes Visibility");
@@ -304,7 +318,7 @@ models_viewer = {
 				}
 
 				if (this.obj_geometry == null || this.obj_geometry.children.length == 0) {
-					var msg = createElementWithTextNode("span", (this.loading ? "Loading..." : "No meshes"));
+					var msg = createElementWithTextNode("span", (this.loading ? "Loading..." : (this.load_error != null ? "Failed to load: " + this.load_error : "No meshes")));
 					msg.className = "empty_message";
 					section_container.appendChild(msg);
 				}
@@ -333,18 +347,19 @@ models_viewer = {
 				this.make_renderer();
 
 				this.loading = true;
+				this.load_error = null;
 				this.obj_materials = null;
 				this.obj_geometry = null;
 				this.make_details_pane();
 
 				var locator = this.locator;
 				var mtl_url = "/api/models_viewer/mtl?locator=" + locator;
-				var obj_url = "/api/models_viewer/obj?locator=" + locator + "&looks=" + looks + "&lod=" + lod;
+				var mesh_url = "/api/models_viewer/mesh?locator=" + locator + "&looks=" + looks + "&lod=" + lod;
 
 				if (use_materials)
-					this.load_materials_then_geometry(mtl_url, obj_url);
+					this.load_materials_then_geometry(mtl_url, mesh_url);
 				else
-					this.load_geometry(obj_url);
+					this.load_geometry(mesh_url);
 
 				var frontSpot = new THREE.SpotLight(0xFFFFFF);
 				var backSpot = new THREE.SpotLight(0xFFFFFF);
@@ -359,14 +374,14 @@ models_viewer = {
 				}
 			},
 
-			load_materials_then_geometry: function (mtl_url, obj_url) {
+			load_materials_then_geometry: function (mtl_url, mesh_url) {
 				var mtl_loader = new MTLLoader();
 				mtl_loader.resourcePath = "/";
 
 				var self = this;
 				mtl_loader.load(mtl_url, function (materials) {
 					self.obj_materials = materials;
-					self.load_geometry(obj_url);
+					self.load_geometry(mesh_url);
 				}, undefined, function (err) { // TODO: onProgress to update progress bar or something
 					console.error(err);
 					self.loading = false;
@@ -374,32 +389,88 @@ models_viewer = {
 				});
 			},
 
-			load_geometry: function (obj_url) {
-				var loader = new OBJLoader();
-				if (this.obj_materials != null)
-					loader.setMaterials(this.obj_materials);
+			load_geometry: function (mesh_url) {
+				var loader = new THREE.FileLoader();
+				loader.setResponseType("arraybuffer");
 
 				var self = this;
-				loader.load(obj_url, function (geometry) {
-					self.obj_geometry = geometry;
-
-					geometry.scale.x = 3;
-					geometry.scale.y = 3;
-					geometry.scale.z = 3;
-					self.scene.add(geometry);
-
-					if (self.obj_materials != null)
-						self.obj_materials.preload();
+				loader.load(mesh_url, function (buffer) {
+					try {
+						var geometry = self.make_meshes(buffer);
+						self.obj_geometry = geometry;
+
+						geometry.scale.x = 3;
+						geometry.scale.y = 3;
+						geometry.scale.z = 3;
+						self.scene.add(geometry);
+
+						if (self.obj_materials != null)
+							self.obj_materials.preload();
+					} catch (err) {
+						console.error(err);
+						self.load_error = err.message;
+					}
 
 					self.loading = false;
 					self.make_details_pane();
 				}, undefined, function (err) { // TODO: onProgress to update progress bar or something
 					console.error(err);
+					self.load_error = (err.message || err + "");
 					self.loading = false;
 					self.make_details_pane();
 				});
 			},
 
+			make_meshes: function (buffer) { // group with a mesh per submesh of /api/models_viewer/mesh response (see server/mesh_writer.py)
+				var bytes = new Uint8Array(buffer);
+				if (new TextDecoder().decode(bytes.subarray(0, 4)) != "MESH") { // errors come as {"error": true, "message": ...} JSON
+					var message = "bad mesh data";
+					try {
+						var r = JSON.parse(new TextDecoder().decode(bytes));
+						if (r.error) message = r.message;
+					} catch (e) {}
+					throw new Error(message);
+				}
+
+				var header_size = new DataView(buffer).getUint32(8, true);
+				var header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 12, header_size)));
+				var buffers_start = 12 + header_size;
+
+				var array_types = {"float32": Float32Array, "uint16": Uint16Array, "uint32": Uint32Array};
+				function get_array(name) {
+					var b = header.buffers[name];
+					return new array_types[b[2]](buffer, buffers_start + b[0], b[1]);
+				}
+
+				// submeshes share vertexes, only indexes ranges differ
+				var positions = new THREE.BufferAttribute(get_array("positions"), 3);
+				var normals = new THREE.BufferAttribute(get_array("normals"), 3);
+				var uvs = new THREE.BufferAttribute(get_array("uvs"), 2);
+				var indexes = get_array("indexes");
+
+				var group = new THREE.Group();
+				for (var sm of header.submeshes) {
+					var geometry = new THREE.BufferGeometry();
+					geometry.setAttribute("position", positions);
+					geometry.setAttribute("normal", normals);
+					geometry.setAttribute("uv", uvs);
+					geometry.setIndex(new THREE.BufferAttribute(indexes.subarray(sm.start, sm.start + sm.count), 1));
+
+					var material = null;
+					if (this.obj_materials != null)
+						material = this.obj_materials.create(sm.material);
+					if (material == null)
+						material = new THREE.MeshPhongMaterial();
+					material.name = sm.material;
+
+					var mesh = new THREE.Mesh(geometry, material);
+					mesh.name = sm.name;
+					group.add(mesh);
+				}
+
+				return group;
+			},
+
 			render: function () {
 				if (this.aborted) {
 					this.rendering = false;
@@ -5,6 +5,11 @@
 
 textures_viewer = {
 	ready: false,
+	preview_format: "webp", // lossless and quick to encode; "Open in new tab" gets cached png as is
+
+	get_mipmap_url: function (locator, mipmap_index, format) {
+		return "/api/textures_viewer/mipmap?locator=" + locator + "&mipmap_index=" + mipmap_index + "&format=" + format;
+	},
 
 	init: function () {
 		this.ready = true;
@@ -46,8 +51,9 @@ textures_viewer = {
 		preview.className = "preview";
 		d.appendChild(preview);
 
+		var self = this;
 		var img = document.createElement("img");
-		img.src = "/api/textures_viewer/mipmap?locator=" + locator + "&mipmap_index=0#" + (+Date.now());
+		img.src = this.get_mipmap_url(locator, 0, this.preview_format);
 		preview.appendChild(img);
 
 		var controls = document.createElement("div");
@@ -72,12 +78,12 @@ textures_viewer = {
 
 		var btn = createElementWithTextNode("a", "Open in new tab");
 		btn.target = "_blank";
-		btn.href = img.src;
+		btn.href = this.get_mipmap_url(locator, 0, "png");
 		controls.appendChild(btn);
 
 		select.onchange = function () {
-			img.src = "/api/textures_viewer/mipmap?locator=" + locator + "&mipmap_index=" + select.selectedIndex + "#" + (+Date.now());
-			btn.href = img.src;
+			img.src = self.get_mipmap_url(locator, select.selectedIndex, self.preview_format);
+			btn.href = self.get_mipmap_url(locator, select.selectedIndex, "png");
 		};
 	}
 };
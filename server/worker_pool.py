@@ -0,0 +1,124 @@
+# ALERT: Amazing Luna Engine Research Tools
+# This program is free software, and can be redistributed and/or modified by you. It is provided 'as-is', without any warranty.
+# For more details, terms and conditions, see GNU General Public License.
+# A copy of the that license should come with this program (LICENSE.txt). If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+import itertools
+import threading
+import traceback
+
+PRIORITY_HIGH = 0 # someone is waiting for the result right now
+PRIORITY_LOW = 1  # speculative work, done only when nothing else is queued
+
+class Job(object):
+	def __init__(self, key, func, priority):
+		self.key = key
+		self.func = func
+		self.priority = priority
+		self.started = False
+		self.result = None
+		self.exception = None
+		self.done = threading.Event()
+
+	def wait(self, timeout=None):
+		if not self.done.wait(timeout):
+			raise Exception("Job '{}' timed out".format(self.key))
+		if self.exception is not None:
+			raise self.exception
+		return self.result
+
+# threads pool with a priority queue, where jobs are deduplicated by key:
+# submitting a key that is already queued or running returns the same Job
+# (and raises its priority, if new one is higher)
+
+class WorkerPool(object):
+	def __init__(self, name, workers_count):
+		self.name = name
+		self.workers_count = max(1, workers_count)
+		self.workers = []
+
+		self.queue = [] # heap of (priority, seq, job)
+		self.pending = {} # key -> Job
+		self.seq = itertools.count()
+
+		self.lock = threading.Lock()
+		self.cv = threading.Condition(self.lock)
+
+	def submit(self, key, func, priority=PRIORITY_HIGH):
+		with self.lock:
+			self._start_workers()
+
+			if key in self.pending:
+				job = self.pending[key]
+				if not job.started and priority < job.priority:
+					job.priority = priority
+					heapq.heappush(self.queue, (priority, next(self.seq), job)) # old entry becomes stale and is skipped
+					self.cv.notify()
+				return job
+
+			job = Job(key, func, priority)
+			self.pending[key] = job
+			heapq.heappush(self.queue, (priority, next(self.seq), job))
+			self.cv.notify()
+			return job
+
+	def is_pending(self, key):
+		with self.lock:
+			return key in self.pending
+
+	def clear(self):
+		# drops queued jobs that nobody waits for; running ones are left to finish
+		with self.lock:
+			queue = []
+			for entry in self.queue:
+				priority, _, job = entry
+				if job.started or priority != job.priority:
+					continue
+
+				if job.priority == PRIORITY_LOW:
+					del self.pending[job.key]
+					job.exception = Exception("Job '{}' cancelled".format(job.key))
+					job.done.set()
+				else:
+					queue += [entry]
+
+			heapq.heapify(queue)
+			self.queue = queue
+
+	#
+
+	def _start_workers(self):
+		while len(self.workers) < self.workers_count:
+			t = threading.Thread(target=self._work, name="{}#{}".format(self.name, len(self.workers)), daemon=True)
+			self.workers += [t]
+			t.start()
+
+	def _pop(self):
+		with self.lock:
+			while True:
+				while len(self.queue) == 0:
+					self.cv.wait()
+
+				priority, _, job = heapq.heappop(self.queue)
+				if job.started or priority != job.priority: # stale entry
+					continue
+
+				job.started = True
+				return job
+
+	def _work(self):
+		while True:
+			job = self._pop()
+
+			try:
+				job.result = job.func()
+			except Exception as e:
+				if job.priority == PRIORITY_LOW:
+					print(traceback.format_exc())
+				job.exception = e
+
+			with self.lock:
+				if self.pending.get(job.key) is job:
+					del self.pending[job.key]
+			job.done.set()